@@ -1,53 +1,100 @@
 from flask import Flask, request, Response
 import dotenv
 import os
-from typing import Dict
+import threading
+import time
+from typing import Dict, Optional, TYPE_CHECKING
+from loguru import logger
 from chat_clients.whatsapp_green_client import WhatsAppGreenClient
+from chat_clients.webhook_ingestor import WebhookIngestor
+from chat_clients.keyed_dispatcher import KeyedDispatcher
+from chat_clients.seen_id_index import SeenIdIndex, SqliteSeenIdIndex
 from mtn_momo import MTNMoMo
+from http_transport import get_default_transport
 import requests
-import time
 from loguru_config import LoguruConfig
-from chatbot.assistant import Assistant
+from chatbot.stream_chunker import chunk_stream
+from monitoring.metrics import REGISTRY
+from monitoring.usage import get_usage
+from config.conf import (WEBHOOK_INGESTION_MODE, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE,
+                         DISPATCHER_WORKERS, DISPATCHER_MAX_LANE_SIZE, DISPATCHER_MAX_PENDING,
+                         DISPATCHER_SUBMIT_TIMEOUT, DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES, DEDUP_SQLITE_PATH,
+                         STREAM_FLUSH_MIN_CHARS, WARM_UP_ON_START, LOGGING_CONFIG_PATH)
+
+if TYPE_CHECKING:
+    from chatbot.assistant import Assistant
 
 # Load environment variables
 dotenv.load_dotenv()
 
+# Sampled logging written from a background thread (config/loguru.yaml). Loaded
+# on import, so it also applies when a WSGI server imports the app
+LoguruConfig.load(LOGGING_CONFIG_PATH)
+
 # Initialize Flask app
 app = Flask(__name__)
 
+TIME_TO_FIRST_SEND = REGISTRY.histogram("reply_time_to_first_send_seconds",
+                                        "Time from an incoming message to the first part of the answer being sent")
+
 
 # Create a custom client by inheriting from WhatsAppGreenClient
 class MyWhatsAppClient(WhatsAppGreenClient):
-    def __init__(self, instance_id: str, instance_token: str):
-        super().__init__(instance_id, instance_token)
-        self.assistant = Assistant()
+    def __init__(self, instance_id: str, instance_token: str, dispatcher: KeyedDispatcher = None,
+                 seen_ids: SeenIdIndex = None):
+        super().__init__(instance_id, instance_token, dispatcher=dispatcher, seen_ids=seen_ids)
+        self._assistant: Optional["Assistant"] = None
+        self._assistant_lock = threading.Lock()
+
+    @property
+    def assistant(self) -> "Assistant":
+        """
+        The assistant. The agent stack (langchain, langgraph, openai) takes
+        seconds to import, so it is only loaded on first use or by warm_up().
+        """
+        if self._assistant is None:
+            with self._assistant_lock:
+                if self._assistant is None:
+                    from chatbot.assistant import Assistant
+                    self._assistant = Assistant()
+                    self._assistant.start_checkpoint_compaction()
+        return self._assistant
+
+    def warm_up(self, background: bool = True):
+        """
+        Load the assistant before the first message arrives
+
+        Args:
+            background: Load it in a background thread, so the app serves requests meanwhile
+        """
+        if background:
+            threading.Thread(target=lambda: self.assistant, name="assistant-warm-up", daemon=True).start()
+        else:
+            self.assistant
 
     def _process_text_message(self, sender: str, sender_name: str, chat_name: str, text: str):
         """Handle incoming text messages"""
-        print(f"✨ New message received!")
-        if chat_name == sender:
-            print(f"Message in group {chat_name} from: {sender}")
-        else:
-            print(f"From: {sender}")
-        print(f"Message: {text}")
-        response = self.assistant.generate_stream_response(text)
-        complete_response = ""
-        for chunk in response:
-            print(chunk)
-            complete_response += chunk
-        self.send_text_message(sender, complete_response)
+        start = time.perf_counter()
+        response = self.assistant.generate_stream_response(text, conversation_id=sender)
+        # Send the answer paragraph by paragraph as it is generated
+        for i, chunk in enumerate(chunk_stream(response, min_chars=STREAM_FLUSH_MIN_CHARS)):
+            logger.debug("Answer part for {sender}: {chunk}", sender=sender, chunk=chunk, category="send")
+            if i == 0:
+                TIME_TO_FIRST_SEND.observe(time.perf_counter() - start)
+            self.queue_text_message(sender, chunk)
         # Auto-reply
-        self.send_text_message(sender, f"Thanks for your message: {text}")
+        self.queue_text_message(sender, f"Thanks for your message: {text}")
 
     def _process_file_message(self, sender: str, chat_name: str, file_data: Dict):
         """Handle incoming file messages"""
-        print(f"Got file from {sender}: {file_data}")
-        self.send_text_message(sender, "Thanks for the file!")
+        logger.info("Got file from {sender}: {file_data}", sender=sender, file_data=file_data, category="inbound")
+        self.queue_text_message(sender, "Thanks for the file!")
 
     def _process_location_message(self, sender: str, chat_name: str, location_data: Dict):
         """Handle incoming location messages"""
-        print(f"Got location from {sender}: {location_data}")
-        self.send_text_message(sender, "Thanks for sharing your location!")
+        logger.info("Got location from {sender}: {location_data}", sender=sender, location_data=location_data,
+                    category="inbound")
+        self.queue_text_message(sender, "Thanks for sharing your location!")
 
 
 # Initialize MTN MoMo client
@@ -64,6 +111,13 @@ def hello_world():
     return "Flesk is running!"
 
 
+@app.route('/metrics')
+def metrics():
+    # Registers the LLM usage metrics before the first call
+    get_usage()
+    return Response(REGISTRY.exposition(), mimetype="text/plain; version=0.0.4")
+
+
 def set_webhook_url():
     # Your Codespace public URL + /webhook
     codespace_url = "https://psychic-cod-vwgjv9xpj9fx4q7-3000.app.github.dev/webhook"  # Replace with your actual URL
@@ -71,8 +125,9 @@ def set_webhook_url():
     instance_token = os.getenv('GREEN_API_INSTANCE_TOKEN')
     
     try:
-        response = requests.post(
+        response = get_default_transport().post(
             f"https://api.green-api.com/waInstance{instance_id}/setSettings/{instance_token}",
+            "green.setSettings",
             json={"webhookUrl": codespace_url}
         )
         response.raise_for_status()
@@ -80,31 +135,69 @@ def set_webhook_url():
     except Exception as e:
         print(f"Failed to set webhook URL: {str(e)}")
 
-if __name__ == '__main__':
-    # Initialize Loguru
-    #LoguruConfig.load("loguru.yaml")
+def setup_whatsapp(webhook_token: Optional[str] = None, ingestion_mode: Optional[str] = WEBHOOK_INGESTION_MODE
+                   ) -> MyWhatsAppClient:
+    """
+    Create the WhatsApp client and register its webhook on the app
 
-    # Initialize WhatsApp client
+    Args:
+        webhook_token: Secret token for webhook authentication, GREEN_API_WEBHOOK_TOKEN by default
+        ingestion_mode: Webhook ingestion mode, None to process the messages inside the request
+    """
     whatsapp = MyWhatsAppClient(
         instance_id=os.getenv('GREEN_API_INSTANCE_ID'),
-        instance_token=os.getenv('GREEN_API_INSTANCE_TOKEN')
+        instance_token=os.getenv('GREEN_API_INSTANCE_TOKEN'),
+        dispatcher=KeyedDispatcher(
+            max_workers=DISPATCHER_WORKERS,
+            max_lane_size=DISPATCHER_MAX_LANE_SIZE,
+            max_pending=DISPATCHER_MAX_PENDING,
+            submit_timeout=DISPATCHER_SUBMIT_TIMEOUT
+        ),
+        seen_ids=(
+            SqliteSeenIdIndex(DEDUP_SQLITE_PATH, DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES)
+            if DEDUP_SQLITE_PATH else SeenIdIndex(DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES)
+        )
     )
 
+    whatsapp.enable_send_queue()
+
     # Setup webhook with authentication
-    WEBHOOK_TOKEN = os.getenv('GREEN_API_WEBHOOK_TOKEN')  # Add this to your .env file
+    ingestor = None
+    if ingestion_mode:
+        ingestor = WebhookIngestor(
+            whatsapp._handle_message,
+            workers=WEBHOOK_WORKERS,
+            max_queue_size=WEBHOOK_QUEUE_SIZE,
+            mode=ingestion_mode
+        )
     whatsapp.setup_webhook(
         app=app,
         path='/webhook',
-        webhook_token=WEBHOOK_TOKEN
+        webhook_token=webhook_token or os.getenv('GREEN_API_WEBHOOK_TOKEN'),  # Add this to your .env file
+        ingestor=ingestor
     )
+    return whatsapp
+
+
+@app.cli.command("startup-report")
+def startup_report():
+    """Print the modules that take the longest to import when starting the app."""
+    from monitoring.startup_report import import_time_report
+    print(import_time_report("app"))
+
+
+if __name__ == '__main__':
+    # Initialize WhatsApp client
+    whatsapp = setup_whatsapp()
+    if WARM_UP_ON_START:
+        whatsapp.warm_up()
 
+    # Rate limits (429) are retried by the HTTP transport honouring Retry-After
     try:
         status = whatsapp.get_instance_status()
         print(f"Instance status: {status}")
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 429:
-            print("Rate limit reached. Waiting before retrying...")
-            time.sleep(5)  # Wait 5 seconds before continuing
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to get instance status: {str(e)}")
     
     whatsapp.send_text_message(
         to='34696864400',
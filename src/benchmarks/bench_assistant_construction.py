@@ -0,0 +1,60 @@
+"""
+Construction time and memory of Assistant instances, rebuilding the graph for
+each one (as every client and tester "clear" used to) against the shared graph.
+
+Run from the src directory:
+    python -m benchmarks.bench_assistant_construction
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# ChatOpenAI requires a key to be built, no request is sent
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from loguru import logger
+import argparse
+import gc
+import time
+import tracemalloc
+
+import chatbot.assistant as assistant_module
+from chatbot.assistant import Assistant
+from chatbot.llm_clients import get_chat_model, get_http_client
+
+
+def rebuild_shared():
+    """Forget the shared graph and LLM clients, so the next Assistant builds its own"""
+    Assistant._shared = None
+    get_chat_model.cache_clear()
+    get_http_client.cache_clear()
+
+
+def measure(name: str, instances: int, rebuild: bool):
+    rebuild_shared()
+    Assistant()
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = []
+    for _ in range(instances):
+        if rebuild:
+            rebuild_shared()
+        kept.append(Assistant())
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10s} {elapsed / instances * 1e3:9.3f} ms/instance  {retained / instances / 1024:9.1f} KiB/instance")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--instances", type=int, default=20)
+    parser.add_argument("--log", action="store_true", help="Keep the logging enabled")
+    args = parser.parse_args()
+    if not args.log:
+        logger.remove()
+    # Conversations in memory, not to create a database file
+    assistant_module.CHECKPOINT_BACKEND = "memory"
+    measure("rebuilt", args.instances, rebuild=True)
+    measure("shared", args.instances, rebuild=False)
@@ -0,0 +1,76 @@
+"""
+Checkpoint write and read latency of the SQLite checkpointer against MemorySaver.
+
+Run from the src directory:
+    python -m benchmarks.bench_checkpointer
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, END
+from loguru import logger
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from chatbot.base_state import BaseState
+from chatbot.checkpointers.bounded_memory_saver import BoundedMemorySaver
+from chatbot.checkpointers.sqlite_saver import SqliteCheckpointSaver
+
+ANSWER = "Your order has been processed. The total price is 6,000 UGX. Please make the payment. " * 3
+
+
+def build_graph(checkpointer):
+    """Graph with the shape of the assistant's, without the LLM"""
+    builder = StateGraph(BaseState)
+    builder.add_node("contextManager", lambda state: {})
+    builder.add_node("shopAssistant", lambda state: {"messages": AIMessage(content=ANSWER)})
+    builder.set_entry_point("contextManager")
+    builder.add_edge("contextManager", "shopAssistant")
+    builder.add_edge("shopAssistant", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def percentiles(latencies) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95)]
+    return f"p50 {statistics.median(latencies) * 1e3:7.3f} ms  p95 {p95 * 1e3:7.3f} ms"
+
+
+def run(name: str, checkpointer, threads: int, turns: int):
+    graph = build_graph(checkpointer)
+    flush = getattr(checkpointer, "flush", lambda thread_id: None)
+    configs = [{"configurable": {"thread_id": f"3460{i:07d}"}} for i in range(threads)]
+    writes, reads = [], []
+    for turn in range(turns):
+        for config in configs:
+            start = time.perf_counter()
+            graph.invoke({"messages": ("user", f"2 greek, 1 labneh deluxe ({turn})")}, config)
+            flush(config["configurable"]["thread_id"])
+            writes.append(time.perf_counter() - start)
+    for config in random.Random(0).sample(configs, min(len(configs), 500)):
+        start = time.perf_counter()
+        graph.get_state(config)
+        reads.append(time.perf_counter() - start)
+    print(f"{name:22s} turn {percentiles(writes)}   read {percentiles(reads)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--log", action="store_true", help="Keep the logging enabled")
+    args = parser.parse_args()
+    if not args.log:
+        logger.remove()
+    run("MemorySaver", MemorySaver(), args.threads, args.turns)
+    run("BoundedMemorySaver", BoundedMemorySaver(), args.threads, args.turns)
+    with tempfile.TemporaryDirectory() as directory:
+        run("Sqlite (per turn)", SqliteCheckpointSaver(os.path.join(directory, "turn.db")), args.threads, args.turns)
+        run("Sqlite (per write)", SqliteCheckpointSaver(os.path.join(directory, "write.db"), max_pending=1),
+            args.threads, args.turns)
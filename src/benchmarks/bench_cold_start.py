@@ -0,0 +1,86 @@
+"""
+Cold start regression check: time from spawning a fresh interpreter to the
+first 200 answered by /webhook, compared with a stored baseline.
+
+Run from the src directory:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --update-baseline
+
+Exits with status 1 if the median cold start is slower than the baseline
+by more than the tolerance.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cold_start_baseline.json")
+
+# Runs in the fresh interpreter: import the app, register the webhook and
+# answer a webhook that does not reach the assistant
+CHILD = """
+from loguru import logger
+logger.remove()
+import app
+app.setup_whatsapp(webhook_token="bench", ingestion_mode=None)
+response = app.app.test_client().post(
+    "/webhook",
+    json={"typeWebhook": "stateInstanceChanged", "stateInstance": "authorized"},
+    headers={"Authorization": "Bearer bench"}
+)
+assert response.status_code == 200, response.status_code
+assert "langchain" not in __import__("sys").modules, "the agent stack was imported at startup"
+print("ready", flush=True)
+"""
+
+
+def cold_start() -> float:
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=src, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0 or "ready" not in result.stdout:
+        raise RuntimeError(f"Cold start failed:\n{result.stdout[-1000:]}\n{result.stderr[-2000:]}")
+    return elapsed
+
+
+def main(runs: int, tolerance: float, update_baseline: bool) -> int:
+    # Warm the file system cache, it is the interpreter start we measure
+    cold_start()
+    times = sorted(cold_start() for _ in range(runs))
+    median = statistics.median(times)
+    print(f"cold start to first 200 on /webhook: median {median * 1e3:.0f} ms "
+          f"(min {times[0] * 1e3:.0f} ms, max {times[-1] * 1e3:.0f} ms, {runs} runs)")
+
+    if update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"median_seconds": round(median, 4)}, f, indent=4)
+            f.write("\n")
+        print(f"Baseline updated in {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline, run with --update-baseline to create it")
+        return 0
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)["median_seconds"]
+    limit = baseline * (1 + tolerance)
+    print(f"baseline {baseline * 1e3:.0f} ms, limit {limit * 1e3:.0f} ms (+{tolerance:.0%})")
+    if median > limit:
+        print("FAILED: cold start is slower than the baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.tolerance, args.update_baseline))
@@ -0,0 +1,220 @@
+"""
+Micro-benchmarks of the chat hot path, with results kept for regression tracking.
+
+Every run is appended to results/hot_path.jsonl (local, ignored by git) with
+the commit it measured, and compared with the tracked hot_path_baseline.json. The LLM is the local fake OpenAI
+server of the load tests, answering without latency.
+
+Run from the src directory:
+    python -m benchmarks.bench_hot_path
+    python -m benchmarks.bench_hot_path --only order --rounds 10
+    python -m benchmarks.bench_hot_path --update-baseline
+
+Exits with status 1 if the median of a benchmark is slower than the baseline
+by more than the tolerance.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_servers import FakeOpenAI
+
+# The fake LLM has to be in place before the chat models are built
+_fake_openai = FakeOpenAI().start()
+os.environ["OPENAI_BASE_URL"] = f"{_fake_openai.url}/v1"
+os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+
+from typing import Callable, Dict, List
+from loguru import logger
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+from pydantic import TypeAdapter
+from langchain_core.messages import AIMessage, HumanMessage
+
+import chatbot.assistant as assistant_module
+from chatbot.assistant import Assistant
+from chatbot.agents.shop_assistant import ShopAssistant, get_total_price
+from chatbot.products import OrderItem, Product
+from chat_clients.whatsapp_green_client import WhatsAppGreenClient
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "hot_path_baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "hot_path.jsonl")
+
+LARGE_ORDER = [{"product": product.value, "quantity": 1 + i % 20}
+               for i, product in zip(range(1000), itertools.cycle(Product))]
+
+
+def bench_green_handle_message() -> Callable[[], None]:
+    """Parse an incoming Green API text message webhook up to its handler"""
+    class Client(WhatsAppGreenClient):
+        def _process_text_message(self, sender, sender_name, chat_name, text):
+            pass
+
+    client = Client("1101000000", "token")
+    payload = {
+        "typeWebhook": "incomingMessageReceived",
+        "idMessage": "BAE5F4886F2E3C9A",
+        "senderData": {"chatId": "34600000000@c.us", "sender": "34600000000@c.us",
+                       "chatName": "Customer", "senderName": "Customer"},
+        "messageData": {"typeMessage": "textMessage",
+                        "textMessageData": {"textMessage": "2 greek, 1 labneh deluxe"}}
+    }
+    return lambda: client._handle_message(payload)
+
+
+def bench_generate_stream_response() -> Callable[[], None]:
+    """Answer a new conversation through the graph, the agent and the fake LLM"""
+    assistant = Assistant()
+    counter = itertools.count()
+
+    def run():
+        i = next(counter)
+        # A new question and conversation each time, so neither the cache nor the history builds up
+        for _ in assistant.generate_stream_response(f"hello, what do you sell? {i}", conversation_id=f"bench-{i}"):
+            pass
+    return run
+
+
+def bench_shop_assistant_call() -> Callable[[], None]:
+    """Run the agent node on a conversation of 20 turns"""
+    agent = ShopAssistant()
+    history = []
+    for turn in range(20):
+        history.append(HumanMessage(content=f"Do you have greek yoghurt? {turn}"))
+        history.append(AIMessage(content="Yes, we have greek yoghurt. How many would you like?"))
+    counter = itertools.count()
+
+    def run():
+        state = {"messages": history + [HumanMessage(content=f"2 greek please {next(counter)}")], "summary": ""}
+        agent(state, {"configurable": {"thread_id": "bench"}})
+    return run
+
+
+def bench_order_item_validation() -> Callable[[], None]:
+    """Validate an order of 1000 items"""
+    adapter = TypeAdapter(List[OrderItem])
+    return lambda: adapter.validate_python(LARGE_ORDER)
+
+
+def bench_get_total_price() -> Callable[[], None]:
+    """Price an order of 1000 items through the tool"""
+    args = {"order": LARGE_ORDER}
+    return lambda: get_total_price.invoke(args)
+
+
+def bench_get_diagram() -> Callable[[], None]:
+    """Mermaid diagram of the graph with the active node"""
+    assistant = Assistant()
+    return lambda: assistant.get_diagram("shopAssistant")
+
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], None]]] = {
+    "green_handle_message": bench_green_handle_message,
+    "generate_stream_response": bench_generate_stream_response,
+    "shop_assistant_call": bench_shop_assistant_call,
+    "order_item_validation": bench_order_item_validation,
+    "get_total_price": bench_get_total_price,
+    "get_diagram": bench_get_diagram,
+}
+
+
+def measure(fn: Callable[[], None], rounds: int, min_time: float) -> Dict[str, float]:
+    """
+    Time ``fn`` in ``rounds`` rounds of as many calls as fit in ``min_time``
+
+    Returns:
+        Median, minimum and standard deviation of the seconds per call, and the calls per round
+    """
+    fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(per_call), "min": min(per_call),
+            "stdev": statistics.stdev(per_call) if rounds > 1 else 0.0, "number": number}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(only: str, rounds: int, min_time: float, tolerance: float, update_baseline: bool) -> int:
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        results[name] = measure(setup(), rounds, min_time)
+        result = results[name]
+        print(f"{name:26s} {result['median'] * 1e6:12.1f} us/call  (min {result['min'] * 1e6:.1f}, "
+              f"stdev {result['stdev'] * 1e6:.1f}, {result['number']} calls x {rounds})")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "a") as f:
+        f.write(json.dumps({"ts": time.time(), "commit": git_commit(), "python": platform.python_version(),
+                            "results": results}) + "\n")
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    if update_baseline:
+        baseline.update({name: round(result["median"], 9) for name, result in results.items()})
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=4)
+            f.write("\n")
+        print(f"Baseline updated in {BASELINE_PATH}")
+        return 0
+
+    failed = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["median"] / baseline[name] - 1
+        print(f"{name:26s} {change:+7.1%} vs baseline")
+        if change > tolerance:
+            failed.append(name)
+    if failed:
+        print(f"FAILED: slower than the baseline by more than {tolerance:.0%}: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", default="", help="Run the benchmarks whose name contains this text")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--log", action="store_true", help="Keep the logging enabled")
+    args = parser.parse_args()
+    if not args.log:
+        logger.remove()
+    # Conversations in memory, not to create a database file
+    assistant_module.CHECKPOINT_BACKEND = "memory"
+    try:
+        sys.exit(main(args.only, args.rounds, args.min_time, args.tolerance, args.update_baseline))
+    finally:
+        _fake_openai.stop()
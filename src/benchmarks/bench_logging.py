@@ -0,0 +1,171 @@
+"""
+Time and memory of the logging done for one message, before and after the
+structured logging pipeline.
+
+The legacy case reproduces the previous calls: pprint of the webhook payload,
+prints of the message and of every answer part, and f-string loguru calls
+to the default synchronous handler. The structured case runs the same calls
+as the code does now, with the handlers of config/loguru.yaml: sampled
+categories and loguru's enqueue, which writes from a background thread.
+
+Standard output and error go to files, as they would under a server, in a
+temporary directory that also holds the JSON log. --write-latency adds a
+delay to every write to them, like a pipe to a busy log collector or a slow
+disk. Enqueue pickles each kept record in the caller, so with fast files the
+structured logging costs the caller about as much as the legacy one; its gain
+is that the caller no longer waits for the writes.
+
+Run from the src directory:
+    python -m benchmarks.bench_logging --write-latency 0.0002
+
+Exits with status 1 if, with a write latency, the structured logging is not
+faster than the legacy one.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pprint import pprint
+from typing import Callable, Dict
+from loguru import logger
+from loguru_config import LoguruConfig
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from config.conf import LOGGING_CONFIG_PATH
+from loadtest.fake_servers import FakeGreenApi
+
+SENDER = "34600000000@c.us"
+TEXT = "Hello, I would like 2 greek yoghurts and 1 labneh deluxe, how much is it?"
+PAYLOAD = FakeGreenApi.webhook_payload(SENDER, TEXT)
+CHUNKS = ["Your order has been processed:\n- 2 x Greek yoghurt\n- 1 x Labneh deluxe",
+          "The total price is 9,500 UGX. Please make the payment and send me the id of the payment."]
+
+
+class SlowFile:
+    """A text file that waits before every write"""
+
+    def __init__(self, path: str, latency: float):
+        self._file = open(path, "w")
+        self._latency = latency
+
+    def write(self, text: str) -> int:
+        if self._latency:
+            time.sleep(self._latency)
+        return self._file.write(text)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def legacy_message():
+    pprint(PAYLOAD)
+    logger.info(f"Received text message from {SENDER}: {TEXT}")
+    print(f"✨ New message received!")
+    print(f"From: {SENDER}")
+    print(f"Message: {TEXT}")
+    logger.debug(f"Context: {1200} history tokens sent, {300} tokens saved")
+    logger.debug(f"ShopAssistant call: {1500} prompt and {60} completion tokens, ${0.000261:.6f}")
+    for chunk in CHUNKS:
+        print(chunk)
+        logger.info(f"Message sent successfully to {SENDER}")
+
+
+def structured_message():
+    logger.debug("Webhook payload: {payload}", payload=PAYLOAD, category="inbound")
+    logger.info("Received text message from {sender}: {text}", sender=SENDER, text=TEXT, category="inbound")
+    logger.debug("Context: {sent} history tokens sent, {saved} tokens saved", sent=1200, saved=300, category="llm")
+    logger.debug("{agent} call: {prompt_tokens} prompt and {completion_tokens} completion tokens, ${cost:.6f}",
+                 agent="ShopAssistant", prompt_tokens=1500, completion_tokens=60, cost=0.000261, category="llm")
+    for chunk in CHUNKS:
+        logger.debug("Answer part for {sender}: {chunk}", sender=SENDER, chunk=chunk, category="send")
+        logger.info("Message sent successfully to {to}", to=SENDER, category="send")
+
+
+def legacy_setup():
+    logger.remove()
+    # The default loguru handler
+    logger.add(sys.stderr, level="DEBUG")
+
+
+def structured_setup():
+    LoguruConfig.load(LOGGING_CONFIG_PATH)
+
+
+CASES: Dict[str, Callable[[], None]] = {"legacy": legacy_message, "structured": structured_message}
+SETUPS: Dict[str, Callable[[], None]] = {"legacy": legacy_setup, "structured": structured_setup}
+
+
+def run(name: str, messages: int) -> Dict[str, float]:
+    """Seconds per message in the calling thread and in total, and peak bytes allocated per message"""
+    SETUPS[name]()
+    fn = CASES[name]
+    for _ in range(100):
+        fn()
+    start = time.perf_counter()
+    for _ in range(messages):
+        fn()
+    calls = time.perf_counter() - start
+    # Removing the handlers writes what the sinks still have queued
+    logger.remove()
+    total = time.perf_counter() - start
+
+    SETUPS[name]()
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(messages, 2000)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    logger.remove()
+    return {"call": calls / messages, "total": total / messages, "peak": statistics.median(peaks)}
+
+
+def main(messages: int, rounds: int, write_latency: float) -> int:
+    workdir = tempfile.mkdtemp(prefix="bench-logging-")
+    stdout, stderr = sys.stdout, sys.stderr
+    results = {name: [] for name in CASES}
+    os.chdir(workdir)
+    out, err = SlowFile("stdout.log", write_latency), SlowFile("stderr.log", write_latency)
+    try:
+        sys.stdout, sys.stderr = out, err
+        for _ in range(rounds):
+            for name in CASES:
+                results[name].append(run(name, messages))
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        out.close()
+        err.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {name: {key: statistics.median(r[key] for r in runs) for key in ("call", "total", "peak")}
+               for name, runs in results.items()}
+    for name, result in summary.items():
+        print(f"{name:10s} {result['call'] * 1e6:8.1f} us/message in the caller, {result['total'] * 1e6:8.1f} us "
+              f"with the writes, {result['peak'] / 1024:6.1f} KiB peak allocation")
+    legacy, structured = summary["legacy"], summary["structured"]
+    print(f"structured vs legacy: caller {structured['call'] / legacy['call'] - 1:+.0%}, "
+          f"total {structured['total'] / legacy['total'] - 1:+.0%}, peak {structured['peak'] / legacy['peak'] - 1:+.0%}")
+    if write_latency and structured["call"] >= legacy["call"]:
+        print("FAILED: the structured logging is not faster than the legacy one")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000, help="Messages per round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--write-latency", type=float, default=0.0,
+                        help="Seconds each write to standard output and error waits")
+    args = parser.parse_args()
+    sys.exit(main(args.messages, args.rounds, args.write_latency))
@@ -0,0 +1,95 @@
+"""
+Parse + dispatch throughput of the Meta webhook on large batched payloads.
+
+Run from the src directory:
+    python -m benchmarks.bench_meta_webhook
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from loguru import logger
+import argparse
+import time
+
+from chat_clients.whatsapp_business_client import WhatsAppBusinessClient
+
+
+class CountingClient(WhatsAppBusinessClient):
+    def __init__(self):
+        super().__init__(token="token", phone_number_id="123")
+        self.received = 0
+
+    def _process_text_message(self, from_number: str, text: str):
+        self.received += 1
+
+
+def make_payload(entries: int, changes: int, messages: int, statuses: int) -> dict:
+    """Build a synthetic payload with entries x changes values, each with messages and statuses"""
+    entry_list = []
+    for e in range(entries):
+        change_list = []
+        for c in range(changes):
+            senders = [f"34600{e:03d}{c:03d}{m:03d}" for m in range(messages)]
+            change_list.append({
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "34600000000", "phone_number_id": "123"},
+                    "contacts": [{"profile": {"name": "Customer"}, "wa_id": s} for s in senders],
+                    "messages": [{
+                        "from": s,
+                        "id": f"wamid.{e}.{c}.{m}",
+                        "timestamp": "1700000000",
+                        "type": "text",
+                        "text": {"body": "2 greek, 1 labneh deluxe"}
+                    } for m, s in enumerate(senders)],
+                    "statuses": [{
+                        "id": f"wamid.out.{e}.{c}.{i}",
+                        "status": "delivered",
+                        "timestamp": "1700000000",
+                        "recipient_id": "34600000000"
+                    } for i in range(statuses)]
+                }
+            })
+        entry_list.append({"id": str(e), "changes": change_list})
+    return {"object": "whatsapp_business_account", "entry": entry_list}
+
+
+def run(entries: int, changes: int, messages: int, statuses: int, repeat: int):
+    client = CountingClient()
+    payload = make_payload(entries, changes, messages, statuses)
+    events = entries * changes * (messages + statuses)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client._dispatch_webhook(payload)
+    elapsed = time.perf_counter() - start
+    assert client.received == repeat * entries * changes * messages
+    print(f"dispatch  {events} events/payload: {repeat * events / elapsed:12.0f} events/s "
+          f"({elapsed / repeat * 1000:.3f} ms/payload)")
+
+    app = Flask(__name__)
+    client.setup_webhook(app, "/webhook", "verify")
+    http = app.test_client()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        http.post("/webhook", json=payload)
+    elapsed = time.perf_counter() - start
+    print(f"http+json {events} events/payload: {repeat * events / elapsed:12.0f} events/s "
+          f"({elapsed / repeat * 1000:.3f} ms/payload)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10)
+    parser.add_argument("--changes", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--statuses", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--log", action="store_true", help="Keep the per-message logging enabled")
+    args = parser.parse_args()
+    if not args.log:
+        logger.remove()
+    run(args.entries, args.changes, args.messages, args.statuses, args.repeat)
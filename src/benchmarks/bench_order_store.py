@@ -0,0 +1,90 @@
+"""
+Insert throughput and query latency of the SQLite order store.
+
+Run from the src directory:
+    python -m benchmarks.bench_order_store --orders 1000000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from chatbot.order_store import SqliteOrderStore, StoredOrder, PAID
+from chatbot.products import OrderItem, Product
+
+
+def make_order(rng: random.Random, senders: int, created_at: float) -> StoredOrder:
+    products = rng.sample(list(Product), rng.randint(1, 3))
+    items = [OrderItem(product=product, quantity=rng.randint(1, 5)) for product in products]
+    return StoredOrder(sender=f"3460{rng.randrange(senders):07d}", items=items, total=rng.randint(1000, 20000),
+                       currency="UGX", created_at=created_at)
+
+
+def timed(fn, repeat: int) -> str:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)]
+    return f"p50 {statistics.median(latencies) * 1e6:8.1f} us  p95 {p95 * 1e6:8.1f} us"
+
+
+def run(orders: int, senders: int, batch_size: int, queries: int, path: str):
+    rng = random.Random(0)
+    store = SqliteOrderStore(path, batch_size=batch_size, flush_interval=0.5)
+    now = time.time()
+    generated = [make_order(rng, senders, now - (orders - i)) for i in range(orders)]
+
+    start = time.perf_counter()
+    for order in generated:
+        store.add(order)
+    store.flush()
+    elapsed = time.perf_counter() - start
+    print(f"insert {orders} orders (batch {batch_size}): {orders / elapsed:10.0f} orders/s ({elapsed:.1f} s)")
+
+    paid = rng.sample(generated, min(queries, orders))
+    for i, order in enumerate(paid):
+        store.set_payment(order.id, f"pay-{i}", PAID)
+
+    def last_orders():
+        store.last_orders(f"3460{rng.randrange(senders):07d}", 5)
+
+    def by_payment_id():
+        store.by_payment_id(f"pay-{rng.randrange(len(paid))}")
+
+    def by_status():
+        store.by_status(PAID, since=now - rng.randrange(orders), limit=20)
+
+    def get():
+        store.get(rng.choice(generated).id)
+
+    for name, fn in [("last_orders", last_orders), ("by_payment_id", by_payment_id),
+                     ("by_status", by_status), ("get", get)]:
+        print(f"{name:14s} {timed(fn, queries)}")
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--senders", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--path", help="Database file, a temporary one by default")
+    parser.add_argument("--log", action="store_true", help="Keep the logging enabled")
+    args = parser.parse_args()
+    if not args.log:
+        logger.remove()
+    if args.path:
+        run(args.orders, args.senders, args.batch_size, args.queries, args.path)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            run(args.orders, args.senders, args.batch_size, args.queries, os.path.join(directory, "orders.db"))
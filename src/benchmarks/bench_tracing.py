@@ -0,0 +1,144 @@
+"""
+Overhead of the span tracing on the message path: webhook, message handling,
+graph, nodes, tools, LLM calls and send, against the local fake Green API and
+OpenAI servers of the load tests.
+
+Rounds with the tracing enabled and disabled alternate, and the measured
+overhead is the ratio of their median time per message. It is within the
+noise of the message path, so the limit is checked on the overhead estimated
+from the cost of a single span and the spans per message.
+
+Run from the src directory:
+    python -m benchmarks.bench_tracing
+
+Exits with status 1 if the estimated overhead is above the limit (2% by default).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_servers import FakeGreenApi, FakeOpenAI
+
+_fake_openai = FakeOpenAI().start()
+_fake_green = FakeGreenApi().start()
+os.environ.update({
+    "OPENAI_BASE_URL": f"{_fake_openai.url}/v1",
+    "OPENAI_API_KEY": "sk-benchmark",
+    "GREEN_API_URL": _fake_green.url,
+    "GREEN_API_INSTANCE_TOKEN": "benchmark",
+})
+
+from flask import Flask
+from loguru import logger
+import argparse
+import itertools
+import statistics
+import tempfile
+import time
+
+import chatbot.assistant as assistant_module
+from chatbot.assistant import Assistant
+from chat_clients.whatsapp_green_client import WhatsAppGreenClient
+from monitoring.tracing import JsonLinesExporter, Tracer, set_tracer, start_span
+
+# Half of the messages go through the order fast path, the others through the agent and a tool
+MESSAGES = ["2 greek, 1 labneh deluxe", "hello, what do you sell?", "grek x3 and a mango",
+            "how much are 3 mango yoghurts?"]
+
+
+class SyncClient(WhatsAppGreenClient):
+    """Answers inside the webhook request and sends right away, so a request times the whole path"""
+
+    def __init__(self):
+        super().__init__("1101000000", "benchmark")
+        self.assistant = Assistant()
+
+    def _process_text_message(self, sender: str, sender_name: str, chat_name: str, text: str):
+        answer = "".join(self.assistant.generate_stream_response(text, conversation_id=sender))
+        self.send_text_message(sender, answer)
+
+
+def run_round(http, counter, messages: int) -> float:
+    """Seconds per message of a round"""
+    start = time.perf_counter()
+    for _ in range(messages):
+        i = next(counter)
+        # A new conversation and question each time, so neither the cache nor the history builds up
+        payload = FakeGreenApi.webhook_payload(f"3460{i:07d}@c.us", f"{MESSAGES[i % len(MESSAGES)]} {i}")
+        response = http.post("/webhook", json=payload, headers={"Authorization": "Bearer bench"})
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) / messages
+
+
+def span_cost(tracer: Tracer, spans: int = 100000) -> float:
+    """Seconds per nested span, with the given tracer"""
+    set_tracer(tracer)
+    start = time.perf_counter()
+    with start_span("parent", message_id="bench"):
+        for _ in range(spans):
+            with start_span("child", key="value"):
+                pass
+    return (time.perf_counter() - start) / spans
+
+
+def main(rounds: int, messages: int, limit: float) -> int:
+    workdir = tempfile.mkdtemp(prefix="bench-tracing-")
+    traces_path = os.path.join(workdir, "traces.jsonl")
+    traced = Tracer([JsonLinesExporter(traces_path)], flush_interval=1.0)
+    traced.start()
+    untraced = Tracer([], enabled=False)
+
+    app = Flask(__name__)
+    client = SyncClient()
+    client.setup_webhook(app, "/webhook", "bench")
+    http = app.test_client()
+    counter = itertools.count()
+
+    # Warm up the graph, the HTTP connections and the caches
+    for tracer in (traced, untraced):
+        set_tracer(tracer)
+        run_round(http, counter, messages)
+
+    times = {True: [], False: []}
+    for _ in range(rounds):
+        for enabled, tracer in ((True, traced), (False, untraced)):
+            set_tracer(tracer)
+            times[enabled].append(run_round(http, counter, messages))
+    traced.flush()
+    with open(traces_path) as f:
+        spans_per_message = sum(1 for _ in f) / ((rounds + 1) * messages)
+
+    with_tracing = statistics.median(times[True])
+    without_tracing = statistics.median(times[False])
+    overhead = with_tracing / without_tracing - 1
+    cost = span_cost(traced) - span_cost(untraced)
+    traced.shutdown()
+    estimate = spans_per_message * cost / without_tracing
+
+    print(f"message path  without tracing {without_tracing * 1e3:8.3f} ms  with tracing {with_tracing * 1e3:8.3f} ms "
+          f"({rounds} rounds x {messages} messages)")
+    print(f"span cost     {cost * 1e6:.2f} us, {spans_per_message:.1f} spans/message")
+    print(f"overhead      measured {overhead:+.2%}, estimated from the span cost {estimate:+.2%} "
+          f"(limit {limit:.0%})")
+    if estimate > limit:
+        print("FAILED: the tracing overhead is above the limit")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--messages", type=int, default=20, help="Messages per round")
+    parser.add_argument("--limit", type=float, default=0.02, help="Maximum overhead")
+    parser.add_argument("--log", action="store_true", help="Keep the logging enabled")
+    args = parser.parse_args()
+    if not args.log:
+        logger.remove()
+    # Conversations and orders in memory, not to create database files
+    assistant_module.CHECKPOINT_BACKEND = "memory"
+    try:
+        sys.exit(main(args.rounds, args.messages, args.limit))
+    finally:
+        _fake_openai.stop()
+        _fake_green.stop()
@@ -0,0 +1,161 @@
+import aiohttp
+from typing import Dict, List, Optional
+from loguru import logger
+
+from .client_metrics import OUTBOUND_SENDS
+from http_transport import AsyncHttpTransport
+from monitoring.tracing import traced
+from config.conf import META_GRAPH_URL
+
+
+class AsyncWhatsAppBusinessClient:
+    """asyncio version of WhatsAppBusinessClient outbound methods"""
+
+    def __init__(self, token: str, phone_number_id: str, version: str = 'v17.0',
+                 transport: Optional[AsyncHttpTransport] = None):
+        """
+        Initialize async WhatsApp Client with your Meta credentials
+        
+        Args:
+            token: Your Meta API token
+            phone_number_id: Your WhatsApp Business Phone Number ID
+            version: API version
+            transport: Async HTTP transport, a new one owned by the client if None
+        """
+        self.token = token
+        self.phone_number_id = phone_number_id
+        self.base_url = f"{META_GRAPH_URL}/{version}/{phone_number_id}"
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        self._owns_transport = transport is None
+        self.transport = transport or AsyncHttpTransport()
+
+    async def __aenter__(self) -> "AsyncWhatsAppBusinessClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP session if it is owned by the client"""
+        if self._owns_transport:
+            await self.transport.close()
+
+    async def _post_message(self, payload: Dict) -> Dict:
+        response = await self.transport.post(
+            f"{self.base_url}/messages",
+            "meta.messages",
+            headers=self.headers,
+            json=payload
+        )
+        response.raise_for_status()
+        return await response.json()
+
+    @traced("meta.send_text_message")
+    async def send_text_message(self, to: str, message: str, preview_url: bool = False) -> Dict:
+        """
+        Send a text message to a WhatsApp number
+        
+        Args:
+            to: Recipient's phone number (international format without +)
+            message: Text message to send
+            preview_url: Whether to preview URLs in the message
+        """
+        try:
+            payload = {
+                "messaging_product": "whatsapp",
+                "recipient_type": "individual",
+                "to": to,
+                "type": "text",
+                "text": {
+                    "preview_url": preview_url,
+                    "body": message
+                }
+            }
+            
+            result = await self._post_message(payload)
+            OUTBOUND_SENDS.inc(channel="meta", type="text", status="sent")
+            logger.info("Message sent successfully to {to}", to=to, category="send")
+            return result
+            
+        except aiohttp.ClientError as e:
+            OUTBOUND_SENDS.inc(channel="meta", type="text", status="failed")
+            logger.error(f"Failed to send message to {to}: {str(e)}")
+            raise
+
+    @traced("meta.send_template_message")
+    async def send_template_message(self, to: str, template_name: str,
+                                    language_code: str, components: Optional[List[Dict]] = None) -> Dict:
+        """
+        Send a template message
+        
+        Args:
+            to: Recipient's phone number
+            template_name: Name of the template
+            language_code: Language code (e.g., "en")
+            components: Template components (optional)
+        """
+        try:
+            payload = {
+                "messaging_product": "whatsapp",
+                "recipient_type": "individual",
+                "to": to,
+                "type": "template",
+                "template": {
+                    "name": template_name,
+                    "language": {
+                        "code": language_code
+                    }
+                }
+            }
+
+            if components:
+                payload["template"]["components"] = components
+
+            result = await self._post_message(payload)
+            OUTBOUND_SENDS.inc(channel="meta", type="template", status="sent")
+            logger.info("Template message sent successfully to {to}", to=to, category="send")
+            return result
+            
+        except aiohttp.ClientError as e:
+            OUTBOUND_SENDS.inc(channel="meta", type="template", status="failed")
+            logger.error(f"Failed to send template message to {to}: {str(e)}")
+            raise
+
+    @traced("meta.send_media_message")
+    async def send_media_message(self, to: str, media_type: str, media_url: str,
+                                 caption: Optional[str] = None) -> Dict:
+        """
+        Send a media message (image, video, audio, document)
+        
+        Args:
+            to: Recipient's phone number
+            media_type: Type of media ('image', 'video', 'audio', 'document')
+            media_url: URL of the media file
+            caption: Optional caption for the media
+        """
+        try:
+            payload = {
+                "messaging_product": "whatsapp",
+                "recipient_type": "individual",
+                "to": to,
+                "type": media_type,
+                media_type: {
+                    "link": media_url
+                }
+            }
+
+            if caption and media_type in ['image', 'video', 'document']:
+                payload[media_type]["caption"] = caption
+
+            result = await self._post_message(payload)
+            OUTBOUND_SENDS.inc(channel="meta", type=media_type, status="sent")
+            logger.info("Media message sent successfully to {to}", to=to, category="send")
+            return result
+            
+        except aiohttp.ClientError as e:
+            OUTBOUND_SENDS.inc(channel="meta", type=media_type, status="failed")
+            logger.error(f"Failed to send media message to {to}: {str(e)}")
+            raise
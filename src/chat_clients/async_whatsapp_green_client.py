@@ -0,0 +1,146 @@
+import aiohttp
+from typing import Dict, Optional
+from loguru import logger
+
+from .client_metrics import OUTBOUND_SENDS
+from http_transport import AsyncHttpTransport
+from monitoring.tracing import traced
+from config.conf import GREEN_API_URL
+
+
+class AsyncWhatsAppGreenClient:
+    """asyncio version of WhatsAppGreenClient outbound methods"""
+
+    def __init__(self, instance_id: str, instance_token: str,
+                 transport: Optional[AsyncHttpTransport] = None):
+        """
+        Initialize async WhatsApp Green API Client
+        
+        Args:
+            instance_id: Your Green API Instance ID
+            instance_token: Your Green API Instance Token
+            transport: Async HTTP transport, a new one owned by the client if None
+        """
+        self.instance_id = instance_id
+        self.instance_token = instance_token
+        self.base_url = f"{GREEN_API_URL}/waInstance{instance_id}"
+        self._owns_transport = transport is None
+        self.transport = transport or AsyncHttpTransport()
+
+    async def __aenter__(self) -> "AsyncWhatsAppGreenClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP session if it is owned by the client"""
+        if self._owns_transport:
+            await self.transport.close()
+
+    @traced("green.send_text_message")
+    async def send_text_message(self, to: str, message: str) -> Dict:
+        """
+        Send a text message to a WhatsApp number
+        
+        Args:
+            to: Recipient's phone number (with country code, no +)
+            message: Text message to send
+        """
+        try:
+            endpoint = f"{self.base_url}/sendMessage/{self.instance_token}"
+            payload = {
+                "chatId": f"{to}@c.us" if "@c.us" not in to else to,
+                "message": message
+            }
+            
+            response = await self.transport.post(endpoint, "green.sendMessage", json=payload)
+            response.raise_for_status()
+            
+            OUTBOUND_SENDS.inc(channel="green", type="text", status="sent")
+            logger.info("Message sent successfully to {to}", to=to, category="send")
+            return await response.json()
+            
+        except aiohttp.ClientError as e:
+            OUTBOUND_SENDS.inc(channel="green", type="text", status="failed")
+            logger.error(f"Failed to send message to {to}: {str(e)}")
+            raise
+
+    @traced("green.send_file")
+    async def send_file(self, to: str, file_url: str, caption: Optional[str] = None) -> Dict:
+        """
+        Send a file to a WhatsApp number
+        
+        Args:
+            to: Recipient's phone number
+            file_url: URL of the file to send
+            caption: Optional caption for the file
+        """
+        try:
+            endpoint = f"{self.base_url}/sendFileByUrl/{self.instance_token}"
+            payload = {
+                "chatId": f"{to}@c.us",
+                "urlFile": file_url,
+                "fileName": file_url.split('/')[-1]
+            }
+            
+            if caption:
+                payload["caption"] = caption
+
+            response = await self.transport.post(endpoint, "green.sendFileByUrl", json=payload)
+            response.raise_for_status()
+            
+            OUTBOUND_SENDS.inc(channel="green", type="file", status="sent")
+            logger.info("File sent successfully to {to}", to=to, category="send")
+            return await response.json()
+            
+        except aiohttp.ClientError as e:
+            OUTBOUND_SENDS.inc(channel="green", type="file", status="failed")
+            logger.error(f"Failed to send file to {to}: {str(e)}")
+            raise
+
+    @traced("green.send_location")
+    async def send_location(self, to: str, latitude: float, longitude: float, name: Optional[str] = None) -> Dict:
+        """
+        Send a location to a WhatsApp number
+        
+        Args:
+            to: Recipient's phone number
+            latitude: Location latitude
+            longitude: Location longitude
+            name: Optional location name
+        """
+        try:
+            endpoint = f"{self.base_url}/sendLocation/{self.instance_token}"
+            payload = {
+                "chatId": f"{to}@c.us",
+                "latitude": latitude,
+                "longitude": longitude
+            }
+            
+            if name:
+                payload["nameLocation"] = name
+
+            response = await self.transport.post(endpoint, "green.sendLocation", json=payload)
+            response.raise_for_status()
+            
+            OUTBOUND_SENDS.inc(channel="green", type="location", status="sent")
+            logger.info("Location sent successfully to {to}", to=to, category="send")
+            return await response.json()
+            
+        except aiohttp.ClientError as e:
+            OUTBOUND_SENDS.inc(channel="green", type="location", status="failed")
+            logger.error(f"Failed to send location to {to}: {str(e)}")
+            raise
+
+    async def get_instance_status(self) -> Dict:
+        """Get the status of the WhatsApp instance"""
+        try:
+            endpoint = f"{self.base_url}/getStateInstance/{self.instance_token}"
+            response = await self.transport.get(endpoint, "green.getStateInstance")
+            response.raise_for_status()
+            return await response.json()
+            
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to get instance status: {str(e)}")
+            raise
@@ -0,0 +1,8 @@
+from monitoring.metrics import REGISTRY
+
+# Counters shared by the WhatsApp clients, labelled by channel ('green' or 'meta')
+INBOUND_MESSAGES = REGISTRY.counter("inbound_messages_total", "Incoming messages by type", ["channel", "type"])
+OUTBOUND_SENDS = REGISTRY.counter("outbound_sends_total", "Send requests by type and status",
+                                  ["channel", "type", "status"])
+DELIVERY_STATUSES = REGISTRY.counter("outbound_delivery_status_total",
+                                     "Delivery status updates of the sent messages", ["channel", "status"])
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+from loguru import logger
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+
+ACTIVE_LANES = REGISTRY.gauge("dispatcher_active_lanes", "Conversations with pending or running work", ["dispatcher"])
+PENDING_TASKS = REGISTRY.gauge("dispatcher_pending_tasks", "Tasks waiting or running in the dispatcher", ["dispatcher"])
+REJECTED_TASKS = REGISTRY.counter("dispatcher_rejected_total", "Tasks rejected because a limit was reached", ["dispatcher", "reason"])
+
+_Task = Tuple[Callable, tuple, dict]
+
+
+class KeyedDispatcher:
+    """
+    Runs tasks in order per key and in parallel across keys.
+
+    Every key (e.g. the sender's chatId) gets a serial lane: at most one of its
+    tasks runs at a time and tasks run in submission order. Lanes share a
+    bounded worker pool, and after each task a lane goes back to the end of the
+    pool queue so one busy conversation cannot starve the others.
+    """
+
+    def __init__(self, max_workers: int = 8, max_lane_size: int = 50,
+                 max_pending: int = 5000, name: str = "dispatcher", submit_timeout: float = 0.0):
+        """
+        Initialize the dispatcher
+
+        Args:
+            max_workers: Maximum number of tasks running at the same time across all lanes
+            max_lane_size: Maximum number of tasks queued in a single lane
+            max_pending: Maximum number of tasks queued across all lanes
+            name: Name used for the worker threads and metrics
+            submit_timeout: Seconds submit waits for room in a full dispatcher before rejecting the task.
+                A full lane rejects right away, so one busy sender cannot hold up the caller for the others
+        """
+        self.max_workers = max_workers
+        self.max_lane_size = max_lane_size
+        self.max_pending = max_pending
+        self.name = name
+        self.submit_timeout = submit_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._room = threading.Condition(self._lock)
+        self._lanes: Dict[Hashable, Deque[_Task]] = {}
+        self._pending = 0
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs) -> bool:
+        """
+        Queue a task in the lane of a key, waiting up to ``submit_timeout``
+        seconds if the dispatcher is full
+
+        Args:
+            key: Lane key, tasks with the same key run one after the other
+            fn: Function to run
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            False if the task was rejected because the lane or the dispatcher is full
+        """
+        deadline = time.monotonic() + self.submit_timeout
+        with self._lock:
+            while True:
+                lane = self._lanes.get(key)
+                if lane is not None and len(lane) >= self.max_lane_size:
+                    REJECTED_TASKS.inc(dispatcher=self.name, reason="lane_full")
+                    return False
+                if self._pending < self.max_pending:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    REJECTED_TASKS.inc(dispatcher=self.name, reason="dispatcher_full")
+                    return False
+                self._room.wait(remaining)
+            new_lane = lane is None
+            if new_lane:
+                lane = deque()
+                self._lanes[key] = lane
+            lane.append((fn, args, kwargs))
+            self._pending += 1
+        PENDING_TASKS.inc(dispatcher=self.name)
+        if new_lane:
+            ACTIVE_LANES.inc(dispatcher=self.name)
+            self._executor.submit(self._run_next, key)
+        return True
+
+    def _run_next(self, key: Hashable):
+        with self._lock:
+            fn, args, kwargs = self._lanes[key][0]
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error processing task for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                lane = self._lanes[key]
+                lane.popleft()
+                self._pending -= 1
+                self._room.notify_all()
+                if not lane:
+                    del self._lanes[key]
+                    if not self._lanes:
+                        self._idle.notify_all()
+            PENDING_TASKS.dec(dispatcher=self.name)
+            if lane:
+                self._executor.submit(self._run_next, key)
+            else:
+                ACTIVE_LANES.dec(dispatcher=self.name)
+
+    def lane_size(self, key: Hashable) -> int:
+        """Number of tasks queued or running for a key"""
+        with self._lock:
+            lane = self._lanes.get(key)
+            return len(lane) if lane else 0
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop accepting work and optionally wait for the queued tasks
+
+        Args:
+            wait: Whether to wait until every lane is drained
+        """
+        if wait:
+            with self._idle:
+                self._idle.wait_for(lambda: not self._lanes)
+        self._executor.shutdown(wait=wait)
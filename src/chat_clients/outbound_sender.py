@@ -0,0 +1,286 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from loguru import logger
+import heapq
+import re
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+from monitoring.tracing import Span, current_span, start_span
+
+OUTBOUND_MESSAGES = REGISTRY.counter("outbound_messages_total", "Outbound messages by outcome", ["sender", "outcome"])
+OUTBOUND_DELAYED = REGISTRY.counter("outbound_delayed_total", "Sends delayed by a rate limiter", ["sender", "limiter"])
+OUTBOUND_PENDING = REGISTRY.gauge("outbound_pending_messages", "Messages waiting to be sent", ["sender"])
+
+# Where a long message is split, from the most to the least preferred
+_BOUNDARIES = [re.compile(r"(\n\s*\n)"), re.compile(r"(\n)"), re.compile(r"((?<=[.!?])\s+)"), re.compile(r"(\s+)")]
+
+
+def split_message(text: str, max_length: int) -> List[str]:
+    """
+    Split a text into parts of at most max_length characters
+
+    Parts end at paragraph, line, sentence or word boundaries. Words are only
+    cut when they do not fit in a part on their own.
+
+    Args:
+        text: Text to split
+        max_length: Longest part
+
+    Returns:
+        The parts, a single one if the text fits
+    """
+    if len(text) <= max_length:
+        return [text]
+    for boundary in _BOUNDARIES:
+        # Pieces at even positions, the separators between them at odd ones
+        tokens = boundary.split(text)
+        if len(tokens) > 1:
+            break
+    else:
+        return [text[i:i + max_length] for i in range(0, len(text), max_length)]
+    parts = []
+    current = tokens[0]
+    for separator, piece in zip(tokens[1::2], tokens[2::2]):
+        if len(current) + len(separator) + len(piece) <= max_length:
+            current += separator + piece
+        else:
+            if current:
+                parts.extend(split_message(current, max_length))
+            current = piece
+    if current:
+        parts.extend(split_message(current, max_length))
+    return parts
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, 0 if there is one now"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundSender:
+    """
+    Rate limited outbound queue for text messages.
+
+    Messages to the same chat queued within ``coalesce_window`` seconds are
+    joined into a single send, as long as the result fits in
+    ``max_message_length``. Every send takes a token from the instance bucket
+    and from the recipient bucket, waiting until both have one. A chat has at
+    most one send in flight, so its messages arrive in the order they were queued.
+    Messages longer than ``max_message_length`` are split with split_message
+    when they are queued.
+    """
+
+    def __init__(self, send_fn: Callable[[str, str], Any], name: str,
+                 instance_rate: float, instance_burst: float,
+                 recipient_rate: float, recipient_burst: float,
+                 coalesce_window: float = 0.3, max_message_length: int = 4096,
+                 max_pending: int = 1000, workers: int = 4, separator: str = "\n\n"):
+        """
+        Initialize the outbound sender
+
+        Args:
+            send_fn: Function sending a text message, called as send_fn(to, message)
+            name: Name used to label the metrics (e.g. 'green' or 'meta')
+            instance_rate: Sends per second allowed for the whole instance
+            instance_burst: Sends allowed in a burst for the whole instance
+            recipient_rate: Sends per second allowed for a single recipient
+            recipient_burst: Sends allowed in a burst for a single recipient
+            coalesce_window: Seconds to wait for more messages to the same chat
+            max_message_length: Longest text the API accepts in one message
+            max_pending: Maximum number of queued messages, new ones are dropped beyond it
+            workers: Number of threads performing the sends
+            separator: Text placed between coalesced messages
+        """
+        self.send_fn = send_fn
+        self.name = name
+        self.coalesce_window = coalesce_window
+        self.max_message_length = max_message_length
+        self.max_pending = max_pending
+        self.separator = separator
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self._instance_bucket = TokenBucket(instance_rate, instance_burst)
+        self._recipient_buckets: Dict[str, TokenBucket] = {}
+        # Chat -> messages not sent yet. A chat is in the heap while it has
+        # messages and no send in flight
+        self._buffers: Dict[str, List[str]] = {}
+        self._in_flight: Set[str] = set()
+        # Span of the first message buffered for each chat, the send is traced under it
+        self._parents: Dict[str, Optional[Span]] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._pending = 0
+        self._dropped = 0
+        self._delayed = 0
+        self._coalesced = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-send")
+        self._thread = threading.Thread(target=self._run, name=f"{name}-outbound", daemon=True)
+        self._thread.start()
+
+    def send_text(self, to: str, message: str) -> bool:
+        """
+        Queue a text message
+
+        Args:
+            to: Recipient chat
+            message: Text message to send
+
+        Returns:
+            False if the message was dropped because the queue is full
+        """
+        parts = split_message(message, self.max_message_length)
+        with self._cond:
+            if self._pending + len(parts) > self.max_pending:
+                self._dropped += 1
+                OUTBOUND_MESSAGES.inc(sender=self.name, outcome="dropped")
+                logger.warning("Outbound queue full, dropped message to {to}", to=to, category="send")
+                return False
+            buffer = self._buffers.get(to)
+            if buffer is None:
+                self._buffers[to] = parts
+                self._parents[to] = current_span()
+                if to not in self._in_flight:
+                    heapq.heappush(self._schedule, (time.monotonic() + self.coalesce_window, to))
+                    self._cond.notify()
+            else:
+                buffer.extend(parts)
+            self._pending += len(parts)
+        OUTBOUND_PENDING.inc(len(parts), sender=self.name)
+        return True
+
+    def _recipient_bucket(self, to: str) -> TokenBucket:
+        bucket = self._recipient_buckets.get(to)
+        if bucket is None:
+            bucket = TokenBucket(self.recipient_rate, self.recipient_burst)
+            self._recipient_buckets[to] = bucket
+        return bucket
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # When stopping, sends in flight may still schedule the rest of their chat
+                while not self._schedule and (not self._stopping or self._in_flight):
+                    self._cond.wait()
+                if not self._schedule:
+                    return
+                ready_at, to = self._schedule[0]
+                now = time.monotonic()
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                wait = max(self._instance_bucket.wait_time(now), self._recipient_bucket(to).wait_time(now))
+                if wait > 0:
+                    limiter = "instance" if self._instance_bucket.wait_time(now) > 0 else "recipient"
+                    self._delayed += 1
+                    OUTBOUND_DELAYED.inc(sender=self.name, limiter=limiter)
+                    heapq.heapreplace(self._schedule, (now + wait, to))
+                    continue
+                heapq.heappop(self._schedule)
+                self._instance_bucket.take(now)
+                self._recipient_bucket(to).take(now)
+                batch, rest = self._take_batch(self._buffers.pop(to))
+                parent = self._parents.get(to) if rest else self._parents.pop(to, None)
+                if rest:
+                    # Scheduled again when this send completes
+                    self._buffers[to] = rest
+                self._in_flight.add(to)
+                self._prune_buckets(now)
+            self._executor.submit(self._send, to, batch, parent)
+
+    def _take_batch(self, messages: List[str]) -> Tuple[List[str], List[str]]:
+        """Split the longest prefix of messages that fits in a single send"""
+        length = len(messages[0])
+        count = 1
+        while count < len(messages):
+            length += len(self.separator) + len(messages[count])
+            if length > self.max_message_length:
+                break
+            count += 1
+        return messages[:count], messages[count:]
+
+    def _prune_buckets(self, now: float):
+        # A full bucket behaves like a new one, so idle recipients can be forgotten
+        if len(self._recipient_buckets) > 2 * max(self.max_pending, 1):
+            for to in [to for to, bucket in self._recipient_buckets.items()
+                       if to not in self._buffers and to not in self._in_flight and bucket.is_full(now)]:
+                del self._recipient_buckets[to]
+
+    def _send(self, to: str, batch: List[str], parent: Optional[Span] = None):
+        with self._cond:
+            self._pending -= len(batch)
+            self._coalesced += len(batch) - 1
+        OUTBOUND_PENDING.dec(len(batch), sender=self.name)
+        if len(batch) > 1:
+            OUTBOUND_MESSAGES.inc(len(batch) - 1, sender=self.name, outcome="coalesced")
+        try:
+            with start_span(f"{self.name}.outbound_send", parent=parent, messages=len(batch)):
+                self.send_fn(to, self.separator.join(batch))
+            OUTBOUND_MESSAGES.inc(sender=self.name, outcome="sent")
+        except Exception as e:
+            OUTBOUND_MESSAGES.inc(sender=self.name, outcome="failed")
+            logger.error(f"Failed to send queued message to {to}: {str(e)}")
+        finally:
+            with self._cond:
+                self._in_flight.discard(to)
+                if to in self._buffers:
+                    heapq.heappush(self._schedule, (time.monotonic(), to))
+                self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the limiter state and the queue counters"""
+        with self._cond:
+            now = time.monotonic()
+            self._instance_bucket.wait_time(now)
+            return {
+                "pending": self._pending,
+                "chats_waiting": len(self._buffers),
+                "sends_in_flight": len(self._in_flight),
+                "instance_tokens": self._instance_bucket.tokens,
+                "tracked_recipients": len(self._recipient_buckets),
+                "dropped": self._dropped,
+                "delayed": self._delayed,
+                "coalesced": self._coalesced,
+            }
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Send what is queued, ignoring the coalescing window, and stop
+
+        Args:
+            timeout: Maximum time to wait for the queue to drain
+        """
+        with self._cond:
+            self._stopping = True
+            now = time.monotonic()
+            self._schedule = [(min(ready_at, now), to) for ready_at, to in self._schedule]
+            heapq.heapify(self._schedule)
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
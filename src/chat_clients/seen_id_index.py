@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from typing import Optional
+from loguru import logger
+import sqlite3
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+
+DUPLICATES = REGISTRY.counter("webhook_duplicates_total", "Redelivered webhook messages suppressed", ["index"])
+
+
+class SeenIdIndex:
+    """
+    Bounded, time-windowed index of the message ids already received.
+
+    Ids are kept in insertion order, so expired ids are dropped from the front
+    and the oldest ones are evicted once ``max_entries`` is reached. Lookups
+    and inserts are O(1).
+    """
+
+    def __init__(self, window_seconds: float = 24 * 60 * 60, max_entries: int = 200000, name: str = "memory"):
+        """
+        Initialize the index
+
+        Args:
+            window_seconds: Time during which a redelivered id is considered a duplicate
+            max_entries: Maximum number of ids remembered
+            name: Name used to label the metrics
+        """
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.name = name
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def check_and_add(self, message_id: Optional[str]) -> bool:
+        """
+        Record a message id
+
+        Args:
+            message_id: Provider message id (idMessage or messages[].id)
+
+        Returns:
+            True if the id was already seen within the window, i.e. it is a duplicate
+        """
+        if not message_id:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if message_id in self._seen:
+                self.suppressed += 1
+                DUPLICATES.inc(index=self.name)
+                return True
+            self._seen[message_id] = now
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False
+
+    def discard(self, message_id: Optional[str]):
+        """
+        Forget a message id, e.g. when its message could not be accepted and
+        the provider will deliver it again
+        """
+        if not message_id:
+            return
+        with self._lock:
+            self._seen.pop(message_id, None)
+
+    def _expire(self, now: float):
+        deadline = now - self.window_seconds
+        while self._seen:
+            oldest = next(iter(self._seen.values()))
+            if oldest > deadline:
+                break
+            self._seen.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class SqliteSeenIdIndex(SeenIdIndex):
+    """
+    SeenIdIndex stored in SQLite, shared by every worker process using the same
+    file and kept across restarts.
+    """
+
+    def __init__(self, path: str, window_seconds: float = 24 * 60 * 60, max_entries: int = 1000000,
+                 purge_every: int = 1000, name: str = "sqlite"):
+        """
+        Initialize the index
+
+        Args:
+            path: SQLite database file
+            window_seconds: Time during which a redelivered id is considered a duplicate
+            max_entries: Maximum number of ids remembered
+            purge_every: Number of inserts between purges of expired ids
+            name: Name used to label the metrics
+        """
+        super().__init__(window_seconds, max_entries, name)
+        self.path = path
+        self.purge_every = purge_every
+        self._inserts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen_ids (id TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_ids_seen_at ON seen_ids (seen_at)")
+
+    def check_and_add(self, message_id: Optional[str]) -> bool:
+        if not message_id:
+            return False
+        # Wall clock, since the timestamps are shared between processes
+        now = time.time()
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO seen_ids (id, seen_at) VALUES (?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?",
+                    (message_id, now, now - self.window_seconds)
+                )
+            except sqlite3.Error as e:
+                # Better to process a duplicate than to lose a message
+                logger.error(f"Failed to check message id {message_id}: {str(e)}")
+                return False
+            if cursor.rowcount == 0:
+                self.suppressed += 1
+                DUPLICATES.inc(index=self.name)
+                return True
+            self._inserts += 1
+            if self._inserts % self.purge_every == 0:
+                self._purge(now)
+            return False
+
+    def discard(self, message_id: Optional[str]):
+        if not message_id:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM seen_ids WHERE id = ?", (message_id,))
+            except sqlite3.Error as e:
+                logger.error(f"Failed to forget message id {message_id}: {str(e)}")
+
+    def _purge(self, now: float):
+        # The id is already recorded, a failed purge is retried with the next one
+        try:
+            self._conn.execute("DELETE FROM seen_ids WHERE seen_at < ?", (now - self.window_seconds,))
+            self._conn.execute(
+                "DELETE FROM seen_ids WHERE id IN "
+                "(SELECT id FROM seen_ids ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to purge expired message ids: {str(e)}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen_ids").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
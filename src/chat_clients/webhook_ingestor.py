@@ -0,0 +1,189 @@
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+import asyncio
+import inspect
+import queue
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+
+QUEUE_DEPTH = REGISTRY.gauge("webhook_queue_depth", "Webhook payloads waiting to be processed", ["ingestor"])
+QUEUE_WAIT = REGISTRY.histogram("webhook_queue_wait_seconds", "Time a webhook payload waits in the queue", ["ingestor"])
+PROCESSING_TIME = REGISTRY.histogram("webhook_processing_seconds", "Time spent processing a webhook payload", ["ingestor"])
+REJECTED = REGISTRY.counter("webhook_rejected_total", "Webhook payloads rejected because the queue was full", ["ingestor"])
+DROPPED = REGISTRY.counter("webhook_dropped_total", "Queued webhook payloads the handler could not accept", ["ingestor"])
+
+_STOP = object()
+
+
+class WebhookIngestor:
+    """
+    Decouples webhook reception from message processing.
+
+    The webhook handler only enqueues the payload and returns, while a pool of
+    workers (threads or asyncio tasks) drains the queue calling ``handler``.
+    The webhook has already been answered by then, so a payload the handler
+    rejects (returning False) is counted as dropped and passed to ``on_rejected``.
+    """
+
+    def __init__(self, handler: Callable[[Dict], Any], workers: int = 4,
+                 max_queue_size: int = 1000, mode: str = "threads", name: str = "webhook",
+                 on_rejected: Optional[Callable[[Dict], Any]] = None):
+        """
+        Initialize the webhook ingestor
+
+        Args:
+            handler: Function (or coroutine function in asyncio mode) called with each payload
+            workers: Number of workers draining the queue
+            max_queue_size: Maximum number of pending payloads, 0 for unbounded
+            mode: Worker pool type ('threads' or 'asyncio')
+            name: Name used to label the metrics
+            on_rejected: Optional function called with each payload the handler returned False for
+        """
+        if mode not in ("threads", "asyncio"):
+            raise ValueError(f"Unknown ingestion mode: {mode}")
+        self.handler = handler
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.mode = mode
+        self.name = name
+        self.on_rejected = on_rejected
+        self._queue: Optional[queue.Queue] = None
+        self._threads: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_queue: Optional[asyncio.Queue] = None
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker pool"""
+        with self._start_lock:
+            if not self._started.is_set():
+                self._start_workers()
+
+    def _start_workers(self):
+        if self.mode == "threads":
+            self._queue = queue.Queue()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._thread_worker, name=f"{self.name}-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._started.set()
+        else:
+            ready = threading.Event()
+            thread = threading.Thread(target=self._run_loop, args=(ready,), name=f"{self.name}-loop", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            ready.wait()
+        logger.info(f"Webhook ingestor '{self.name}' started with {self.workers} {self.mode} workers")
+
+    def submit(self, payload: Dict) -> bool:
+        """
+        Enqueue a webhook payload without waiting for it to be processed
+
+        Args:
+            payload: Webhook payload
+
+        Returns:
+            False if the queue is full and the payload was rejected
+        """
+        if not self._started.is_set():
+            self.start()
+        item = (time.perf_counter(), payload)
+        with self._depth_lock:
+            if self.max_queue_size and self._depth >= self.max_queue_size:
+                REJECTED.inc(ingestor=self.name)
+                return False
+            self._depth += 1
+        QUEUE_DEPTH.inc(ingestor=self.name)
+        if self.mode == "threads":
+            self._queue.put_nowait(item)
+        else:
+            self._loop.call_soon_threadsafe(self._async_queue.put_nowait, item)
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the workers once the queued payloads have been processed
+
+        Args:
+            timeout: Maximum time to wait for each worker to finish
+        """
+        if not self._started.is_set():
+            return
+        if self.mode == "threads":
+            for _ in self._threads:
+                self._queue.put(_STOP)
+        else:
+            for _ in range(self.workers):
+                self._loop.call_soon_threadsafe(self._async_queue.put_nowait, _STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._started.clear()
+
+    def qsize(self) -> int:
+        """Number of payloads waiting to be processed"""
+        return self._depth
+
+    def _take(self, item) -> Dict:
+        enqueued_at, payload = item
+        with self._depth_lock:
+            self._depth -= 1
+        QUEUE_DEPTH.dec(ingestor=self.name)
+        QUEUE_WAIT.observe(time.perf_counter() - enqueued_at, ingestor=self.name)
+        return payload
+
+    def _dropped(self, payload: Dict):
+        DROPPED.inc(ingestor=self.name)
+        logger.error(f"Webhook payload rejected after it was acknowledged, dropped: {payload}")
+        if self.on_rejected is not None:
+            self.on_rejected(payload)
+
+    def _thread_worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            payload = self._take(item)
+            start = time.perf_counter()
+            try:
+                if self.handler(payload) is False:
+                    self._dropped(payload)
+            except Exception as e:
+                logger.error(f"Error processing webhook payload: {str(e)}")
+            finally:
+                PROCESSING_TIME.observe(time.perf_counter() - start, ingestor=self.name)
+
+    def _run_loop(self, ready: threading.Event):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._async_queue = asyncio.Queue()
+        tasks = [self._loop.create_task(self._async_worker()) for _ in range(self.workers)]
+        self._started.set()
+        ready.set()
+        self._loop.run_until_complete(asyncio.gather(*tasks))
+        self._loop.close()
+
+    async def _async_worker(self):
+        is_coroutine = inspect.iscoroutinefunction(self.handler)
+        while True:
+            item = await self._async_queue.get()
+            if item is _STOP:
+                break
+            payload = self._take(item)
+            start = time.perf_counter()
+            try:
+                if is_coroutine:
+                    accepted = await self.handler(payload)
+                else:
+                    accepted = await asyncio.to_thread(self.handler, payload)
+                if accepted is False:
+                    self._dropped(payload)
+            except Exception as e:
+                logger.error(f"Error processing webhook payload: {str(e)}")
+            finally:
+                PROCESSING_TIME.observe(time.perf_counter() - start, ingestor=self.name)
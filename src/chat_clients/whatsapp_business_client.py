@@ -1,12 +1,23 @@
 import requests
 from flask import Flask, request, Response
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import json
 from datetime import datetime
 from loguru import logger
 
+from .outbound_sender import OutboundSender
+from .seen_id_index import SeenIdIndex
+from .client_metrics import INBOUND_MESSAGES, OUTBOUND_SENDS, DELIVERY_STATUSES
+from http_transport import HttpTransport, get_default_transport
+from monitoring.tracing import start_span, traced
+from config.conf import (META_GRAPH_URL, META_SEND_INSTANCE_RATE, META_SEND_INSTANCE_BURST,
+                         META_SEND_RECIPIENT_RATE, META_SEND_RECIPIENT_BURST, META_MAX_MESSAGE_LENGTH,
+                         SEND_COALESCE_WINDOW, SEND_QUEUE_SIZE)
+
+
 class WhatsAppBusinessClient:
-    def __init__(self, token: str, phone_number_id: str, version: str = 'v17.0'):
+    def __init__(self, token: str, phone_number_id: str, version: str = 'v17.0',
+                 transport: Optional[HttpTransport] = None, seen_ids: Optional[SeenIdIndex] = None):
         """
         Initialize WhatsApp Client with your Meta credentials
         
@@ -14,15 +25,21 @@ class WhatsAppBusinessClient:
             token: Your Meta API token
             phone_number_id: Your WhatsApp Business Phone Number ID
             version: API version
+            transport: HTTP transport, the shared default one if None
+            seen_ids: Optional index of received message ids, used to ignore redeliveries
         """
+        self.seen_ids = seen_ids
+        self.transport = transport or get_default_transport()
+        self.outbox: Optional[OutboundSender] = None
         self.token = token
         self.phone_number_id = phone_number_id
-        self.base_url = f"https://graph.facebook.com/{version}/{phone_number_id}"
+        self.base_url = f"{META_GRAPH_URL}/{version}/{phone_number_id}"
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
 
+    @traced("meta.send_text_message")
     def send_text_message(self, to: str, message: str, preview_url: bool = False) -> Dict:
         """
         Send a text message to a WhatsApp number
@@ -44,20 +61,24 @@ class WhatsAppBusinessClient:
                 }
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/messages",
+                "meta.messages",
                 headers=self.headers,
                 json=payload
             )
             response.raise_for_status()
             
-            logger.info(f"Message sent successfully to {to}")
+            OUTBOUND_SENDS.inc(channel="meta", type="text", status="sent")
+            logger.info("Message sent successfully to {to}", to=to, category="send")
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            OUTBOUND_SENDS.inc(channel="meta", type="text", status="failed")
             logger.error(f"Failed to send message to {to}: {str(e)}")
             raise
 
+    @traced("meta.send_template_message")
     def send_template_message(self, to: str, template_name: str, 
                             language_code: str, components: Optional[List[Dict]] = None) -> Dict:
         """
@@ -86,20 +107,24 @@ class WhatsAppBusinessClient:
             if components:
                 payload["template"]["components"] = components
 
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/messages",
+                "meta.messages",
                 headers=self.headers,
                 json=payload
             )
             response.raise_for_status()
             
-            logger.info(f"Template message sent successfully to {to}")
+            OUTBOUND_SENDS.inc(channel="meta", type="template", status="sent")
+            logger.info("Template message sent successfully to {to}", to=to, category="send")
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            OUTBOUND_SENDS.inc(channel="meta", type="template", status="failed")
             logger.error(f"Failed to send template message to {to}: {str(e)}")
             raise
 
+    @traced("meta.send_media_message")
     def send_media_message(self, to: str, media_type: str, media_url: str, 
                           caption: Optional[str] = None) -> Dict:
         """
@@ -125,20 +150,58 @@ class WhatsAppBusinessClient:
             if caption and media_type in ['image', 'video', 'document']:
                 payload[media_type]["caption"] = caption
 
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/messages",
+                "meta.messages",
                 headers=self.headers,
                 json=payload
             )
             response.raise_for_status()
             
-            logger.info(f"Media message sent successfully to {to}")
+            OUTBOUND_SENDS.inc(channel="meta", type=media_type, status="sent")
+            logger.info("Media message sent successfully to {to}", to=to, category="send")
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            OUTBOUND_SENDS.inc(channel="meta", type=media_type, status="failed")
             logger.error(f"Failed to send media message to {to}: {str(e)}")
             raise
 
+    def enable_send_queue(self, **kwargs):
+        """
+        Send queued text messages through a rate limited, coalescing outbound queue
+        
+        Args:
+            **kwargs: OutboundSender arguments overriding the config/conf.py limits
+        """
+        limits = {
+            "instance_rate": META_SEND_INSTANCE_RATE,
+            "instance_burst": META_SEND_INSTANCE_BURST,
+            "recipient_rate": META_SEND_RECIPIENT_RATE,
+            "recipient_burst": META_SEND_RECIPIENT_BURST,
+            "max_message_length": META_MAX_MESSAGE_LENGTH,
+            "coalesce_window": SEND_COALESCE_WINDOW,
+            "max_pending": SEND_QUEUE_SIZE,
+            **kwargs
+        }
+        self.outbox = OutboundSender(self.send_text_message, "meta", **limits)
+
+    def queue_text_message(self, to: str, message: str) -> bool:
+        """
+        Send a text message through the outbound queue, or right away if it is not enabled
+        
+        Args:
+            to: Recipient's phone number
+            message: Text message to send
+
+        Returns:
+            False if the message was dropped
+        """
+        if self.outbox is None:
+            self.send_text_message(to, message)
+            return True
+        return self.outbox.send_text(to, message)
+
     def setup_webhook(self, app: Flask, path: str, verify_token: str):
         """
         Setup webhook endpoints for receiving messages
@@ -164,26 +227,63 @@ class WhatsAppBusinessClient:
         @app.route(path, methods=['POST'])
         def webhook():
             """Handle incoming webhook events"""
-            data = request.get_json()
+            data = request.get_json(silent=True)
             
-            if data['object']:
-                if (data.get('entry') and
-                    data['entry'][0].get('changes') and
-                    data['entry'][0]['changes'][0].get('value')):
-                    
-                    value = data['entry'][0]['changes'][0]['value']
-                    
-                    # Handle different types of messages
-                    if value.get('messages'):
-                        message = value['messages'][0]
-                        self._handle_message(message, value)
-                    elif value.get('statuses'):
-                        status = value['statuses'][0]
-                        self._handle_status_update(status)
-                    
+            if isinstance(data, dict) and data.get('object'):
+                with start_span("webhook", object=data.get('object')):
+                    self._dispatch_webhook(data)
                 return 'EVENT_RECEIVED'
             return Response(status=404)
 
+    def _dispatch_webhook(self, data: Dict) -> Tuple[int, int]:
+        """
+        Collect every message and status of a webhook payload and dispatch them
+        
+        Meta batches several entries, changes, messages and statuses in a single
+        POST under load, so all of them are walked in one pass.
+        
+        Args:
+            data: Webhook payload
+
+        Returns:
+            Number of messages and number of statuses dispatched
+        """
+        messages = []
+        statuses = []
+        for entry in data.get('entry') or []:
+            for change in entry.get('changes') or []:
+                value = change.get('value')
+                if not value:
+                    continue
+                for message in value.get('messages') or []:
+                    if self.seen_ids is not None and self.seen_ids.check_and_add(message.get('id')):
+                        continue
+                    messages.append((message, value))
+                statuses.extend(value.get('statuses') or [])
+
+        if messages:
+            try:
+                self._handle_messages(messages)
+            except Exception:
+                # Meta delivers the payload again after an error, its messages are not duplicates
+                if self.seen_ids is not None:
+                    for message, _ in messages:
+                        self.seen_ids.discard(message.get('id'))
+                raise
+        if statuses:
+            self._handle_status_updates(statuses)
+        return len(messages), len(statuses)
+
+    def _handle_messages(self, messages: List[Tuple[Dict, Dict]]):
+        """
+        Handle the messages of a webhook payload. Override it to process them in bulk
+        
+        Args:
+            messages: List of (message, value) pairs, value being the object containing the message
+        """
+        for message, value in messages:
+            self._handle_message(message, value)
+
     def _handle_message(self, message: Dict, value: Dict):
         """
         Handle different types of incoming messages
@@ -192,27 +292,32 @@ class WhatsAppBusinessClient:
             message: Message data from webhook
             value: Complete value object from webhook
         """
-        try:
-            msg_type = message.get('type')
-            from_number = value.get('contacts', [{}])[0].get('wa_id')
+        with start_span("handle_message", message_id=message.get('id'), type=message.get('type')):
+            try:
+                msg_type = message.get('type')
+                INBOUND_MESSAGES.inc(channel="meta", type=msg_type or "unknown")
+                # With batched messages contacts[0] may be another sender, 'from' is per message
+                from_number = message.get('from') or value.get('contacts', [{}])[0].get('wa_id')
             
-            if msg_type == 'text':
-                text = message.get('text', {}).get('body', '')
-                logger.info(f"Received text message from {from_number}: {text}")
-                self._process_text_message(from_number, text)
+                if msg_type == 'text':
+                    text = message.get('text', {}).get('body', '')
+                    logger.info("Received text message from {sender}: {text}", sender=from_number, text=text,
+                                category="inbound")
+                    self._process_text_message(from_number, text)
                 
-            elif msg_type in ['image', 'video', 'audio', 'document']:
-                media_id = message.get(msg_type, {}).get('id')
-                logger.info(f"Received {msg_type} message from {from_number}")
-                self._process_media_message(from_number, msg_type, media_id)
+                elif msg_type in ['image', 'video', 'audio', 'document']:
+                    media_id = message.get(msg_type, {}).get('id')
+                    logger.info("Received {type} message from {sender}", type=msg_type, sender=from_number,
+                                category="inbound")
+                    self._process_media_message(from_number, msg_type, media_id)
                 
-            elif msg_type == 'location':
-                location = message.get('location', {})
-                logger.info(f"Received location from {from_number}")
-                self._process_location_message(from_number, location)
+                elif msg_type == 'location':
+                    location = message.get('location', {})
+                    logger.info("Received location from {sender}", sender=from_number, category="inbound")
+                    self._process_location_message(from_number, location)
                 
-        except Exception as e:
-            logger.error(f"Error handling message: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error handling message: {str(e)}")
 
     def _process_text_message(self, from_number: str, text: str):
         """Override this method to handle text messages"""
@@ -226,12 +331,24 @@ class WhatsAppBusinessClient:
         """Override this method to handle location messages"""
         pass
 
+    def _handle_status_updates(self, statuses: List[Dict]):
+        """
+        Handle the status updates of a webhook payload
+        
+        Args:
+            statuses: Status objects from webhook
+        """
+        for status in statuses:
+            self._handle_status_update(status)
+
     def _handle_status_update(self, status: Dict):
         """Handle message status updates"""
         try:
             status_type = status.get('status')
             message_id = status.get('id')
-            logger.info(f"Message {message_id} status: {status_type}")
+            logger.info("Message {message_id} status: {status}", message_id=message_id, status=status_type,
+                        category="send")
+            DELIVERY_STATUSES.inc(channel="meta", status=status_type or "unknown")
             
         except Exception as e:
             logger.error(f"Error handling status update: {str(e)}")
\ No newline at end of file
@@ -2,23 +2,47 @@ import requests
 from flask import Flask, request, Response
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+import contextvars
 import os
-from pprint import pprint
 from loguru import logger
 
+from .webhook_ingestor import WebhookIngestor
+from .keyed_dispatcher import KeyedDispatcher
+from .outbound_sender import OutboundSender
+from .seen_id_index import SeenIdIndex
+from .client_metrics import INBOUND_MESSAGES, OUTBOUND_SENDS, DELIVERY_STATUSES
+from http_transport import HttpTransport, get_default_transport
+from monitoring.tracing import start_span, traced
+from config.conf import (GREEN_API_URL, GREEN_SEND_INSTANCE_RATE, GREEN_SEND_INSTANCE_BURST,
+                         GREEN_SEND_RECIPIENT_RATE, GREEN_SEND_RECIPIENT_BURST, GREEN_MAX_MESSAGE_LENGTH,
+                         SEND_COALESCE_WINDOW, SEND_QUEUE_SIZE)
+
+
 class WhatsAppGreenClient:
-    def __init__(self, instance_id: str, instance_token: str):
+    def __init__(self, instance_id: str, instance_token: str,
+                 dispatcher: Optional[KeyedDispatcher] = None,
+                 transport: Optional[HttpTransport] = None,
+                 seen_ids: Optional[SeenIdIndex] = None):
         """
         Initialize WhatsApp Green API Client
         
         Args:
             instance_id: Your Green API Instance ID
             instance_token: Your Green API Instance Token
+            dispatcher: Optional dispatcher. If given, messages are processed in order
+                per sender and in parallel across senders on its worker pool
+            transport: HTTP transport, the shared default one if None
+            seen_ids: Optional index of received idMessage values, used to ignore redeliveries
         """
+        self.dispatcher = dispatcher
+        self.seen_ids = seen_ids
+        self.transport = transport or get_default_transport()
+        self.outbox: Optional[OutboundSender] = None
         self.instance_id = os.getenv('GREEN_API_INSTANCE_ID')
         self.instance_token = os.getenv('GREEN_API_INSTANCE_TOKEN')
-        self.base_url = f"https://7105.api.green-api.com/waInstance{instance_id}"
+        self.base_url = f"{GREEN_API_URL}/waInstance{instance_id}"
 
+    @traced("green.send_text_message")
     def send_text_message(self, to: str, message: str) -> Dict:
         """
         Send a text message to a WhatsApp number
@@ -34,19 +58,23 @@ class WhatsAppGreenClient:
                 "message": message
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 endpoint,
+                "green.sendMessage",
                 json=payload
             )
             response.raise_for_status()
             
-            logger.info(f"Message sent successfully to {to}")
+            OUTBOUND_SENDS.inc(channel="green", type="text", status="sent")
+            logger.info("Message sent successfully to {to}", to=to, category="send")
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            OUTBOUND_SENDS.inc(channel="green", type="text", status="failed")
             logger.error(f"Failed to send message to {to}: {str(e)}")
             raise
 
+    @traced("green.send_file")
     def send_file(self, to: str, file_url: str, caption: Optional[str] = None) -> Dict:
         """
         Send a file to a WhatsApp number
@@ -67,19 +95,23 @@ class WhatsAppGreenClient:
             if caption:
                 payload["caption"] = caption
 
-            response = requests.post(
+            response = self.transport.post(
                 endpoint,
+                "green.sendFileByUrl",
                 json=payload
             )
             response.raise_for_status()
             
-            logger.info(f"File sent successfully to {to}")
+            OUTBOUND_SENDS.inc(channel="green", type="file", status="sent")
+            logger.info("File sent successfully to {to}", to=to, category="send")
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            OUTBOUND_SENDS.inc(channel="green", type="file", status="failed")
             logger.error(f"Failed to send file to {to}: {str(e)}")
             raise
 
+    @traced("green.send_location")
     def send_location(self, to: str, latitude: float, longitude: float, name: Optional[str] = None) -> Dict:
         """
         Send a location to a WhatsApp number
@@ -101,20 +133,59 @@ class WhatsAppGreenClient:
             if name:
                 payload["nameLocation"] = name
 
-            response = requests.post(
+            response = self.transport.post(
                 endpoint,
+                "green.sendLocation",
                 json=payload
             )
             response.raise_for_status()
             
-            logger.info(f"Location sent successfully to {to}")
+            OUTBOUND_SENDS.inc(channel="green", type="location", status="sent")
+            logger.info("Location sent successfully to {to}", to=to, category="send")
             return response.json()
             
         except requests.exceptions.RequestException as e:
+            OUTBOUND_SENDS.inc(channel="green", type="location", status="failed")
             logger.error(f"Failed to send location to {to}: {str(e)}")
             raise
 
-    def setup_webhook(self, app: Flask, path: str, webhook_token: str):
+    def enable_send_queue(self, **kwargs):
+        """
+        Send queued text messages through a rate limited, coalescing outbound queue
+        
+        Args:
+            **kwargs: OutboundSender arguments overriding the config/conf.py limits
+        """
+        limits = {
+            "instance_rate": GREEN_SEND_INSTANCE_RATE,
+            "instance_burst": GREEN_SEND_INSTANCE_BURST,
+            "recipient_rate": GREEN_SEND_RECIPIENT_RATE,
+            "recipient_burst": GREEN_SEND_RECIPIENT_BURST,
+            "max_message_length": GREEN_MAX_MESSAGE_LENGTH,
+            "coalesce_window": SEND_COALESCE_WINDOW,
+            "max_pending": SEND_QUEUE_SIZE,
+            **kwargs
+        }
+        self.outbox = OutboundSender(self.send_text_message, "green", **limits)
+
+    def queue_text_message(self, to: str, message: str) -> bool:
+        """
+        Send a text message through the outbound queue, or right away if it is not enabled
+        
+        Args:
+            to: Recipient's phone number or chatId
+            message: Text message to send
+
+        Returns:
+            False if the message was dropped
+        """
+        if self.outbox is None:
+            self.send_text_message(to, message)
+            return True
+        return self.outbox.send_text(to, message)
+
+    def setup_webhook(self, app: Flask, path: str, webhook_token: str,
+                      ingestor: Optional[WebhookIngestor] = None):
         """
         Setup webhook endpoint with authentication
         
@@ -122,7 +193,16 @@ class WhatsAppGreenClient:
             app: Flask application instance
             path: Webhook path
             webhook_token: Secret token for webhook authentication
+            ingestor: Optional ingestor. If given, incoming messages are queued and
+                processed by its workers instead of inside the HTTP request. The
+                request is answered before the dispatcher admits the message, so
+                messages it rejects are dropped and counted instead of redelivered
         """
+        if ingestor is not None:
+            if ingestor.on_rejected is None:
+                ingestor.on_rejected = lambda data: self._forget_message_id(data.get('idMessage'))
+            ingestor.start()
+
         @app.route(path, methods=['POST'])
         def webhook():
             """Handle incoming webhook events with authentication"""
@@ -134,11 +214,34 @@ class WhatsAppGreenClient:
                     return Response("Unauthorized", status=401)
                 
                 data = request.get_json()
-                pprint(data)
+                logger.debug("Webhook payload: {payload}", payload=data, category="inbound")
                 
-                if data.get('typeWebhook') == 'incomingMessageReceived':
-                    message_data = data.get('messageData', {})
-                    self._handle_message(data)
+                if not isinstance(data, dict):
+                    return Response("Bad Request", status=400)
+
+                with start_span("webhook", message_id=data.get('idMessage'), type=data.get('typeWebhook')):
+                    if data.get('typeWebhook') == 'incomingMessageReceived':
+                        message_id = data.get('idMessage')
+                        if self.seen_ids is not None and self.seen_ids.check_and_add(message_id):
+                            logger.info("Ignoring redelivered message {message_id}", message_id=message_id,
+                                        category="inbound")
+                            return Response(status=200)
+                        try:
+                            if ingestor is None:
+                                accepted = self._handle_message(data)
+                                reason = "Dispatcher full"
+                            else:
+                                accepted = ingestor.submit(data)
+                                reason = "Webhook queue full"
+                        except Exception:
+                            self._forget_message_id(message_id)
+                            raise
+                        if not accepted:
+                            self._forget_message_id(message_id)
+                            logger.warning(f"{reason}, asking Green API to retry")
+                            return Response(status=503)
+                    elif data.get('typeWebhook') == 'outgoingMessageStatus':
+                        DELIVERY_STATUSES.inc(channel="green", status=data.get('status') or "unknown")
                     
                 return Response(status=200)
                 
@@ -146,36 +249,70 @@ class WhatsAppGreenClient:
                 logger.error(f"Error in webhook: {str(e)}")
                 return Response(status=500)
 
-    def _handle_message(self, message_data: Dict):
+    def _forget_message_id(self, message_id: Optional[str]):
+        """Green API delivers a message again after a 503 or 500, it must not be taken for a duplicate"""
+        if self.seen_ids is not None:
+            self.seen_ids.discard(message_id)
+
+    def _handle_message(self, message_data: Dict) -> bool:
         """
         Handle different types of incoming messages
         
         Args:
             message_data: Message data from webhook
+
+        Returns:
+            False if the dispatcher rejected the message, so it has to be delivered again
         """
-        try:
-            message_type = message_data.get('messageData').get('typeMessage')
-            sender = message_data.get('senderData', {}).get('sender')
-            sender_name = message_data.get('senderData', {}).get('senderName')
-            chat_name = message_data.get('senderData', {}).get('chatName')
+        with start_span("handle_message", message_id=message_data.get('idMessage')) as span:
+            try:
+                message_type = message_data.get('messageData').get('typeMessage')
+                if span is not None:
+                    span.set_attribute("type", message_type)
+                INBOUND_MESSAGES.inc(channel="green", type=message_type or "unknown")
+                sender = message_data.get('senderData', {}).get('sender')
+                sender_name = message_data.get('senderData', {}).get('senderName')
+                chat_name = message_data.get('senderData', {}).get('chatName')
             
-            if message_type == 'textMessage':
-                text = message_data.get('messageData').get('textMessageData', {}).get('textMessage', '')
-                logger.info(f"Received text message from {sender}: {text}")
-                self._process_text_message(sender, sender_name, chat_name, text)
+                if message_type == 'textMessage':
+                    text = message_data.get('messageData').get('textMessageData', {}).get('textMessage', '')
+                    logger.info("Received text message from {sender}: {text}", sender=sender, text=text, category="inbound")
+                    return self._dispatch(sender, self._process_text_message, sender, sender_name, chat_name, text)
                 
-            elif message_type == 'fileMessage':
-                file_data = message_data.get('messageData').get('fileMessageData', {})
-                logger.info(f"Received file from {sender}")
-                self._process_file_message(sender, chat_name, file_data)
+                elif message_type == 'fileMessage':
+                    file_data = message_data.get('messageData').get('fileMessageData', {})
+                    logger.info("Received file from {sender}", sender=sender, category="inbound")
+                    return self._dispatch(sender, self._process_file_message, sender, chat_name, file_data)
                 
-            elif message_type == 'locationMessage':
-                location_data = message_data.get('messageData').get('locationMessageData', {})
-                logger.info(f"Received location from {sender}")
-                self._process_location_message(sender, chat_name, location_data)
+                elif message_type == 'locationMessage':
+                    location_data = message_data.get('messageData').get('locationMessageData', {})
+                    logger.info("Received location from {sender}", sender=sender, category="inbound")
+                    return self._dispatch(sender, self._process_location_message, sender, chat_name, location_data)
                 
-        except Exception as e:
-            logger.error(f"Error handling message: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error handling message: {str(e)}")
+        return True
+
+    def _dispatch(self, sender: str, handler, *args) -> bool:
+        """
+        Run a message handler, through the dispatcher lane of the sender if there is one
+        
+        Args:
+            sender: Sender chatId, used as the ordering key
+            handler: Message processing method
+            *args: Arguments for the handler
+
+        Returns:
+            False if the dispatcher is full
+        """
+        if self.dispatcher is None:
+            handler(*args)
+            return True
+        # The handler runs in the current span, in the dispatcher's thread
+        if not self.dispatcher.submit(sender, contextvars.copy_context().run, handler, *args):
+            logger.warning("Dispatcher full, rejected message from {sender}", sender=sender, category="inbound")
+            return False
+        return True
 
     def _process_text_message(self, sender: str, sender_name: str, chat_name: str, text: str):
         """Override this method to handle text messages"""
@@ -193,7 +330,7 @@ class WhatsAppGreenClient:
         """Get the status of the WhatsApp instance"""
         try:
             endpoint = f"{self.base_url}/getStateInstance/{self.instance_token}"
-            response = requests.get(endpoint)
+            response = self.transport.get(endpoint, "green.getStateInstance")
             response.raise_for_status()
             return response.json()
             
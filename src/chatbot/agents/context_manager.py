@@ -0,0 +1,121 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
+from langgraph.constants import TAG_NOSTREAM
+from loguru import logger
+from typing import List
+import re
+
+from config.assistant_conf import (CONTEXT_MAX_TOKENS, CONTEXT_TARGET_TOKENS, CONTEXT_MAX_PINNED_TOKENS,
+                                   CONTEXT_SUMMARIZE, CONTEXT_SUMMARY_MODEL)
+from monitoring.metrics import REGISTRY
+from ..base_state import BaseState
+from ..llm_clients import get_chat_model
+from ..token_counter import count_messages_tokens, count_text_tokens
+from .context_manager_prompt import prompt_context_manager
+from .cost_calculator_mixin import CostCalculatorMixin
+from ..products import Product
+
+TOKENS_SENT = REGISTRY.histogram("context_tokens_sent", "History tokens sent to the agent per call",
+                                 buckets=(250, 500, 1000, 2000, 4000, 8000, 16000))
+TOKENS_SAVED = REGISTRY.histogram("context_tokens_saved", "History tokens saved per call by trimming and summarising",
+                                  buckets=(0, 250, 500, 1000, 2000, 4000, 8000, 16000))
+
+# Turns mentioning products, orders or payments are kept verbatim
+_ORDER_RELEVANT = re.compile(
+    "|".join([re.escape(p.value) for p in Product] + [r"\border", r"\bpa(y|id|yment)", r"\bprice", r"\btotal"]),
+    re.IGNORECASE
+)
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Split the history in turns, each starting with a user message.
+
+    Turns are folded as a whole, so an AI tool call is never separated
+    from its tool results.
+    """
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def is_order_relevant(turn: List[BaseMessage]) -> bool:
+    return any(isinstance(m.content, str) and _ORDER_RELEVANT.search(m.content) for m in turn)
+
+
+class ContextManager(CostCalculatorMixin):
+    """
+    Graph node run before the agent that keeps the history within a token budget.
+
+    When the history grows beyond ``max_tokens`` the oldest turns are removed
+    from the state until it fits in ``target_tokens``, and folded into a rolling
+    summary that the agent receives instead. Recent turns about products,
+    orders or payments are pinned up to ``max_pinned_tokens``.
+    """
+
+    def __init__(self, max_tokens: int = CONTEXT_MAX_TOKENS, target_tokens: int = CONTEXT_TARGET_TOKENS,
+                 max_pinned_tokens: int = CONTEXT_MAX_PINNED_TOKENS, summarize: bool = CONTEXT_SUMMARIZE):
+        super().__init__()
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens
+        self.max_pinned_tokens = max_pinned_tokens
+        self._runnable = None
+        self._model = CONTEXT_SUMMARY_MODEL
+        if summarize:
+            prompt = ChatPromptTemplate.from_messages(
+                [(i["role"], i["content"]) for i in prompt_context_manager["prompt"]]
+            )
+            # The summary must not be streamed to the customer as part of the answer
+            llm = get_chat_model(CONTEXT_SUMMARY_MODEL).with_config(tags=[TAG_NOSTREAM])
+            self._runnable = prompt | llm | StrOutputParser()
+
+    def __call__(self, state: BaseState, config: RunnableConfig):
+        turns = split_turns(state["messages"])
+        turn_tokens = [count_messages_tokens(turn) for turn in turns]
+        total = sum(turn_tokens)
+        folded_tokens = state.get("folded_tokens", 0)
+        summary = state.get("summary", "")
+
+        update = {}
+        if total > self.max_tokens:
+            pinned = set()
+            pinned_tokens = 0
+            for i in range(len(turns) - 2, -1, -1):
+                if is_order_relevant(turns[i]) and pinned_tokens + turn_tokens[i] <= self.max_pinned_tokens:
+                    pinned.add(i)
+                    pinned_tokens += turn_tokens[i]
+
+            # The last turn holds the new user message and is always kept
+            folded = []
+            for i in range(len(turns) - 1):
+                if total <= self.target_tokens:
+                    break
+                if i in pinned:
+                    continue
+                folded.extend(turns[i])
+                total -= turn_tokens[i]
+                folded_tokens += turn_tokens[i]
+
+            if folded:
+                if self._runnable is not None:
+                    summary = self._costs_invoke_OpenAI({
+                        "summary": summary or "(none)",
+                        "messages": "\n".join(f"{m.type}: {m.content}" for m in folded if m.content)
+                    }, config)
+                update = {
+                    "messages": [RemoveMessage(id=m.id) for m in folded],
+                    "summary": summary,
+                    "folded_tokens": folded_tokens
+                }
+
+        saved = max(0, folded_tokens - count_text_tokens(summary)) if folded_tokens else 0
+        TOKENS_SENT.observe(total)
+        TOKENS_SAVED.observe(saved)
+        logger.debug("Context: {sent} history tokens sent, {saved} tokens saved", sent=total, saved=saved,
+                     category="llm")
+        return update
@@ -0,0 +1,21 @@
+prompt_context_manager = {
+    "name": "ContextManager",
+    "type": "chat",
+    "labels": ["production"],
+    "prompt": [
+        {
+            "role": "system",
+            "content":
+                """
+                You summarise the earlier part of a conversation between a customer and a shop assistant
+                that sells yoghurt and dairy products.
+                Update the existing summary with the new messages. Keep the customer's name, preferences,
+                the products and quantities they ordered, prices, payment ids and payment status.
+                Leave out greetings and small talk. Answer only with the summary, in a few short sentences.
+                """
+        },
+        {"role": "user",
+          "content": "Existing summary:\n{summary}\n\nNew messages:\n{messages}"
+        }
+    ]
+}
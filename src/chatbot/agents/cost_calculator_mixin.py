@@ -1,41 +1,61 @@
 from langchain_community.callbacks.manager import get_openai_callback
-from langchain_core.runnables import Runnable
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
 #from langfuse import Langfuse
 #from langfuse.callback import CallbackHandler
 
-from pprint import pformat
+from typing import Dict, Optional
 from loguru import logger
+import time
+
+from monitoring.metrics import REGISTRY
+from monitoring.tracing import start_span
+from monitoring.usage import get_usage
+
+LLM_LATENCY = REGISTRY.histogram("llm_request_seconds", "Duration of the LLM calls", ["agent", "model"])
+LLM_TOKENS = REGISTRY.histogram("llm_request_tokens", "Tokens per LLM call", ["agent", "kind"],
+                                buckets=(16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768))
+
 
 class Costs:
-    total_costs = {}
+    """Costs in dollars per agent, kept by the process-wide usage accumulator"""
 
     @staticmethod
-    def get_total_costs():
-        return Costs.total_costs
-    
-    @staticmethod
-    def set_total_costs(new_costs):
-        Costs.total_costs = new_costs
+    def get_total_costs() -> Dict[str, float]:
+        return {agent: usage["cost"] for agent, usage in get_usage().totals("agent").items()}
+
 
 class CostCalculatorMixin:
     def __init__(self):
         self._runnable: Runnable
+        # Model the usage is attributed to when the result does not tell it
+        self._model: Optional[str] = None
         super().__init__()
         #langfuse = Langfuse()
         #self._trace = langfuse.trace(name=self.__class__.__name__)
-    
-    def _costs_invoke_OpenAI(self, state: dict):
+
+    def _model_name(self, result) -> Optional[str]:
+        if isinstance(result, BaseMessage):
+            return result.response_metadata.get("model_name", self._model)
+        return self._model
+
+    def _costs_invoke_OpenAI(self, state: dict, config: RunnableConfig = None):
         #langfuse_handler = self._trace.get_langchain_handler()
         #langfuse_handler = CallbackHandler(self._trace)
-        costs_dict = Costs.get_total_costs()
-        logger.debug("Costs before calling:\n" + pformat(costs_dict))
-        with get_openai_callback() as cb:
-            result = self._runnable.invoke(state) #, config={"callbacks": [cb, langfuse_handler]})
-            my_type = type(self).__name__
-            if my_type in costs_dict:
-                costs_dict[my_type] += cb.total_cost
-            else:
-                costs_dict[my_type] = cb.total_cost
-        logger.info("Updated costs are:\n" + pformat(costs_dict))
-        Costs.set_total_costs(costs_dict)
+        agent = type(self).__name__
+        start = time.perf_counter()
+        with start_span("llm", agent=agent) as span, get_openai_callback() as cb:
+            # Passing the node config on lets LangGraph stream the LLM tokens
+            result = self._runnable.invoke(state, config=config) #, config={"callbacks": [cb, langfuse_handler]})
+        model = self._model_name(result)
+        LLM_LATENCY.observe(time.perf_counter() - start, agent=agent, model=model or "unknown")
+        LLM_TOKENS.observe(cb.prompt_tokens, agent=agent, kind="prompt")
+        LLM_TOKENS.observe(cb.completion_tokens, agent=agent, kind="completion")
+        if span is not None:
+            span.attributes.update(model=model, prompt_tokens=cb.prompt_tokens, completion_tokens=cb.completion_tokens)
+        sender = (config or {}).get("configurable", {}).get("thread_id")
+        get_usage().record(agent, sender, model, cb.prompt_tokens, cb.completion_tokens, cb.total_cost)
+        logger.debug("{agent} call: {prompt_tokens} prompt and {completion_tokens} completion tokens, ${cost:.6f}",
+                     agent=agent, prompt_tokens=cb.prompt_tokens, completion_tokens=cb.completion_tokens,
+                     cost=cb.total_cost, category="llm")
         return result
@@ -0,0 +1,75 @@
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import AIMessage
+from loguru import logger
+from typing import List
+import threading
+
+from monitoring.metrics import REGISTRY
+from ..base_state import BaseState
+from ..order_parser import parse_order
+from ..products import OrderItem
+from .shop_assistant import process_order, get_total_price
+
+FAST_PATH = REGISTRY.counter("order_fast_path_total", "Messages handled by the order fast path", ["result"])
+
+
+class OrderFastPath:
+    """
+    Graph node run before the agent that answers simple orders without the LLM.
+
+    When the last message is confidently parsed as an order, it is processed
+    with the same tools the agent uses and the confirmation with the price is
+    answered directly. Otherwise nothing is returned and the message goes to
+    the agent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matched = 0
+        self._fallbacks = 0
+
+    def _answer(self, order: List[OrderItem], total: str) -> str:
+        lines = [f"- {item.quantity} x {item.product.value}" for item in order]
+        return (
+            "Your order has been processed:\n" + "\n".join(lines) +
+            f"\n\nThe total price is {total}. Please make the payment and send me the id of the payment."
+        )
+
+    def __call__(self, state: BaseState, config: RunnableConfig):
+        question = state["messages"][-1].content
+        order = parse_order(question) if isinstance(question, str) else None
+        if order is None:
+            with self._lock:
+                self._fallbacks += 1
+            FAST_PATH.inc(result="fallback")
+            return {}
+
+        with self._lock:
+            self._matched += 1
+        FAST_PATH.inc(result="match")
+        logger.debug("Order fast path: {order}", order=order, category="llm")
+        args = {"order": [item.model_dump() for item in order]}
+        process_order.invoke(args, config)
+        total = get_total_price.invoke(args, config)
+        return {"messages": AIMessage(content=self._answer(order, total))}
+
+    def stats(self) -> dict:
+        """
+        Get the number of messages answered by the fast path and sent to the agent.
+        """
+        with self._lock:
+            matched, fallbacks = self._matched, self._fallbacks
+        total = matched + fallbacks
+        return {
+            "matched": matched,
+            "fallbacks": fallbacks,
+            "match_rate": matched / total if total else 0.0,
+            "fallback_rate": fallbacks / total if total else 0.0,
+        }
+
+
+def route_after_fast_path(state: BaseState) -> str:
+    """
+    Finish the turn if the fast path answered it, otherwise go to the agent.
+    """
+    return "answered" if isinstance(state["messages"][-1], AIMessage) else "agent"
@@ -1,56 +1,46 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnableConfig, RunnablePassthrough
-from langchain.agents import AgentExecutor, create_openai_functions_agent
-from langgraph.prebuilt import ToolNode
 from loguru import logger
-from pprint import pformat
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from enum import Enum
 from typing import Dict, List
 from pydantic import BaseModel, model_validator, ValidatorFunctionWrapHandler, ValidationError
-from typing import Self
+from typing import Self, Optional
+import requests
+import time
 
-from config.assistant_conf import GPT_MODEL
+from config.assistant_conf import (GPT_MODEL, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES,
+                                   RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SEMANTIC,
+                                   RESPONSE_CACHE_SIMILARITY, EMBEDDINGS_MODEL)
+from monitoring.metrics import REGISTRY, timed
+from monitoring.tracing import traced
+from mtn_momo import MTNMoMo, get_momo_client
 from ..base_state import BaseState
 from .shop_assistant_prompt import prompt_shop_assistant
 from .cost_calculator_mixin import CostCalculatorMixin
+from ..response_cache import ResponseCache, fingerprint
+from ..llm_clients import get_chat_model
+from ..products import Product, OrderItem
+from ..price_table import get_price_table
+from ..order_store import StoredOrder, get_order_store, PENDING_PAYMENT, PAID
 
-class Product(str, Enum):
-    drinking = "Drinking yoghurt"
-    regular = "Regular yoghurt"
-    greek = "Greek yoghurt"
-    strawberry = "Strawberry yoghurt"
-    mango = "Mango yoghurt"
-    vanilla = "Vanilla yoghurt"
-    labneh = "Labneh"
-    labneh_deluxe = "Labneh deluxe"
-    cottage = "Cottage cheese"
-    sour_milk = "Sour milk"
-
-class OrderItem(BaseModel):
-    product: Product
-    quantity: int
-
-#    @model_validator(mode="wrap")
-#    @classmethod
-#    def model_wrap_validate(cls, data: dict, handler: ValidatorFunctionWrapHandler) -> Self:
-#        try:
-#            print("EOOOOO")
-#            print(data)
-#            result = handler(data)
-#        except ValidationError as e:
-#            raise ValueError(f"Invalid order: {e}") from e
-#        return result
+TOOL_LATENCY = REGISTRY.histogram("tool_call_seconds", "Duration of the agent tool calls", ["tool"])
+
+
+def _sender(config: Optional[RunnableConfig]) -> Optional[str]:
+    """The customer of the conversation, i.e. the thread of the graph config"""
+    return (config or {}).get("configurable", {}).get("thread_id")
 
 @tool
-def process_order(order: List[OrderItem]) -> None:
+@traced("tool.process_order")
+@timed(TOOL_LATENCY, tool="process_order")
+def process_order(order: List[OrderItem], config: RunnableConfig) -> str:
     """
     Process an order by iterating through items and their quantities.
 
-    This function takes a list of OrderItem objects and processes each item in the order.
+    This function takes a list of OrderItem objects and saves the order of the customer.
     Each OrderItem contains a Product enum value and its quantity.
 
     Args:
@@ -63,45 +53,71 @@ def process_order(order: List[OrderItem]) -> None:
             ]
 
     Returns:
-        None
-
-    Logs:
-        - Warning level log of full order
-        - Warning level log for each item being processed
+        str: Confirmation with the id of the order.
     """
-    logger.warning(f"Processing order: {order}")
-    for item in order:
-        logger.warning(f"Processing {item.quantity} units of {item.product}")
+    price_table = get_price_table()
+    stored = StoredOrder(
+        sender=_sender(config) or "unknown",
+        items=list(order),
+        total=price_table.order_total(order),
+        currency=price_table.currency
+    )
+    order_id = get_order_store().add(stored)
+    logger.info("Processing order {order_id} of {sender}: {order}", order_id=order_id, sender=stored.sender,
+                order=order, category="order")
+    return f"Order {order_id} saved"
 
-def get_price(item: str, quantity: int) -> int:
+def get_price(item: Product, quantity: int) -> int:
     """
     Get the price of an item.
 
     Args:
-        item (str): The name of the item.
+        item (Product): The product.
         quantity (int): The quantity of the item.
 
     Returns:
-        float: The price of the item.
+        int: The price of the item after bulk discounts.
     """
-    return 1000 * quantity
+    return get_price_table().line_price(item, quantity)
 
 @tool
-def get_total_price(order: List[OrderItem]) -> int:
+@traced("tool.get_total_price")
+@timed(TOOL_LATENCY, tool="get_total_price")
+def get_total_price(order: List[OrderItem]) -> str:
     """
     Get the total price of an order.
 
     Args:
-        order (dict): A dictionary containing items as keys and quantities as values.
-                     Example: {"item1": 2, "item2": 1}
+        order (List[OrderItem]): A list of OrderItem objects with the product and quantity ordered.
 
     Returns:
-        float: The total price of the order.
+        str: The total price of the order with its currency, bulk discounts included.
+    """
+    price_table = get_price_table()
+    return price_table.format(price_table.order_total(order))
+
+def _lookup_payment(momo: MTNMoMo, payment_id: str) -> Optional[Dict]:
     """
-    return sum(get_price(item.product, item.quantity) for item in order)
+    Transaction of a payment at MTN MoMo
+
+    Args:
+        momo: MTN MoMo client
+        payment_id: Id of the payment sent by the customer
+
+    Returns:
+        The transaction (date, amount, phone_number), None if there is no such transaction
+    """
+    try:
+        return momo.check_transaction(payment_id)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
 
 @tool
-def get_payment_status(id: int) -> str:
+@traced("tool.get_payment_status")
+@timed(TOOL_LATENCY, tool="get_payment_status")
+def get_payment_status(id: int, config: RunnableConfig) -> str:
     """
     Get the status of an order.
 
@@ -111,59 +127,150 @@ def get_payment_status(id: int) -> str:
     Returns:
         str: The status of the payment.
     """
-    if id % 2 == 0:
-        return "paid"
-    else:
+    momo = get_momo_client()
+    if momo is None:
+        # Without MTN MoMo credentials (development) the answer is a placeholder, nothing is stored from it
+        return PAID if id % 2 == 0 else "not paid"
+    payment_id = str(id)
+    sender = _sender(config)
+    store = get_order_store()
+    attached = store.by_payment_id(payment_id)
+    if attached is not None:
+        # A payment settles a single order
+        if attached.sender != sender:
+            logger.warning("Payment {payment_id} of order {order_id} claimed by {sender}",
+                           payment_id=payment_id, order_id=attached.id, sender=sender, category="order")
+            return "This payment was already used for another order"
+        return PAID
+    try:
+        transaction = _lookup_payment(momo, payment_id)
+    except requests.exceptions.RequestException:
+        return "The payment could not be checked, please try again later"
+    if transaction is None:
         return "not paid"
+    if sender is not None:
+        # The payment settles the last order waiting for it, if it covers its total
+        for stored in store.last_orders(sender):
+            if stored.status == PENDING_PAYMENT:
+                amount = float(transaction.get('amount') or 0)
+                if amount < stored.total:
+                    return (f"The payment of {amount:,.0f} does not cover the total of the order "
+                            f"({stored.total:,} {stored.currency})")
+                store.set_payment(stored.id, payment_id, PAID)
+                break
+    return PAID
 
-class ShopAssistant(CostCalculatorMixin):
+@tool
+@traced("tool.get_last_orders")
+@timed(TOOL_LATENCY, tool="get_last_orders")
+def get_last_orders(config: RunnableConfig, n: int = 5) -> str:
+    """
+    Get the last orders of the customer, the most recent first.
+
+    Args:
+        n (int): The number of orders.
+
+    Returns:
+        str: One line per order with its date, items, price and status.
+    """
+    sender = _sender(config)
+    orders = get_order_store().last_orders(sender, n) if sender is not None else []
+    if not orders:
+        return "The customer has no orders"
+    return "\n".join(stored.describe() for stored in orders)
+
+SHOP_TOOLS = [
+    process_order,
+    get_total_price,
+    get_payment_status,
+    get_last_orders
+]
 
 
-    def __init__(self):
+def _default_cache() -> Optional[ResponseCache]:
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    embeddings = None
+    if RESPONSE_CACHE_SEMANTIC:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model=EMBEDDINGS_MODEL)
+    return ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS,
+                         embeddings, RESPONSE_CACHE_SIMILARITY)
+
+
+class ShopAssistant(CostCalculatorMixin):
+    """
+    Agent node of the graph. Each call asks the LLM for the next message of
+    the turn: either the answer or tool calls, which the graph runs in its
+    ToolNode (in parallel when there are several) before calling the agent
+    again with their results.
+    """
+
+    def __init__(self, cache: Optional[ResponseCache] = None):
         super().__init__()
+        self._cache = cache if cache is not None else _default_cache()
         prompt = [(i["role"], i["content"]) for i in prompt_shop_assistant["prompt"]]
         system_prompt = list(filter(lambda x: x[0] == "system", prompt))
         self._prompt = ChatPromptTemplate.from_messages([
             *system_prompt,
-            MessagesPlaceholder("messages"),
-            MessagesPlaceholder("agent_scratchpad")
+            MessagesPlaceholder("messages")
         ])
+        # Cached answers are only valid for the prompt and model that produced them
+        self._prompt_version = fingerprint(GPT_MODEL, *[content for _, content in system_prompt])
+
+        # stream_usage keeps the token counts (and costs) when the answer is streamed
+        self._model = GPT_MODEL
+        self._llm = get_chat_model(GPT_MODEL, stream_usage=True)
+        self._runnable = self._prompt | self._llm.bind_tools(SHOP_TOOLS, parallel_tool_calls=True)
+
+    def _state_fingerprint(self, state: BaseState, turn_start: int) -> Optional[str]:
+        """
+        Fingerprint of what the answer to the question at ``turn_start`` depends on:
+        the prompt and every message since the last summary, so an answer is only
+        reused for the same conversation.
+
+        Returns:
+            None if the conversation holds customer specific data (a summary, or
+            tool calls and results with carts, order ids or totals), which is never cached
+        """
+        history = state["messages"][:turn_start]
+        if state.get("summary") or any(isinstance(m, ToolMessage) or getattr(m, "tool_calls", None)
+                                       for m in history):
+            return None
+        return fingerprint(self._prompt_version, *[f"{m.type}:{m.content}" for m in history])
 
-        process_order_tool = process_order
-        get_total_price_tool = get_total_price
-        get_payment_status_tool = get_payment_status
-
-        self._llm = ChatOpenAI(model=GPT_MODEL)
-        tools = [
-            process_order,
-            get_total_price,
-            get_payment_status
-        ]
-
-        # Create agent
-        agent = create_openai_functions_agent(self._llm, tools, self._prompt)
-        
-        # Create executor
-        self._runnable = AgentExecutor(
-            agent=agent,
-            tools=tools,
-            verbose=False  # Set to True to see the agent's thought process
-        )
-    #    #self._runnable = self._include_langfuse_support(self._runnable)
-
-    #def __call__(self, state: BaseState, config: RunnableConfig):
-    #    logger.debug("CALLING ShopAssistant")
-    #    result = self._costs_invoke_OpenAI({
-    #        "messages": state["messages"]
-    #    })
-    #    state["messages"] = state["messages"] + [result]
-    #    return {"messages": result}
-    
     def __call__(self, state: BaseState, config: RunnableConfig):
         #TODO: logger.log("AGENT_CALL", "CALLING ShopAssistant")
-        result = self._costs_invoke_OpenAI({
-            "messages": state["messages"]
-        })
-        logger.debug("State: " + pformat(state))
-        state["messages"] = state["messages"] + [{"role": "assistant", "content": result["output"]}]
-        return {"messages": state["messages"][-1]}
+        messages = state["messages"]
+        turn_start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        new_turn = turn_start == len(messages) - 1
+        question = messages[turn_start].content
+        state_fingerprint = None
+        if self._cache is not None and isinstance(question, str):
+            state_fingerprint = self._state_fingerprint(state, turn_start)
+            if state_fingerprint is None:
+                if new_turn:
+                    self._cache.record_bypass()
+            elif new_turn:
+                cached = self._cache.lookup(question, state_fingerprint)
+                if cached is not None:
+                    return {"messages": AIMessage(content=cached)}
+
+        update = {}
+        if new_turn:
+            update["turn_started_at"] = time.time()
+        if state.get("summary"):
+            messages = [SystemMessage(content="Summary of the earlier conversation: " + state["summary"])] + messages
+        response = self._costs_invoke_OpenAI({
+            "messages": messages
+        }, config)
+        update["messages"] = response
+
+        if state_fingerprint is not None and not response.tool_calls and isinstance(response.content, str):
+            # Every tool returns customer specific data: carts, totals, orders or payments
+            if any(isinstance(m, ToolMessage) for m in state["messages"][turn_start:]):
+                self._cache.record_bypass()
+            else:
+                started = update.get("turn_started_at", state.get("turn_started_at", time.time()))
+                self._cache.store(question, state_fingerprint, response.content, time.time() - started)
+        return update
@@ -1,21 +1,34 @@
 from .mixins.diagram_drawer_mixin import DiagramDrawerMixin
 from .base_state import BaseState
 
-from .agents.shop_assistant import ShopAssistant
+from .agents.shop_assistant import ShopAssistant, SHOP_TOOLS
+from .agents.context_manager import ContextManager
+from .agents.order_fast_path import OrderFastPath, route_after_fast_path
+from .checkpointers.bounded_memory_saver import BoundedMemorySaver
+from .checkpointers.sqlite_saver import SqliteCheckpointSaver
+from .checkpointers.compaction import CheckpointCompactor
+from config.assistant_conf import (CHECKPOINT_BACKEND, CHECKPOINT_SQLITE_PATH, CHECKPOINT_MAX_THREADS,
+                                   CHECKPOINT_MAX_BYTES, CHECKPOINT_TTL_SECONDS, CHECKPOINT_COMPACTION_INTERVAL,
+                                   CHECKPOINT_KEEP_LAST, CHECKPOINT_IDLE_TTL_SECONDS, CHECKPOINT_COMPACTION_BATCH,
+                                   CHECKPOINT_COMPACTION_PAUSE, ORDER_FAST_PATH_ENABLED)
+from monitoring.metrics import REGISTRY
+from monitoring.tracing import start_span, traced_node
 #from .agents.agents_mixins.cost_calculator_mixin import Costs
 
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.errors import GraphRecursionError
 from langchain_core.messages import HumanMessage
-from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.ai import AIMessage, AIMessageChunk
 
 from loguru import logger
 #from pandas import Series
 from dotenv import load_dotenv
-from pprint import pformat
+from typing import Any, NamedTuple, Optional
+import threading
 import uuid
+import time
 import os
 import types
 import json
@@ -23,33 +36,130 @@ import json
 #from myformassistant.exception_logger import configure_excepthook
 #configure_excepthook()
 
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram("llm_time_to_first_token_seconds", "Time from the user input to the first answer token")
+
+
+class _SharedGraph(NamedTuple):
+    checkpointer: Any
+    fast_path: Optional[OrderFastPath]
+    graph: CompiledStateGraph
+
 class Assistant(DiagramDrawerMixin):
     """
     Assistant class orchestrates the flow of processing questionnaires 
     by utilizing different agents and managing the state graph.
     """
 
+    # Graph, agents, LLM clients and checkpointer are built once per process and
+    # shared by every Assistant: the conversation state only lives in the
+    # checkpointer, keyed by the thread_id of the config
+    _shared: Optional[_SharedGraph] = None
+    _shared_lock = threading.Lock()
+    _compactor: Optional[CheckpointCompactor] = None
+
     def __init__(self):
         """
         Initialize the chatbot by setting up the environment and state graph.
         """
         load_dotenv()
         super().__init__()
-        self._graph = self._init_graph()
-        self._config = {
+        shared = self._get_shared()
+        self._checkpointer = shared.checkpointer
+        self._fast_path = shared.fast_path
+        self._graph = shared.graph
+        self._config = self._get_config(str(uuid.uuid4()))
+
+    @classmethod
+    def _get_shared(cls) -> _SharedGraph:
+        with cls._shared_lock:
+            if cls._shared is None:
+                if CHECKPOINT_BACKEND == "sqlite":
+                    checkpointer = SqliteCheckpointSaver(CHECKPOINT_SQLITE_PATH)
+                else:
+                    checkpointer = BoundedMemorySaver(
+                        max_threads=CHECKPOINT_MAX_THREADS,
+                        max_bytes=CHECKPOINT_MAX_BYTES,
+                        ttl_seconds=CHECKPOINT_TTL_SECONDS
+                    )
+                REGISTRY.callback_gauge("active_conversations", "Conversations held by the checkpointer",
+                                        lambda: checkpointer.stats()["threads"])
+                REGISTRY.callback_gauge("checkpoint_pending_writes", "Checkpoint writes waiting to be flushed",
+                                        lambda: checkpointer.stats().get("pending", 0))
+                fast_path = OrderFastPath() if ORDER_FAST_PATH_ENABLED else None
+                cls._shared = _SharedGraph(checkpointer, fast_path, cls._init_graph(checkpointer, fast_path))
+            return cls._shared
+
+    def new_conversation(self):
+        """
+        Start a new default conversation, the previous one stays in the checkpointer.
+        """
+        self._config = self._get_config(str(uuid.uuid4()))
+
+    def _get_config(self, conversation_id: Optional[str] = None) -> dict:
+        """
+        Get the graph config for a conversation.
+
+        Each conversation key (e.g. the sender's chatId) gets its own thread in the
+        checkpointer, so histories of different customers never mix.
+
+        Args:
+            conversation_id (str): The conversation key. If None, the default thread is used.
+        """
+        if conversation_id is None:
+            return self._config
+        return {
             "configurable": {
-                "thread_id": str(uuid.uuid4()),
+                "thread_id": conversation_id,
             },
             "recursion_limit": 25
         }
 
-    def _get_state(self):
+    def _get_state(self, conversation_id: Optional[str] = None):
         """
         Retrieve the current state from the state graph.
         """
-        return self._graph.get_state(self._config)
+        return self._graph.get_state(self._get_config(conversation_id))
 
-    def _init_graph(self):
+    def get_memory_stats(self) -> dict:
+        """
+        Get the hit/miss/eviction counters and size of the conversation memory.
+        """
+        return self._checkpointer.stats()
+
+    def start_checkpoint_compaction(self) -> Optional[CheckpointCompactor]:
+        """
+        Start the background compaction of the stored conversations.
+
+        Only the SQLite checkpointer needs it, the in-memory one is bounded on
+        every write.
+
+        Returns:
+            The running compaction job, None for the in-memory checkpointer.
+        """
+        if not isinstance(self._checkpointer, SqliteCheckpointSaver):
+            return None
+        with self._shared_lock:
+            # A single job for the shared checkpointer
+            if Assistant._compactor is None:
+                Assistant._compactor = CheckpointCompactor(
+                    self._checkpointer,
+                    keep_last=CHECKPOINT_KEEP_LAST,
+                    ttl_seconds=CHECKPOINT_IDLE_TTL_SECONDS,
+                    batch_size=CHECKPOINT_COMPACTION_BATCH,
+                    pause_seconds=CHECKPOINT_COMPACTION_PAUSE,
+                    interval_seconds=CHECKPOINT_COMPACTION_INTERVAL
+                )
+                Assistant._compactor.start()
+            return Assistant._compactor
+
+    def get_fast_path_stats(self) -> Optional[dict]:
+        """
+        Get the match and fallback rates of the order fast path, None if it is disabled.
+        """
+        return self._fast_path.stats() if self._fast_path is not None else None
+
+    @staticmethod
+    def _init_graph(checkpointer, fast_path: Optional[OrderFastPath]):
         """
         Initialize the state graph with agents and their connections.
 
@@ -60,13 +170,25 @@ class Assistant(DiagramDrawerMixin):
         # Create the state graph
         builder = StateGraph(BaseState)
         # Add nodes to the graph
-        builder.add_node("shopAssistant", ShopAssistant())
-        builder.set_entry_point("shopAssistant")
+        builder.add_node("contextManager", traced_node("contextManager", ContextManager()))
+        builder.add_node("shopAssistant", traced_node("shopAssistant", ShopAssistant()))
+        if fast_path is not None:
+            builder.add_node("orderFastPath", traced_node("orderFastPath", fast_path))
+            builder.set_entry_point("orderFastPath")
+        else:
+            builder.set_entry_point("contextManager")
         # Add edges to the graph
-        builder.add_edge("shopAssistant", END)
+        if fast_path is not None:
+            builder.add_conditional_edges("orderFastPath", route_after_fast_path,
+                                          {"answered": END, "agent": "contextManager"})
+        builder.add_edge("contextManager", "shopAssistant")
+        # The agent loops through the tools until it answers. Tool results are
+        # checkpointed like any other step
+        builder.add_node("tools", traced_node("tools", ToolNode(SHOP_TOOLS)))
+        builder.add_conditional_edges("shopAssistant", tools_condition, {"tools": "tools", END: END})
+        builder.add_edge("tools", "shopAssistant")
         # Add checkpointer
-        memory = MemorySaver()
-        return builder.compile(checkpointer=memory)
+        return builder.compile(checkpointer=checkpointer)
 
     #def get_costs(self) -> Series:
     #    """
@@ -75,34 +197,42 @@ class Assistant(DiagramDrawerMixin):
     #    costs = Series(Costs.get_total_costs())
     #    return costs
 
-    def generate_stream_response(self, input):
+    def generate_stream_response(self, input, conversation_id: Optional[str] = None):
         """
         Generate a stream response for the given input.
 
-        The stream response is generated by passing the input to the state graph and
-        yielding the messages and state changes that result from the graph's processing.
-
-        To avoid infinite recursion, the graph's recursion limit is increased each time
-        a `GraphRecursionError` is encountered, until a maximum of 100 is reached.
+        The input is passed to the state graph with ``stream_mode="messages"``, so the
+        answer is yielded token by token as the LLM produces it. Messages returned by
+        nodes without streaming (e.g. a cached answer) are yielded whole.
 
         Args:
             input (str): The input to the graph.
-            state (types.SimpleNamespace): A namespace to store the state of the graph.
+            conversation_id (str): The conversation key (e.g. the sender's chatId).
+                If None, the assistant's default conversation is used.
 
         Yields:
-            str: The messages and state changes that result from the graph's processing.
-        """
-        events = self._graph.stream({"messages": ("user", input)}, self._config, stream_mode="values")
-        for event in events:
-            message = event.get("messages")
-            
-            if isinstance(message, list):
-                # If the message is a list, take the last element
-                message = message[-1]
-                
-            msg_repr = message.pretty_repr(html=False)
-            
-            if not isinstance(message, HumanMessage):
-                # Yield the state and message
-                yield message.content
-                #yield '\n\r'
+            str: The text deltas of the assistant's answer.
+        """
+        start = time.perf_counter()
+        streamed = False
+        config = self._get_config(conversation_id)
+        thread_id = config["configurable"]["thread_id"]
+        # The graph nodes run in spans below this one
+        with start_span("graph", conversation=thread_id):
+            events = self._graph.stream({"messages": ("user", input)}, config, stream_mode="messages")
+            try:
+                for message, metadata in events:
+                    if isinstance(message, AIMessageChunk):
+                        # Chunks of tool/function calls have no content
+                        if not message.content:
+                            continue
+                    elif not isinstance(message, AIMessage) or streamed or not message.content:
+                        # Tool results and tool calls are not part of the answer
+                        continue
+                    if not streamed:
+                        streamed = True
+                        TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                    yield message.content
+            finally:
+                # The checkpoints of the turn are written together
+                self._checkpointer.flush(thread_id)
@@ -14,3 +14,8 @@ class BaseState(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     #costs: Annotated[dict,add_cost]
     next: str
+    # Rolling summary of the turns removed from messages by the ContextManager
+    summary: str
+    folded_tokens: int
+    # Start of the current turn, which can take several agent and tool steps
+    turn_started_at: float
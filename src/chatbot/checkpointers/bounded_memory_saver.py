@@ -0,0 +1,166 @@
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableConfig
+from loguru import logger
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Tuple
+import threading
+import time
+
+
+@dataclass
+class _ThreadUsage:
+    last_access: float
+    storage_bytes: int = 0
+    blob_keys: Dict[Tuple, int] = field(default_factory=dict)
+    write_bytes: Dict[Tuple, int] = field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return self.storage_bytes + sum(self.blob_keys.values()) + sum(self.write_bytes.values())
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer with a bounded number of conversation threads.
+
+    Threads are kept in least-recently-used order. Whenever a checkpoint is
+    written, threads idle for longer than ``ttl_seconds`` are dropped and then
+    the least recently used threads are evicted until both ``max_threads`` and
+    ``max_bytes`` (measured on the serialized checkpoints) are respected.
+    """
+
+    def __init__(self, max_threads: int = 5000, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None, serde=None):
+        """
+        Initialize the bounded checkpointer
+
+        Args:
+            max_threads: Maximum number of conversation threads kept in memory
+            max_bytes: Maximum serialized size of all the stored checkpoints
+            ttl_seconds: Idle time after which a thread is evicted (None disables it)
+            serde: Optional serializer, defaults to the LangGraph one
+        """
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._threads: "OrderedDict[str, _ThreadUsage]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _touch(self, thread_id: str) -> _ThreadUsage:
+        usage = self._threads.get(thread_id)
+        if usage is None:
+            usage = _ThreadUsage(last_access=time.monotonic())
+            self._threads[thread_id] = usage
+        else:
+            usage.last_access = time.monotonic()
+            self._threads.move_to_end(thread_id)
+        return usage
+
+    def _account(self, usage: _ThreadUsage, update) -> None:
+        before = usage.total_bytes
+        update(usage)
+        self._total_bytes += usage.total_bytes - before
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            result = super().get_tuple(config)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._touch(thread_id)
+            return result
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            stored = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+
+            def update(usage: _ThreadUsage):
+                usage.storage_bytes += len(stored[0][1]) + len(stored[1][1])
+                for channel, version in new_versions.items():
+                    key = (thread_id, checkpoint_ns, channel, version)
+                    usage.blob_keys[key] = len(self.blobs[key][1])
+
+            self._account(self._touch(thread_id), update)
+            self._enforce_limits(keep=thread_id)
+            return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                   task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+
+            def update(usage: _ThreadUsage):
+                usage.write_bytes[outer_key] = sum(
+                    len(w[2][1]) for w in self.writes.get(outer_key, {}).values()
+                )
+
+            self._account(self._touch(thread_id), update)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Remove every checkpoint, blob and pending write of a thread
+
+        Args:
+            thread_id: The conversation thread to remove
+        """
+        with self._lock:
+            usage = self._threads.pop(thread_id, None)
+            self.storage.pop(thread_id, None)
+            if usage is None:
+                return
+            for key in usage.blob_keys:
+                self.blobs.pop(key, None)
+            for key in usage.write_bytes:
+                self.writes.pop(key, None)
+            self._total_bytes -= usage.total_bytes
+
+    def flush(self, thread_id: Optional[str] = None) -> None:
+        """Nothing to write, checkpoints are kept in memory"""
+
+    def _evict(self, thread_id: str, reason: str) -> None:
+        self.delete_thread(thread_id)
+        self.evictions += 1
+        logger.debug("Evicted conversation {thread_id} ({reason})", thread_id=thread_id, reason=reason)
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        if self.ttl_seconds is not None:
+            deadline = time.monotonic() - self.ttl_seconds
+            while self._threads:
+                thread_id, usage = next(iter(self._threads.items()))
+                if usage.last_access > deadline or thread_id == keep:
+                    break
+                self._evict(thread_id, "ttl")
+
+        while len(self._threads) > self.max_threads or self._total_bytes > self.max_bytes:
+            thread_id = next(iter(self._threads))
+            if thread_id == keep:
+                break
+            self._evict(thread_id, "lru")
+
+    def stats(self) -> Dict[str, int]:
+        """Get the usage counters of the checkpointer"""
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
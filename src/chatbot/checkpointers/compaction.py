@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from loguru import logger
+from typing import Optional, Tuple
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+from .sqlite_saver import SqliteCheckpointSaver
+
+COMPACTION_SECONDS = REGISTRY.histogram("checkpoint_compaction_seconds", "Duration of the checkpoint compaction runs",
+                                        buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300))
+COMPACTION_DELETED = REGISTRY.counter("checkpoint_compaction_deleted_total",
+                                      "Threads and checkpoints removed by the compaction", ["kind"])
+COMPACTION_RECLAIMED = REGISTRY.counter("checkpoint_compaction_reclaimed_bytes_total",
+                                        "Bytes of checkpoint storage reclaimed by the compaction")
+
+
+@dataclass
+class CompactionReport:
+    threads_scanned: int = 0
+    threads_dropped: int = 0
+    checkpoints_deleted: int = 0
+    bytes_reclaimed: int = 0
+    file_bytes_released: int = 0
+    duration_seconds: float = 0.0
+
+
+class CheckpointCompactor:
+    """
+    Background job that bounds the storage of the SQLite checkpointer.
+
+    Each run drops the threads idle for longer than ``ttl_seconds``, then
+    pages through the threads written since the previous run (from a
+    high-water mark on the time of their last write) and keeps only their last
+    ``keep_last`` checkpoints. The cost of a run follows the new writes, not
+    the whole history. Every thread is pruned in its own short transaction and
+    the job pauses ``pause_seconds`` between batches, so live turns are never
+    blocked for long. Freed pages are then released to the file system with
+    an incremental vacuum.
+    """
+
+    def __init__(self, saver: SqliteCheckpointSaver, keep_last: int = 5, ttl_seconds: Optional[float] = None,
+                 batch_size: int = 50, pause_seconds: float = 0.05, vacuum_pages: int = 256,
+                 interval_seconds: float = 15 * 60):
+        """
+        Initialize the job
+
+        Args:
+            saver: The checkpointer to compact
+            keep_last: Number of checkpoints kept per thread
+            ttl_seconds: Idle time after which a thread is dropped (None keeps them)
+            batch_size: Number of threads processed between pauses
+            pause_seconds: Pause between batches
+            vacuum_pages: Pages released per incremental vacuum step
+            interval_seconds: Time between runs when started in the background
+        """
+        self.saver = saver
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.vacuum_pages = vacuum_pages
+        self.interval_seconds = interval_seconds
+        self.last_report: Optional[CompactionReport] = None
+        # (time of the last write, thread id) of the last thread pruned
+        self._high_water: Tuple[float, str] = (0.0, "")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> CompactionReport:
+        """
+        Compact the checkpointer once
+
+        Returns:
+            The threads and checkpoints removed, the bytes reclaimed and the duration of the run
+        """
+        start = time.perf_counter()
+        report = CompactionReport()
+        usage_before = self.saver.storage_usage()
+        now = time.time()
+
+        if self.ttl_seconds is not None:
+            # The idle threads are the first ones in order of their last write
+            deadline = now - self.ttl_seconds
+            while not self._stop.is_set():
+                threads = [thread for thread in self.saver.list_threads(limit=self.batch_size)
+                           if thread[1] < deadline]
+                for thread_id, _ in threads:
+                    self.saver.delete_thread(thread_id)
+                report.threads_dropped += len(threads)
+                if len(threads) < self.batch_size:
+                    break
+                self._stop.wait(self.pause_seconds)
+
+        # Threads written since the previous run. Those written during this one
+        # are left for the next
+        while not self._stop.is_set():
+            threads = self.saver.list_threads(self._high_water, now, self.batch_size)
+            if not threads:
+                break
+            for thread_id, updated_at in threads:
+                report.threads_scanned += 1
+                report.checkpoints_deleted += self.saver.prune_thread(thread_id, self.keep_last)
+                self._high_water = (updated_at, thread_id)
+            self._stop.wait(self.pause_seconds)
+
+        # Release the free pages in small steps as well
+        while not self._stop.is_set():
+            file_bytes = self.saver.storage_usage()["file_bytes"]
+            self.saver.vacuum(self.vacuum_pages)
+            if self.saver.storage_usage()["file_bytes"] >= file_bytes:
+                break
+            self._stop.wait(self.pause_seconds)
+
+        usage_after = self.saver.storage_usage()
+        report.bytes_reclaimed = max(usage_before["used_bytes"] - usage_after["used_bytes"], 0)
+        report.file_bytes_released = max(usage_before["file_bytes"] - usage_after["file_bytes"], 0)
+        report.duration_seconds = time.perf_counter() - start
+
+        COMPACTION_SECONDS.observe(report.duration_seconds)
+        COMPACTION_DELETED.inc(report.threads_dropped, kind="threads")
+        COMPACTION_DELETED.inc(report.checkpoints_deleted, kind="checkpoints")
+        COMPACTION_RECLAIMED.inc(report.bytes_reclaimed)
+        self.last_report = report
+        logger.info(f"Checkpoint compaction: {report}")
+        return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Checkpoint compaction failed: {str(e)}")
+
+    def start(self):
+        """Run the compaction every ``interval_seconds`` in a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="checkpoint-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, interrupting the current run"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,467 @@
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple, get_checkpoint_id,
+                                       get_checkpoint_metadata)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+from langchain_core.runnables import RunnableConfig
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+import random
+import sqlite3
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+
+FLUSH_SECONDS = REGISTRY.histogram("checkpoint_flush_seconds", "Time to write the checkpoints of a turn")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL DEFAULT '', checkpoint_id TEXT NOT NULL, "
+    "parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))",
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL DEFAULT '', channel TEXT NOT NULL, "
+    "version TEXT NOT NULL, type TEXT NOT NULL, blob BLOB, "
+    "PRIMARY KEY (thread_id, checkpoint_ns, channel, version))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL DEFAULT '', checkpoint_id TEXT NOT NULL, "
+    "task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT, blob BLOB, "
+    "task_path TEXT NOT NULL DEFAULT '', "
+    "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))",
+    "CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at)",
+]
+
+
+@dataclass
+class _PendingTurn:
+    checkpoints: List[Tuple] = field(default_factory=list)
+    blobs: List[Tuple] = field(default_factory=list)
+    writes: List[Tuple] = field(default_factory=list)
+    replace_writes: List[Tuple] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.checkpoints) + len(self.blobs) + len(self.writes) + len(self.replace_writes)
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer stored in a SQLite file, shared by every worker
+    process using the same file and kept across restarts.
+
+    Checkpoints are serialised with the LangGraph serializer (msgpack), and
+    only the channels that changed are written at each step. The writes of a
+    thread are buffered and committed in a single transaction when the turn
+    ends (``flush``), before the thread is read again, or once
+    ``max_pending`` rows are buffered.
+    """
+
+    def __init__(self, path: str, max_pending: int = 1000, serde=None):
+        """
+        Initialize the checkpointer
+
+        Args:
+            path: SQLite database file
+            max_pending: Number of buffered rows of a thread that forces a write
+            serde: Optional serializer, defaults to the LangGraph one
+        """
+        super().__init__(serde=serde)
+        self.path = path
+        self.max_pending = max_pending
+        self._lock = threading.RLock()
+        self._pending: Dict[str, _PendingTurn] = {}
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        # Lets the compaction job give the freed pages back to the file system
+        # in small steps. Only applies to new database files
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    # Writes
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        values: Dict[str, Any] = c.pop("channel_values")
+        blobs = [
+            (thread_id, checkpoint_ns, channel, version,
+             *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)))
+            for channel, version in new_versions.items()
+        ]
+        checkpoint_row = (
+            thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+            *self.serde.dumps_typed(c),
+            *self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        )
+        with self._lock:
+            pending = self._pending.setdefault(thread_id, _PendingTurn())
+            pending.blobs.extend(blobs)
+            pending.checkpoints.append(checkpoint_row)
+            self._flush_if_full(thread_id, pending)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                   task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+             *self.serde.dumps_typed(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock:
+            pending = self._pending.setdefault(thread_id, _PendingTurn())
+            # Special writes (errors, interrupts...) replace the previous ones,
+            # regular writes of a task are only stored once
+            for row in rows:
+                (pending.replace_writes if row[4] < 0 else pending.writes).append(row)
+            self._flush_if_full(thread_id, pending)
+
+    def _flush_if_full(self, thread_id: str, pending: _PendingTurn):
+        if len(pending) >= self.max_pending:
+            self.flush(thread_id)
+
+    def flush(self, thread_id: Optional[str] = None):
+        """
+        Write the buffered checkpoints in a single transaction
+
+        Args:
+            thread_id: The thread to write, all of them if None
+        """
+        with self._lock:
+            if thread_id is None:
+                turns, self._pending = self._pending, {}
+            elif thread_id in self._pending:
+                turns = {thread_id: self._pending.pop(thread_id)}
+            else:
+                return
+            if not turns:
+                return
+            start = time.perf_counter()
+            now = time.time()
+            try:
+                self._conn.execute("BEGIN")
+                for thread, pending in turns.items():
+                    self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", pending.blobs)
+                    self._conn.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                           pending.checkpoints)
+                    self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                           pending.writes)
+                    self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                           pending.replace_writes)
+                    self._conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread, now))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._rollback()
+                # Keep the checkpoints for the next attempt
+                for thread, pending in turns.items():
+                    self._requeue(thread, pending)
+                raise
+            FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    def _requeue(self, thread_id: str, turn: _PendingTurn):
+        pending = self._pending.get(thread_id)
+        if pending is None:
+            self._pending[thread_id] = turn
+            return
+        pending.checkpoints[:0] = turn.checkpoints
+        pending.blobs[:0] = turn.blobs
+        pending.writes[:0] = turn.writes
+        pending.replace_writes[:0] = turn.replace_writes
+
+    def _rollback(self):
+        # BEGIN itself may have failed, leaving no transaction to roll back
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Remove every checkpoint, blob and pending write of a thread
+
+        Args:
+            thread_id: The conversation thread to remove
+        """
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                for table in ("checkpoints", "blobs", "writes", "threads"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._rollback()
+                raise
+            self._pending.pop(thread_id, None)
+
+    # Maintenance, used by the compaction job
+
+    def list_threads(self, after: Tuple[float, str] = (0.0, ""), until: Optional[float] = None,
+                     limit: int = 100) -> List[Tuple[str, float]]:
+        """
+        Get the stored threads in order of their last write, with its time
+
+        Args:
+            after: Only threads whose (time of the last write, id) is greater, to page through them
+            until: Only threads last written at or before this time
+            limit: Maximum number of threads
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT thread_id, updated_at FROM threads WHERE (updated_at, thread_id) > (?, ?) "
+                "AND updated_at <= ? ORDER BY updated_at, thread_id LIMIT ?",
+                (*after, until if until is not None else float("inf"), limit)
+            ).fetchall()
+
+    def prune_thread(self, thread_id: str, keep_last: int) -> int:
+        """
+        Remove all but the latest checkpoints of a thread, with their writes
+        and the blobs no longer referenced.
+
+        Checkpoint ids and channel versions grow over time, so the rows are
+        deleted by range: checkpoints older than the oldest one kept, and the
+        blob versions older than the ones it references. Only that checkpoint
+        is deserialized.
+
+        Args:
+            thread_id: The conversation thread
+            keep_last: Number of checkpoints kept per namespace, at least 1
+
+        Returns:
+            The number of checkpoints removed
+        """
+        with self._lock:
+            self.flush(thread_id)
+            removed = 0
+            namespaces = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,))]
+            try:
+                self._conn.execute("BEGIN")
+                for checkpoint_ns in namespaces:
+                    oldest_kept = self._conn.execute(
+                        "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? "
+                        "AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                        (thread_id, checkpoint_ns, max(keep_last, 1) - 1)
+                    ).fetchone()
+                    if oldest_kept is None:
+                        continue
+                    checkpoint_id, type_, checkpoint = oldest_kept
+                    deleted = self._conn.execute(
+                        "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, checkpoint_id)
+                    ).rowcount
+                    if not deleted:
+                        continue
+                    removed += deleted
+                    self._conn.execute(
+                        "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, checkpoint_id)
+                    )
+                    versions = self.serde.loads_typed((type_, checkpoint))["channel_versions"]
+                    self._conn.executemany(
+                        "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version < ?",
+                        [(thread_id, checkpoint_ns, channel, str(version)) for channel, version in versions.items()]
+                    )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._rollback()
+                raise
+            return removed
+
+    def storage_usage(self) -> Dict[str, int]:
+        """
+        Get the size of the database file and the bytes used by live pages
+        """
+        with self._lock:
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return {"file_bytes": page_count * page_size, "used_bytes": (page_count - free_pages) * page_size}
+
+    def vacuum(self, pages: Optional[int] = None):
+        """
+        Return free pages to the file system
+
+        Args:
+            pages: Maximum number of pages released with an incremental vacuum,
+                None rebuilds the whole file with VACUUM (blocks the database)
+        """
+        with self._lock:
+            if pages is None:
+                self._conn.execute("VACUUM")
+            else:
+                self._conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+
+    # Reads
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        if not versions:
+            return {}
+        keys = list(versions.items())
+        rows = self._conn.execute(
+            "SELECT channel, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND "
+            f"(channel, version) IN (VALUES {', '.join(['(?, ?)'] * len(keys))})",
+            (thread_id, checkpoint_ns, *[str(v) for key in keys for v in key])
+        ).fetchall()
+        return {channel: self.serde.loads_typed((type_, blob)) for channel, type_, blob in rows if type_ != "empty"}
+
+    def _to_tuple(self, row: Tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, blob FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        sends = []
+        if parent_checkpoint_id:
+            sends = self._conn.execute(
+                "SELECT type, blob FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+                "AND channel = ? ORDER BY task_path, task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS)
+            ).fetchall()
+        checkpoint_: Checkpoint = self.serde.loads_typed((type_, checkpoint))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint_,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint_["channel_versions"]),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends],
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, b))) for task_id, channel, t, b in writes],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            self.flush(thread_id)
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._to_tuple(row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        conditions, params = [], []
+        if config:
+            self.flush(config["configurable"]["thread_id"])
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        else:
+            self.flush()
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM checkpoints {where} ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC", params
+            ).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(value == metadata.get(key) for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            # Yielded without the lock, a slow consumer must not block the writers
+            with self._lock:
+                item = self._to_tuple(row)
+            yield item
+
+    # Async variants, SQLite calls are short so they run inline
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                          task_id: str, task_path: str = "") -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        # Same versions as MemorySaver: increasing counter and a random suffix
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def stats(self) -> Dict[str, int]:
+        """Get the usage counters of the checkpointer"""
+        with self._lock:
+            threads = self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            return {
+                "threads": threads,
+                "bytes": page_count * page_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "pending": sum(len(pending) for pending in self._pending.values()),
+            }
+
+    def close(self):
+        self.flush()
+        self._conn.close()
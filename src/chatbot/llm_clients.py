@@ -0,0 +1,28 @@
+from langchain_openai import ChatOpenAI
+from functools import lru_cache
+import httpx
+import openai
+
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    """
+    Get the HTTP client shared by every OpenAI chat model of the process, so
+    they all reuse the same connection pool.
+    """
+    return openai.DefaultHttpxClient()
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str, stream_usage: bool = False) -> ChatOpenAI:
+    """
+    Get the chat model for ``model``, built once per process.
+
+    ChatOpenAI keeps no per-call state, so the same instance is safely shared
+    by every conversation and thread.
+
+    Args:
+        model: OpenAI model name
+        stream_usage: Report the token usage when streaming
+    """
+    return ChatOpenAI(model=model, stream_usage=stream_usage, http_client=get_http_client())
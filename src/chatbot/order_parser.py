@@ -0,0 +1,190 @@
+from difflib import get_close_matches
+from typing import Dict, List, Optional, Tuple
+import re
+
+from .products import Product, OrderItem
+from .response_cache import normalize_text
+
+MAX_QUANTITY = 100
+
+# Names customers use for each product, without the word "yoghurt"
+PRODUCT_ALIASES: Dict[Product, List[str]] = {
+    Product.drinking: ["drinking", "drink", "drinkable", "laban"],
+    Product.regular: ["regular", "plain", "natural", "normal"],
+    Product.greek: ["greek"],
+    Product.strawberry: ["strawberry", "straw"],
+    Product.mango: ["mango"],
+    Product.vanilla: ["vanilla"],
+    Product.labneh: ["labneh", "labne", "labna", "labnah"],
+    Product.labneh_deluxe: ["labneh deluxe", "labne deluxe", "labna deluxe", "deluxe labneh", "deluxe"],
+    Product.cottage: ["cottage cheese", "cottage"],
+    Product.sour_milk: ["sour milk", "sour"],
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "dozen": 12,
+}
+
+# Words that say the customer is ordering
+ORDER_INTENT_WORDS = {"want", "like", "order", "give", "get", "need", "take", "send", "buy"}
+
+# Words that can join a plain list of quantities and products, e.g. "2 cups of greek and 1 mango please"
+LIST_WORDS = {
+    "of", "and", "plus", "please", "pls", "plz", "hi", "hello", "thanks", "thank",
+    "yoghurt", "yoghurts", "yogurt", "yogurts", "cup", "cups", "tub", "tubs",
+    "jar", "jars", "bottle", "bottles", "pack", "packs", "unit", "units", "pcs", "pieces", "piece",
+}
+
+# Words that carry no information about the order. Outside of a plain list
+# they need an order intent word, otherwise "you have 2 greek" would be an order
+FILLER_WORDS = LIST_WORDS | ORDER_INTENT_WORDS | {
+    "i", "id", "would", "can", "could", "have", "me", "us", "some", "the", "with", "also", "you",
+}
+
+# First words of a question, e.g. "is greek 2" or "can i have the price of two greek"
+QUESTION_OPENERS = {
+    "what", "whats", "which", "how", "when", "where", "who", "why", "is", "are", "do", "does", "did",
+    "can", "could", "will", "would", "should", "may", "have", "has",
+}
+
+_ALIASES = sorted(
+    ((tuple(alias.split()), product) for product, aliases in PRODUCT_ALIASES.items() for alias in aliases),
+    key=lambda item: -len(item[0])
+)
+# Typos and plurals are only corrected towards product names, so that words
+# outside the vocabulary (e.g. "price", close to "piece") are not understood
+_PRODUCT_WORDS = sorted({word for words, _ in _ALIASES for word in words})
+_VOCABULARY = set(_PRODUCT_WORDS) | FILLER_WORDS | set(NUMBER_WORDS)
+_MULTIPLIER = re.compile(r"\b(\d+)\s*x\b|\bx\s*(\d+)\b")
+
+_QTY = "qty"
+_PRODUCT = "product"
+
+
+def _correct(word: str) -> Optional[str]:
+    """Map a word to the vocabulary, fixing plurals and typos"""
+    if word.isdigit() or word in _VOCABULARY:
+        return word
+    if word.endswith("s") and word[:-1] in _PRODUCT_WORDS:
+        return word[:-1]
+    if len(word) >= 4:
+        match = get_close_matches(word, _PRODUCT_WORDS, n=1, cutoff=0.8)
+        if match:
+            return match[0]
+    return None
+
+
+def _tokenize(text: str) -> Optional[List[Tuple[str, object]]]:
+    """
+    Turn a message into quantity and product tokens, None if a word is not
+    understood or the message is not an order: a question, or a sentence
+    without an order intent word
+    """
+    if "?" in text:
+        return None
+    text = _MULTIPLIER.sub(lambda m: f" {m.group(1) or m.group(2)} ", normalize_text(text))
+    words = []
+    for word in text.split():
+        corrected = _correct(word)
+        if corrected is None:
+            return None
+        words.append(corrected)
+    if not words or words[0] in QUESTION_OPENERS:
+        return None
+    if not ORDER_INTENT_WORDS.intersection(words) and any(
+            word in FILLER_WORDS and word not in LIST_WORDS for word in words):
+        return None
+
+    tokens = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        for alias, product in _ALIASES:
+            if tuple(words[i:i + len(alias)]) == alias:
+                tokens.append((_PRODUCT, product))
+                i += len(alias)
+                break
+        else:
+            if word == "dozen" and tokens and tokens[-1][0] == _QTY:
+                tokens[-1] = (_QTY, tokens[-1][1] * 12)
+            elif word.isdigit():
+                tokens.append((_QTY, int(word)))
+            elif word in NUMBER_WORDS:
+                tokens.append((_QTY, NUMBER_WORDS[word]))
+            elif word not in FILLER_WORDS:
+                return None
+            i += 1
+    return tokens
+
+
+def _pair_trailing(tokens: List[Tuple[str, object]]) -> Optional[List[Tuple[Product, int]]]:
+    """
+    Pair tokens written as "product quantity", e.g. "greek 2 labneh 1"
+    """
+    if len(tokens) % 2:
+        return None
+    items = []
+    for (kind, product), (next_kind, quantity) in zip(tokens[::2], tokens[1::2]):
+        if kind != _PRODUCT or next_kind != _QTY:
+            return None
+        items.append((product, quantity))
+    return items
+
+
+def _pair_nearest(tokens: List[Tuple[str, object]]) -> Optional[List[Tuple[Product, int]]]:
+    """
+    Pair each product with the quantity before it, or with the quantity after it
+    when that one does not start the next item, e.g. "greek x2 and one mango"
+    """
+    items = []
+    pending = None
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == _QTY:
+            if pending is not None:
+                return None
+            pending = value
+        elif pending is not None:
+            items.append((value, pending))
+            pending = None
+        elif i + 1 < len(tokens) and tokens[i + 1][0] == _QTY and (i + 2 == len(tokens) or tokens[i + 2][0] == _QTY):
+            items.append((value, tokens[i + 1][1]))
+            i += 1
+        else:
+            return None
+        i += 1
+    return items if pending is None else None
+
+
+def parse_order(text: str) -> Optional[List[OrderItem]]:
+    """
+    Parse an order written as quantities and product names, e.g.
+    "2 greek, 1 labneh deluxe" or "greek x2 and one mango".
+
+    Only messages where every word is understood, and that pair each product
+    with one quantity, are parsed. Questions, and sentences that do not say the
+    customer wants the products (e.g. "you have 2 greek"), are not orders. Anything else returns None so that the
+    message goes to the agent.
+
+    Args:
+        text: Customer message
+
+    Returns:
+        The order items, or None if the message is not a confidently parsed order
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        return None
+    parses = [items for items in (_pair_nearest(tokens), _pair_trailing(tokens)) if items]
+    if not parses or any(items != parses[0] for items in parses):
+        return None
+    items = parses[0]
+
+    quantities: Dict[Product, int] = {}
+    for product, quantity in items:
+        quantities[product] = quantities.get(product, 0) + quantity
+    if any(not 0 < quantity <= MAX_QUANTITY for quantity in quantities.values()):
+        return None
+    return [OrderItem(product=product, quantity=quantity) for product, quantity in quantities.items()]
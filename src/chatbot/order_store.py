@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from loguru import logger
+import atexit
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from config.conf import ORDER_STORE_PATH, ORDER_STORE_BATCH_SIZE, ORDER_STORE_FLUSH_INTERVAL
+from monitoring.metrics import REGISTRY
+from .products import OrderItem
+
+ORDERS_WRITTEN = REGISTRY.counter("order_store_written_total", "Orders written to the order store")
+FLUSH_SECONDS = REGISTRY.histogram("order_store_flush_seconds", "Time to write a batch of buffered orders")
+
+PENDING_PAYMENT = "pending_payment"
+PAID = "paid"
+
+
+@dataclass
+class StoredOrder:
+    sender: str
+    items: List[OrderItem]
+    total: int
+    currency: str
+    status: str = PENDING_PAYMENT
+    payment_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def describe(self) -> str:
+        items = ", ".join(f"{item.quantity} x {item.product.value}" for item in self.items)
+        day = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created_at))
+        return f"{day}: {items} ({self.total:,} {self.currency}, {self.status.replace('_', ' ')})"
+
+
+class OrderStore(ABC):
+    """
+    Repository of the orders placed by the customers.
+    """
+
+    @abstractmethod
+    def add(self, order: StoredOrder) -> str:
+        """
+        Save a new order
+
+        Returns:
+            The id of the order
+        """
+
+    @abstractmethod
+    def get(self, order_id: str) -> Optional[StoredOrder]:
+        pass
+
+    @abstractmethod
+    def last_orders(self, sender: str, n: int = 5) -> List[StoredOrder]:
+        """
+        Get the last orders of a customer, the most recent first
+        """
+
+    @abstractmethod
+    def by_status(self, status: str, since: Optional[float] = None, limit: int = 100) -> List[StoredOrder]:
+        pass
+
+    @abstractmethod
+    def by_payment_id(self, payment_id: str) -> Optional[StoredOrder]:
+        pass
+
+    @abstractmethod
+    def set_payment(self, order_id: str, payment_id: str, status: str):
+        pass
+
+    def flush(self):
+        """Write the buffered orders, if the store buffers them"""
+
+    def pending(self) -> int:
+        """Number of buffered orders waiting to be written"""
+        return 0
+
+    def close(self):
+        self.flush()
+
+
+class InMemoryOrderStore(OrderStore):
+    """
+    OrderStore kept in memory, for development and tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders: Dict[str, StoredOrder] = {}
+
+    def add(self, order: StoredOrder) -> str:
+        with self._lock:
+            self._orders[order.id] = order
+        ORDERS_WRITTEN.inc()
+        return order.id
+
+    def get(self, order_id: str) -> Optional[StoredOrder]:
+        return self._orders.get(order_id)
+
+    def _select(self, condition, limit: int) -> List[StoredOrder]:
+        with self._lock:
+            orders = [order for order in self._orders.values() if condition(order)]
+        return sorted(orders, key=lambda order: order.created_at, reverse=True)[:limit]
+
+    def last_orders(self, sender: str, n: int = 5) -> List[StoredOrder]:
+        return self._select(lambda order: order.sender == sender, n)
+
+    def by_status(self, status: str, since: Optional[float] = None, limit: int = 100) -> List[StoredOrder]:
+        since = since or 0
+        return self._select(lambda order: order.status == status and order.created_at >= since, limit)
+
+    def by_payment_id(self, payment_id: str) -> Optional[StoredOrder]:
+        orders = self._select(lambda order: order.payment_id == payment_id, 1)
+        return orders[0] if orders else None
+
+    def set_payment(self, order_id: str, payment_id: str, status: str):
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is not None:
+                order.payment_id = payment_id
+                order.status = status
+
+
+class SqliteOrderStore(OrderStore):
+    """
+    OrderStore in SQLite with write-behind batching.
+
+    New orders are buffered and written by a background thread in a single
+    transaction once ``batch_size`` orders are pending or every
+    ``flush_interval`` seconds. Queries flush the buffer first, so they always
+    see the orders already added.
+    """
+
+    _COLUMNS = "id, sender, items, total, currency, status, payment_id, created_at"
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        """
+        Initialize the store
+
+        Args:
+            path: SQLite database file
+            batch_size: Number of buffered orders that triggers a write
+            flush_interval: Maximum time in seconds an order stays in the buffer
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: List[StoredOrder] = []
+        self._wakeup = threading.Condition()
+        self._closed = False
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "id TEXT PRIMARY KEY, sender TEXT NOT NULL, items TEXT NOT NULL, total INTEGER NOT NULL, "
+            "currency TEXT NOT NULL, status TEXT NOT NULL, payment_id TEXT, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS orders_sender ON orders (sender, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS orders_status ON orders (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS orders_created_at ON orders (created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS orders_payment_id ON orders (payment_id)")
+
+        self._writer = threading.Thread(target=self._run_writer, name="order-store-writer", daemon=True)
+        self._writer.start()
+
+    def add(self, order: StoredOrder) -> str:
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError("The order store is closed")
+            self._pending.append(order)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        return order.id
+
+    def _run_writer(self):
+        while True:
+            with self._wakeup:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write orders: {str(e)}")
+            if closed:
+                return
+
+    def flush(self):
+        # Writes are serialized, so a query flushing the buffer waits for the
+        # batch being written by the writer thread
+        with self._lock:
+            with self._wakeup:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            start = time.perf_counter()
+            rows = [(order.id, order.sender, json.dumps([[i.product.value, i.quantity] for i in order.items]),
+                     order.total, order.currency, order.status, order.payment_id, order.created_at)
+                    for order in batch]
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(f"INSERT INTO orders ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                # Keep the orders for the next attempt
+                with self._wakeup:
+                    self._pending[:0] = batch
+                raise
+        ORDERS_WRITTEN.inc(len(batch))
+        FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    def _query(self, sql: str, params: Sequence) -> List[StoredOrder]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {self._COLUMNS} FROM orders WHERE {sql}", params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    @staticmethod
+    def _from_row(row) -> StoredOrder:
+        order_id, sender, items, total, currency, status, payment_id, created_at = row
+        items = [OrderItem(product=product, quantity=quantity) for product, quantity in json.loads(items)]
+        return StoredOrder(sender, items, total, currency, status, payment_id, created_at, order_id)
+
+    def get(self, order_id: str) -> Optional[StoredOrder]:
+        orders = self._query("id = ?", (order_id,))
+        return orders[0] if orders else None
+
+    def last_orders(self, sender: str, n: int = 5) -> List[StoredOrder]:
+        return self._query("sender = ? ORDER BY created_at DESC LIMIT ?", (sender, n))
+
+    def by_status(self, status: str, since: Optional[float] = None, limit: int = 100) -> List[StoredOrder]:
+        return self._query("status = ? AND created_at >= ? ORDER BY created_at DESC LIMIT ?",
+                           (status, since or 0, limit))
+
+    def by_payment_id(self, payment_id: str) -> Optional[StoredOrder]:
+        orders = self._query("payment_id = ? ORDER BY created_at DESC LIMIT 1", (payment_id,))
+        return orders[0] if orders else None
+
+    def set_payment(self, order_id: str, payment_id: str, status: str):
+        self.flush()
+        with self._lock:
+            self._conn.execute("UPDATE orders SET payment_id = ?, status = ? WHERE id = ?",
+                               (payment_id, status, order_id))
+
+    def pending(self) -> int:
+        with self._wakeup:
+            return len(self._pending)
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def close(self):
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+        self.flush()
+        self._conn.close()
+
+
+_default_store: Optional[OrderStore] = None
+_default_store_lock = threading.Lock()
+
+REGISTRY.callback_gauge("order_store_pending_orders", "Orders buffered waiting to be written",
+                        lambda: _default_store.pending() if _default_store is not None else 0)
+
+
+def get_order_store() -> OrderStore:
+    """
+    Get the process-wide order store, SQLite at ORDER_STORE_PATH or in memory
+    if the path is None.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            if ORDER_STORE_PATH is None:
+                _default_store = InMemoryOrderStore()
+            else:
+                _default_store = SqliteOrderStore(ORDER_STORE_PATH, ORDER_STORE_BATCH_SIZE,
+                                                  ORDER_STORE_FLUSH_INTERVAL)
+                # Write the buffered orders before the process exits
+                atexit.register(_default_store.close)
+        return _default_store
+
+
+def set_order_store(store: OrderStore):
+    """
+    Replace the process-wide order store, e.g. with another OrderStore implementation.
+    """
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
@@ -0,0 +1,137 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from config.assistant_conf import PRICE_CURRENCY, PRODUCT_PRICES, PRICE_BULK_TIERS
+from .products import Product, OrderItem
+
+Order = Union[Sequence[OrderItem], Mapping[Product, int]]
+
+
+class PriceTable:
+    """
+    Immutable price list indexed by ``Product``.
+
+    Unit prices and bulk tiers are stored in read-only arrays with one row per
+    product, so a whole order (or a matrix of many orders) is priced with array
+    operations instead of a loop over its items. Prices are integers in the
+    whole units of ``currency``; discounts are rounded down per line.
+    """
+
+    def __init__(self, prices: Mapping[Product, int],
+                 tiers: Optional[Mapping[Product, Sequence[Tuple[int, int]]]] = None,
+                 currency: str = PRICE_CURRENCY):
+        """
+        Args:
+            prices: Unit price of every product
+            tiers: Bulk tiers per product as (minimum quantity, discount percent)
+            currency: Currency code of the prices
+        """
+        missing = [product.value for product in Product if product not in prices]
+        if missing:
+            raise ValueError(f"Missing prices for {missing}")
+        tiers = tiers or {}
+
+        self._currency = currency
+        self._products = list(Product)
+        self._index = {product: i for i, product in enumerate(self._products)}
+        self._unit_prices = self._frozen([prices[product] for product in self._products])
+
+        # Tier thresholds padded with a never reached quantity, and a leading
+        # zero discount for quantities below the first tier
+        width = max((len(t) for t in tiers.values()), default=0)
+        thresholds = np.full((len(self._products), width), np.iinfo(np.int64).max, dtype=np.int64)
+        discounts = np.zeros((len(self._products), width + 1), dtype=np.int64)
+        for product, product_tiers in tiers.items():
+            row = self._index[product]
+            for column, (min_quantity, percent) in enumerate(sorted(product_tiers)):
+                if not 0 <= percent <= 100:
+                    raise ValueError(f"Invalid discount {percent}% for {product.value}")
+                thresholds[row, column] = min_quantity
+                discounts[row, column + 1] = percent
+        thresholds.flags.writeable = False
+        discounts.flags.writeable = False
+        self._thresholds = thresholds
+        self._discounts = discounts
+
+    @staticmethod
+    def _frozen(values: Iterable[int]) -> np.ndarray:
+        array = np.array(list(values), dtype=np.int64)
+        array.flags.writeable = False
+        return array
+
+    @property
+    def currency(self) -> str:
+        return self._currency
+
+    @property
+    def products(self) -> List[Product]:
+        """Products in the order of the columns of ``quantities``"""
+        return list(self._products)
+
+    def unit_price(self, product: Product) -> int:
+        return int(self._unit_prices[self._index[Product(product)]])
+
+    def quantities(self, orders: Iterable[Order]) -> np.ndarray:
+        """
+        Build the quantity matrix of many orders, one row per order and one
+        column per product.
+        """
+        rows = []
+        for order in orders:
+            row = [0] * len(self._products)
+            items = order.items() if isinstance(order, Mapping) else ((i.product, i.quantity) for i in order)
+            for product, quantity in items:
+                row[self._index[Product(product)]] += quantity
+            rows.append(row)
+        return np.array(rows, dtype=np.int64).reshape(len(rows), len(self._products))
+
+    def line_prices(self, quantities: np.ndarray) -> np.ndarray:
+        """
+        Price every line of a quantity matrix (or a single row), after bulk discounts.
+        """
+        quantities = np.asarray(quantities, dtype=np.int64)
+        if (quantities < 0).any():
+            raise ValueError("Quantities can't be negative")
+        percents = np.empty_like(quantities)
+        for row in range(len(self._products)):
+            tier = np.searchsorted(self._thresholds[row], quantities[..., row], side="right")
+            percents[..., row] = self._discounts[row][tier]
+        return quantities * self._unit_prices * (100 - percents) // 100
+
+    def line_price(self, product: Product, quantity: int) -> int:
+        quantities = np.zeros(len(self._products), dtype=np.int64)
+        quantities[self._index[Product(product)]] = quantity
+        return int(self.line_prices(quantities).sum())
+
+    def order_total(self, order: Order) -> int:
+        """
+        Get the total price of an order.
+        """
+        return int(self.line_prices(self.quantities([order])[0]).sum())
+
+    def price_orders(self, orders: Union[Iterable[Order], np.ndarray]) -> np.ndarray:
+        """
+        Price many orders at once, e.g. to reconcile the day's order log.
+
+        Args:
+            orders: The orders, or their quantity matrix as built by ``quantities``
+
+        Returns:
+            The total price of every order
+        """
+        if not isinstance(orders, np.ndarray):
+            orders = self.quantities(orders)
+        return self.line_prices(orders).sum(axis=-1)
+
+    def format(self, amount: int) -> str:
+        return f"{amount:,} {self._currency}"
+
+
+@lru_cache(maxsize=None)
+def get_price_table() -> PriceTable:
+    """
+    Get the shop's price table, built once from the configuration.
+    """
+    prices = {Product(name): price for name, price in PRODUCT_PRICES.items()}
+    return PriceTable(prices, {product: PRICE_BULK_TIERS for product in Product}, PRICE_CURRENCY)
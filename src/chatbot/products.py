@@ -0,0 +1,18 @@
+from enum import Enum
+from pydantic import BaseModel
+
+class Product(str, Enum):
+    drinking = "Drinking yoghurt"
+    regular = "Regular yoghurt"
+    greek = "Greek yoghurt"
+    strawberry = "Strawberry yoghurt"
+    mango = "Mango yoghurt"
+    vanilla = "Vanilla yoghurt"
+    labneh = "Labneh"
+    labneh_deluxe = "Labneh deluxe"
+    cottage = "Cottage cheese"
+    sour_milk = "Sour milk"
+
+class OrderItem(BaseModel):
+    product: Product
+    quantity: int
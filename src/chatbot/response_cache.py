@@ -0,0 +1,186 @@
+from langchain_core.embeddings import Embeddings
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+
+from monitoring.metrics import REGISTRY
+
+CACHE_REQUESTS = REGISTRY.counter("response_cache_requests_total", "Response cache lookups by result", ["result"])
+CACHE_LATENCY_SAVED = REGISTRY.counter("response_cache_latency_saved_seconds_total",
+                                       "Agent time saved by answering from the response cache")
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and punctuation, and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text)).strip()
+
+
+def fingerprint(*parts: str) -> str:
+    """Hash the parts of the conversation state an answer depends on"""
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    response: str
+    created: float
+    latency: float
+    vector: Optional[List[float]] = None
+
+
+class ResponseCache:
+    """
+    Cache of agent answers for repeated customer questions.
+
+    The exact tier is keyed by the normalised question and a fingerprint of the
+    conversation state. The optional semantic tier compares the question
+    embedding with the cached questions of the same fingerprint and reuses the
+    answer above ``similarity_threshold``. Entries expire after ``ttl_seconds``
+    and the least recently used are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 embeddings: Optional[Embeddings] = None, similarity_threshold: float = 0.95):
+        """
+        Initialize the response cache
+
+        Args:
+            max_entries: Maximum number of cached answers
+            ttl_seconds: Time after which a cached answer expires
+            embeddings: Embeddings model enabling the semantic tier, None for exact matches only
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._by_fingerprint: Dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def lookup(self, text: str, state_fingerprint: str) -> Optional[str]:
+        """
+        Get the cached answer of a question
+
+        Args:
+            text: Customer message
+            state_fingerprint: Fingerprint of the conversation state
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        key = (state_fingerprint, normalize_text(text))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._get(key, now)
+        result = "hit_exact"
+        if entry is None and self.embeddings is not None:
+            entry = self._semantic_lookup(key, now)
+            result = "hit_semantic"
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(result="miss")
+                return None
+            self.hits += 1
+            self.latency_saved += entry.latency
+        CACHE_REQUESTS.inc(result=result)
+        CACHE_LATENCY_SAVED.inc(entry.latency)
+        return entry.response
+
+    def store(self, text: str, state_fingerprint: str, response: str, latency: float):
+        """
+        Cache an answer
+
+        Args:
+            text: Customer message
+            state_fingerprint: Fingerprint of the conversation state
+            response: Agent answer
+            latency: Time the agent took to answer, reported as saved on every hit
+        """
+        key = (state_fingerprint, normalize_text(text))
+        vector = None
+        if self.embeddings is not None:
+            try:
+                vector = _unit(self.embeddings.embed_query(key[1]))
+            except Exception as e:
+                logger.warning(f"Failed to embed cached question: {str(e)}")
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(response, time.monotonic(), latency, vector)
+            self._by_fingerprint.setdefault(state_fingerprint, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def record_bypass(self):
+        """Count a turn that could not be cached (e.g. it placed an order)"""
+        CACHE_REQUESTS.inc(result="bypass")
+
+    def _get(self, key: Tuple[str, str], now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry.created > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: Tuple[str, str]):
+        if self._entries.pop(key, None) is not None:
+            keys = self._by_fingerprint[key[0]]
+            keys.discard(key)
+            if not keys:
+                del self._by_fingerprint[key[0]]
+
+    def _semantic_lookup(self, key: Tuple[str, str], now: float) -> Optional[_Entry]:
+        with self._lock:
+            candidates = list(self._by_fingerprint.get(key[0], ()))
+        if not candidates:
+            return None
+        try:
+            vector = _unit(self.embeddings.embed_query(key[1]))
+        except Exception as e:
+            logger.warning(f"Failed to embed question for the response cache: {str(e)}")
+            return None
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for candidate in candidates:
+                entry = self._entries.get(candidate)
+                if entry is None or entry.vector is None:
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry.vector))
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+            return self._get(best_key, now) if best_key else None
+
+    def stats(self) -> Dict[str, float]:
+        """Get the hit rate and the agent time saved"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved": self.latency_saved,
+            }
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector] if norm else list(vector)
@@ -0,0 +1,37 @@
+from typing import Iterable, Iterator
+import re
+
+# End of a sentence: punctuation followed by whitespace
+_SENTENCE_END = re.compile(r"[.!?…:](?:[\"')\]]*)\s+")
+
+
+def chunk_stream(tokens: Iterable[str], min_chars: int = 200) -> Iterator[str]:
+    """
+    Group a token stream into chunks that can be sent as separate messages.
+
+    A chunk is flushed at every paragraph break, or at the end of a sentence
+    once it holds at least ``min_chars`` characters. Whatever is left is
+    flushed when the stream ends.
+
+    Args:
+        tokens: Text deltas, as produced by Assistant.generate_stream_response
+        min_chars: Minimum length of a chunk flushed at a sentence boundary
+
+    Yields:
+        str: Stripped, non-empty chunks of text
+    """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        while True:
+            cut = buffer.rfind("\n\n")
+            if cut == -1 and len(buffer) >= min_chars:
+                ends = [m.end() for m in _SENTENCE_END.finditer(buffer, min_chars - 1)]
+                cut = ends[-1] if ends else -1
+            if cut <= 0:
+                break
+            chunk, buffer = buffer[:cut].strip(), buffer[cut:].lstrip()
+            if chunk:
+                yield chunk
+    if buffer.strip():
+        yield buffer.strip()
@@ -0,0 +1,54 @@
+from langchain_core.messages import BaseMessage
+from loguru import logger
+from typing import Iterable, Optional
+import threading
+import tiktoken
+
+from config.assistant_conf import GPT_MODEL
+
+# Tokens added by the chat format to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    _encoding = tiktoken.encoding_for_model(GPT_MODEL)
+                except Exception as e:
+                    # tiktoken downloads the encoding on first use
+                    logger.warning(f"tiktoken encoding not available, estimating tokens: {str(e)}")
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_text_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the encoding of GPT_MODEL.
+
+    Falls back to an estimate of 4 characters per token when the encoding
+    cannot be loaded.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_text_tokens(content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        tokens += count_text_tokens(str(tool_calls))
+    return tokens
+
+
+def count_messages_tokens(messages: Iterable[BaseMessage]) -> int:
+    return sum(count_message_tokens(m) for m in messages)
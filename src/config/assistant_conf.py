@@ -24,4 +24,62 @@ MODE = "query"
 #kMODE = "chat"
 #MODE = "agent"
 
-config = {"configurable": {"session_id": "ses1"}}
\ No newline at end of file
+config = {"configurable": {"session_id": "ses1"}}
+
+# Conversation checkpointer: "sqlite" keeps the conversations in
+# CHECKPOINT_SQLITE_PATH, shared by all the workers and kept across restarts,
+# "memory" keeps them in each process within the limits below
+CHECKPOINT_BACKEND = "sqlite"
+CHECKPOINT_SQLITE_PATH = "checkpoints.db"
+CHECKPOINT_MAX_THREADS = 5000
+CHECKPOINT_MAX_BYTES = 256 * 1024 * 1024
+CHECKPOINT_TTL_SECONDS = 6 * 60 * 60
+
+# Conversation context sent to the agent. When the history goes over
+# CONTEXT_MAX_TOKENS the oldest turns are folded into a summary until it
+# fits in CONTEXT_TARGET_TOKENS
+CONTEXT_MAX_TOKENS = 3000
+CONTEXT_TARGET_TOKENS = 2000
+CONTEXT_MAX_PINNED_TOKENS = 1000
+CONTEXT_SUMMARIZE = True
+CONTEXT_SUMMARY_MODEL = GPT_MODEL
+
+# Response cache for repeated questions. The semantic tier embeds the
+# questions with EMBEDDINGS_MODEL and reuses answers above the similarity
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_TTL_SECONDS = 60 * 60
+RESPONSE_CACHE_SEMANTIC = False
+RESPONSE_CACHE_SIMILARITY = 0.95
+EMBEDDINGS_MODEL = "text-embedding-3-small"
+
+# Orders written as plain quantities and products (e.g. "2 greek, 1 labneh")
+# are processed by the rule-based parser without calling the LLM
+ORDER_FAST_PATH_ENABLED = True
+
+# Product prices, in whole units of PRICE_CURRENCY. Bulk tiers are
+# (minimum quantity, discount percent) applied to the line of each product
+PRICE_CURRENCY = "UGX"
+PRODUCT_PRICES = {
+    "Drinking yoghurt": 1000,
+    "Regular yoghurt": 1000,
+    "Greek yoghurt": 1500,
+    "Strawberry yoghurt": 1200,
+    "Mango yoghurt": 1200,
+    "Vanilla yoghurt": 1200,
+    "Labneh": 2000,
+    "Labneh deluxe": 3000,
+    "Cottage cheese": 2500,
+    "Sour milk": 800,
+}
+PRICE_BULK_TIERS = [(12, 5), (24, 10)]
+
+# Compaction of the SQLite checkpoints: every CHECKPOINT_COMPACTION_INTERVAL
+# seconds keep the last CHECKPOINT_KEEP_LAST checkpoints of each thread and
+# drop the threads idle for longer than CHECKPOINT_IDLE_TTL_SECONDS. Threads
+# are processed in batches with a pause in between to not stall live traffic
+CHECKPOINT_COMPACTION_INTERVAL = 15 * 60
+CHECKPOINT_KEEP_LAST = 5
+CHECKPOINT_IDLE_TTL_SECONDS = 7 * 24 * 60 * 60
+CHECKPOINT_COMPACTION_BATCH = 50
+CHECKPOINT_COMPACTION_PAUSE = 0.05
@@ -1 +1,99 @@
-LOGS_DIR = "logs"
\ No newline at end of file
+import os
+
+LOGS_DIR = "logs"
+# Loguru handlers, loaded with LoguruConfig
+LOGGING_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "loguru.yaml")
+
+# Webhook ingestion: None processes messages inside the request, otherwise
+# "threads" or "asyncio" worker pools drain a bounded queue. Inside the request
+# the message is only admitted into the dispatcher, which then processes it,
+# and a full dispatcher answers 503 so Green API delivers the message again.
+# Behind the queue the webhook has already answered 200, and messages the
+# dispatcher rejects are dropped (webhook_dropped_total)
+WEBHOOK_INGESTION_MODE = None
+# A single ingestion worker keeps the arrival order, the messages are then
+# processed by the dispatcher
+WEBHOOK_WORKERS = 1
+WEBHOOK_QUEUE_SIZE = 1000
+
+# Message dispatcher: serial per sender, parallel across senders
+DISPATCHER_WORKERS = 8
+DISPATCHER_MAX_LANE_SIZE = 50
+DISPATCHER_MAX_PENDING = 5000
+# Seconds a new message waits for room in a full dispatcher. Past it, or at
+# once if the lane of its sender is full, the webhook answers 503 so Green API
+# delivers the message again
+DISPATCHER_SUBMIT_TIMEOUT = 2.0
+
+# Base URLs of the chat APIs. The environment can point them elsewhere, e.g.
+# to the local stand-ins of the load tests
+GREEN_API_URL = os.getenv("GREEN_API_URL", "https://7105.api.green-api.com")
+META_GRAPH_URL = os.getenv("META_GRAPH_URL", "https://graph.facebook.com")
+
+# Outbound HTTP transport
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 30
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 30
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 20
+HTTP_RETRY_BUDGET_RATIO = 0.2
+HTTP_RETRY_BUDGET_MIN_PER_SECOND = 1
+# Connection limits of the asyncio clients
+HTTP_ASYNC_LIMIT = 300
+HTTP_ASYNC_LIMIT_PER_HOST = 100
+
+# Outbound send queues: token buckets per instance and per recipient, and the
+# window during which consecutive messages to the same chat are joined
+GREEN_SEND_INSTANCE_RATE = 5
+GREEN_SEND_INSTANCE_BURST = 10
+GREEN_SEND_RECIPIENT_RATE = 1
+GREEN_SEND_RECIPIENT_BURST = 3
+GREEN_MAX_MESSAGE_LENGTH = 20000
+META_SEND_INSTANCE_RATE = 80
+META_SEND_INSTANCE_BURST = 80
+META_SEND_RECIPIENT_RATE = 1 / 6
+META_SEND_RECIPIENT_BURST = 3
+META_MAX_MESSAGE_LENGTH = 4096
+SEND_COALESCE_WINDOW = 0.3
+SEND_QUEUE_SIZE = 1000
+
+# Webhook deduplication of redelivered messages. With a SQLite path the seen
+# ids are shared by all the worker processes and kept across restarts
+DEDUP_WINDOW_SECONDS = 24 * 60 * 60
+DEDUP_MAX_ENTRIES = 200000
+DEDUP_SQLITE_PATH = None
+
+# Streamed answers are sent at paragraph breaks, or at the end of a sentence
+# once the pending text is at least this long
+STREAM_FLUSH_MIN_CHARS = 200
+
+# Order store. None keeps the orders in memory. New orders are written in
+# batches of ORDER_STORE_BATCH_SIZE or every ORDER_STORE_FLUSH_INTERVAL seconds
+ORDER_STORE_PATH = "orders.db"
+ORDER_STORE_BATCH_SIZE = 100
+ORDER_STORE_FLUSH_INTERVAL = 0.5
+
+# Load the agent stack in the background when the app starts, instead of
+# when the first message arrives
+WARM_UP_ON_START = True
+
+# LLM usage accounting: calls, tokens and costs per agent, sender and model,
+# appended to USAGE_PATH (None disables it) every USAGE_FLUSH_INTERVAL seconds,
+# when the usage per sender is rolled up into totals per agent and model
+USAGE_PATH = LOGS_DIR + "/usage.jsonl"
+USAGE_FLUSH_INTERVAL = 60
+USAGE_SHARDS = 16
+
+# Span tracing of the message path, correlated by message id, off unless
+# TRACING_ENABLED=1. Spans go to TRACING_PATH (JSON lines, moved to
+# TRACING_PATH + ".1" once it reaches TRACING_MAX_BYTES) and/or an OpenTelemetry
+# collector at TRACING_OTLP_ENDPOINT (OTLP/HTTP JSON, e.g. http://localhost:4318/v1/traces)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED") == "1"
+TRACING_PATH = LOGS_DIR + "/traces.jsonl"
+TRACING_MAX_BYTES = 50 * 1024 * 1024
+TRACING_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+TRACING_FLUSH_INTERVAL = 1.0
+TRACING_MAX_QUEUE = 10000
+TRACING_SERVICE_NAME = "whatsapp-chat-llm"
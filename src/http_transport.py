@@ -0,0 +1,373 @@
+import asyncio
+import requests
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterable, Optional
+from urllib.parse import urlsplit
+from loguru import logger
+import random
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    # aiohttp is only imported by the processes using the asyncio transport
+    import aiohttp
+from config.conf import (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES,
+                         HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, HTTP_POOL_CONNECTIONS,
+                         HTTP_POOL_MAXSIZE, HTTP_RETRY_BUDGET_RATIO, HTTP_RETRY_BUDGET_MIN_PER_SECOND,
+                         HTTP_ASYNC_LIMIT, HTTP_ASYNC_LIMIT_PER_HOST)
+
+REQUEST_LATENCY = REGISTRY.histogram("http_client_request_seconds", "Outbound HTTP request latency", ["endpoint"])
+REQUESTS = REGISTRY.counter("http_client_requests_total", "Outbound HTTP requests", ["endpoint", "status"])
+RETRIES = REGISTRY.counter("http_client_retries_total", "Outbound HTTP retries", ["endpoint", "reason"])
+BUDGET_EXHAUSTED = REGISTRY.counter("http_client_retry_budget_exhausted_total",
+                                    "Retries skipped because the retry budget was empty", ["endpoint"])
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+# Statuses that mean the request was not processed, safe to retry for any method
+SAFE_RETRY_STATUSES = frozenset([429, 503])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class RetryBudget:
+    """
+    Global limit on retries, shared by every endpoint.
+
+    Each request deposits ``ratio`` tokens and each retry withdraws one, so
+    retries can never exceed that fraction of the traffic. ``min_per_second``
+    tokens are added over time so that a low-traffic process can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 100.0):
+        """
+        Initialize the retry budget
+
+        Args:
+            ratio: Retries allowed per request
+            min_per_second: Retries allowed per second regardless of traffic
+            max_tokens: Maximum number of retries that can be saved up
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _RetryPolicy:
+    """Retry decisions and backoff shared by the sync and async transports"""
+
+    def __init__(self, max_retries: int, backoff_base: float, backoff_max: float,
+                 retry_budget: Optional[RetryBudget], retry_statuses: Iterable[int]):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_budget = retry_budget or get_default_retry_budget()
+
+    def _status_retryable(self, status: int, idempotent: bool) -> bool:
+        return status in self.retry_statuses and (idempotent or status in SAFE_RETRY_STATUSES)
+
+    def _can_retry(self, attempt: int, retryable: bool, endpoint: str, reason: str) -> bool:
+        if not retryable or attempt >= self.max_retries:
+            return False
+        if not self.retry_budget.withdraw():
+            BUDGET_EXHAUSTED.inc(endpoint=endpoint)
+            logger.warning(f"Retry budget exhausted, not retrying {endpoint} ({reason})")
+            return False
+        RETRIES.inc(endpoint=endpoint, reason=reason)
+        return True
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str], endpoint: str) -> Optional[float]:
+        """
+        Delay before the next attempt. Retry-After is the lower bound: retrying
+        earlier would hit the rate limit again.
+
+        Returns:
+            The delay in seconds, None if the server asks to wait longer than backoff_max
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            if server_delay > self.backoff_max:
+                logger.warning(f"Not retrying {endpoint}: Retry-After of {server_delay:.0f}s is above "
+                               f"{self.backoff_max}s")
+                return None
+            delay = max(delay, server_delay)
+        return delay
+
+
+class HttpTransport(_RetryPolicy):
+    """
+    Shared HTTP transport for the outbound API clients.
+
+    Keeps a pooled keep-alive session, applies connect/read timeouts and retries
+    failed requests with jittered exponential backoff, waiting at least the
+    Retry-After of the server.
+    Non-idempotent requests (POST) are only retried when the server did not
+    process them (connection errors, 429 and 503) to avoid duplicate sends.
+    """
+
+    def __init__(self, connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES, backoff_base: float = HTTP_BACKOFF_BASE,
+                 backoff_max: float = HTTP_BACKOFF_MAX, pool_connections: int = HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = HTTP_POOL_MAXSIZE, retry_budget: Optional[RetryBudget] = None,
+                 retry_statuses: Iterable[int] = RETRY_STATUSES):
+        """
+        Initialize the transport
+
+        Args:
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait for the response
+            max_retries: Maximum retries per request
+            backoff_base: Base delay of the exponential backoff
+            backoff_max: Maximum delay between retries. A longer Retry-After returns the response without retrying
+            pool_connections: Number of hosts to keep connection pools for
+            pool_maxsize: Maximum connections kept alive per host
+            retry_budget: Retry budget, the process-wide one if None
+            retry_statuses: Response statuses that can be retried
+        """
+        super().__init__(max_retries, backoff_base, backoff_max, retry_budget, retry_statuses)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Retries are handled here, so urllib3 must not retry on its own
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def request(self, method: str, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying it when allowed
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            endpoint: Name used to label the metrics. Defaults to the host, so that
+                tokens included in URL paths never end up in the metrics
+            **kwargs: Extra arguments for requests (json, headers, params...)
+
+        Returns:
+            The last response received. Errors are left to raise_for_status()
+
+        Raises:
+            requests.exceptions.RequestException: If the request could not be sent
+        """
+        method = method.upper()
+        endpoint = endpoint or urlsplit(url).netloc
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method in IDEMPOTENT_METHODS
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+                REQUESTS.inc(endpoint=endpoint, status="error")
+                # A read timeout may happen after the server processed the request
+                retryable = idempotent or not isinstance(e, requests.exceptions.ReadTimeout)
+                if not self._can_retry(attempt, retryable, endpoint, type(e).__name__):
+                    raise
+                time.sleep(self._backoff_delay(attempt, None, endpoint))
+                attempt += 1
+                continue
+
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+            if not self._status_retryable(response.status_code, idempotent):
+                return response
+            delay = self._backoff_delay(attempt, response.headers.get("Retry-After"), endpoint)
+            if delay is None or not self._can_retry(attempt, True, endpoint, str(response.status_code)):
+                return response
+            time.sleep(delay)
+            response.close()
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHttpTransport(_RetryPolicy):
+    """
+    asyncio counterpart of HttpTransport, built on aiohttp.
+
+    The aiohttp session is created on first use inside the running event loop,
+    so an instance must only be used from one loop. Call close() when done.
+    """
+
+    def __init__(self, connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES, backoff_base: float = HTTP_BACKOFF_BASE,
+                 backoff_max: float = HTTP_BACKOFF_MAX, limit: int = HTTP_ASYNC_LIMIT,
+                 limit_per_host: int = HTTP_ASYNC_LIMIT_PER_HOST, retry_budget: Optional[RetryBudget] = None,
+                 retry_statuses: Iterable[int] = RETRY_STATUSES):
+        """
+        Initialize the transport
+
+        Args:
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait for each read of the response
+            max_retries: Maximum retries per request
+            backoff_base: Base delay of the exponential backoff
+            backoff_max: Maximum delay between retries. A longer Retry-After returns the response without retrying
+            limit: Maximum simultaneous connections
+            limit_per_host: Maximum simultaneous connections per host
+            retry_budget: Retry budget, the process-wide one if None
+            retry_statuses: Response statuses that can be retried
+        """
+        import aiohttp
+
+        super().__init__(max_retries, backoff_base, backoff_max, retry_budget, retry_statuses)
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.session: Optional["aiohttp.ClientSession"] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    async def get(self, url: str, endpoint: Optional[str] = None, **kwargs) -> "aiohttp.ClientResponse":
+        return await self.request("GET", url, endpoint, **kwargs)
+
+    async def post(self, url: str, endpoint: Optional[str] = None, **kwargs) -> "aiohttp.ClientResponse":
+        return await self.request("POST", url, endpoint, **kwargs)
+
+    async def request(self, method: str, url: str, endpoint: Optional[str] = None,
+                      **kwargs) -> "aiohttp.ClientResponse":
+        """
+        Send a request, retrying it when allowed
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            endpoint: Name used to label the metrics, defaults to the host
+            **kwargs: Extra arguments for aiohttp (json, headers, params...)
+
+        Returns:
+            The last response received, with its body already read so that
+            json() can be awaited after the connection is released
+
+        Raises:
+            aiohttp.ClientError: If the request could not be sent
+        """
+        import aiohttp
+
+        method = method.upper()
+        endpoint = endpoint or urlsplit(url).netloc
+        idempotent = method in IDEMPOTENT_METHODS
+        session = self._get_session()
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+                REQUESTS.inc(endpoint=endpoint, status="error")
+                retryable = idempotent or not isinstance(e, aiohttp.SocketTimeoutError)
+                if not self._can_retry(attempt, retryable, endpoint, type(e).__name__):
+                    raise
+                await asyncio.sleep(self._backoff_delay(attempt, None, endpoint))
+                attempt += 1
+                continue
+
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=str(response.status))
+            if not self._status_retryable(response.status, idempotent):
+                return response
+            delay = self._backoff_delay(attempt, response.headers.get("Retry-After"), endpoint)
+            if delay is None or not self._can_retry(attempt, True, endpoint, str(response.status)):
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date
+
+    Args:
+        value: Header value
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_retry_budget: Optional[RetryBudget] = None
+_default_transport_lock = threading.Lock()
+_default_retry_budget_lock = threading.Lock()
+
+
+def get_default_retry_budget() -> RetryBudget:
+    """Get the process-wide retry budget shared by every transport"""
+    global _default_retry_budget
+    if _default_retry_budget is None:
+        with _default_retry_budget_lock:
+            if _default_retry_budget is None:
+                _default_retry_budget = RetryBudget(HTTP_RETRY_BUDGET_RATIO, HTTP_RETRY_BUDGET_MIN_PER_SECOND)
+    return _default_retry_budget
+
+
+def get_default_transport() -> HttpTransport:
+    """Get the process-wide transport shared by the API clients"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = HttpTransport()
+    return _default_transport
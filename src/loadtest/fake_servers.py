@@ -0,0 +1,350 @@
+"""
+Local stand-ins for the external APIs the app talks to, for load tests without
+network: the Green API, the Meta Graph API and an OpenAI-compatible chat
+completions endpoint. Each one runs a threaded HTTP server on a free local port
+with a configurable latency and error rate.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+# Called with the chat id, the text and the time of every message sent to a fake chat API
+SendListener = Callable[[str, str, float], None]
+# Status, headers and either the whole body or the chunks of a streamed one
+FakeResponse = Tuple[int, Dict[str, str], Union[bytes, Iterable[bytes]]]
+
+
+def json_response(data, status: int = 200) -> FakeResponse:
+    return status, {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+
+class FakeServer:
+    """
+    Threaded HTTP server answering with ``handle()``.
+
+    Every request waits ``latency`` seconds and fails with a 500 with
+    probability ``error_rate``, before being handled.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Initialize the server
+
+        Args:
+            latency: Delay in seconds added to every request
+            error_rate: Fraction of the requests answered with a 500
+            seed: Seed of the error injection
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, method: str, path: str, body: Optional[dict]) -> FakeResponse:
+        return json_response({"error": "not found"}, 404)
+
+    def _respond(self, method: str, path: str, body: Optional[dict]) -> FakeResponse:
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return json_response({"error": "injected failure"}, 500)
+        return self.handle(method, path, body)
+
+    def start(self) -> "FakeServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, Nagle would delay the body
+            disable_nagle_algorithm = True
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = None
+                status, headers, payload = server._respond(self.command, self.path, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if isinstance(payload, bytes):
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in payload:
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _FakeChatApi(FakeServer):
+    """Fake chat API that records the sent messages and notifies the listeners"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        super().__init__(latency, error_rate, seed)
+        self.sent: List[Tuple[str, str, float]] = []
+        self._listeners: List[SendListener] = []
+
+    def add_listener(self, listener: SendListener):
+        self._listeners.append(listener)
+
+    def _record(self, chat_id: str, text: str):
+        sent_at = time.perf_counter()
+        with self._lock:
+            self.sent.append((chat_id, text, sent_at))
+        for listener in self._listeners:
+            listener(chat_id, text, sent_at)
+
+
+class FakeGreenApi(_FakeChatApi):
+    """
+    Green API: sendMessage, sendFileByUrl, sendLocation, getStateInstance and
+    setSettings of any instance. ``webhook_payload()`` builds the incoming
+    message webhooks Green API would post to the app.
+    """
+
+    _PATH = re.compile(r"^/waInstance[^/]*/(?P<method>\w+)/[^/?]*")
+
+    def handle(self, method: str, path: str, body: Optional[dict]) -> FakeResponse:
+        match = self._PATH.match(path)
+        if match is None:
+            return super().handle(method, path, body)
+        api_method = match.group("method")
+        body = body or {}
+        if api_method == "sendMessage":
+            self._record(body.get("chatId", ""), body.get("message", ""))
+        elif api_method in ("sendFileByUrl", "sendLocation"):
+            self._record(body.get("chatId", ""), "")
+        elif api_method == "getStateInstance":
+            return json_response({"stateInstance": "authorized"})
+        elif api_method == "setSettings":
+            return json_response({"saveSettings": True})
+        else:
+            return super().handle(method, path, body)
+        return json_response({"idMessage": uuid.uuid4().hex.upper()})
+
+    @staticmethod
+    def webhook_payload(chat_id: str, text: str, id_message: Optional[str] = None) -> dict:
+        """
+        Build an incomingMessageReceived webhook with a text message
+
+        Args:
+            chat_id: Sender chatId, e.g. "34600000000@c.us"
+            text: Text of the message
+            id_message: Id of the message, a random one if None
+        """
+        return {
+            "typeWebhook": "incomingMessageReceived",
+            "instanceData": {"idInstance": 1101000000, "wid": "34600000000@c.us", "typeInstance": "whatsapp"},
+            "timestamp": int(time.time()),
+            "idMessage": id_message or uuid.uuid4().hex.upper(),
+            "senderData": {"chatId": chat_id, "sender": chat_id, "chatName": "Customer", "senderName": "Customer"},
+            "messageData": {"typeMessage": "textMessage", "textMessageData": {"textMessage": text}}
+        }
+
+
+class FakeMetaGraph(_FakeChatApi):
+    """
+    Meta Graph API ``/{version}/{phone_number_id}/messages`` endpoint.
+    ``webhook_payload()`` builds the webhooks Meta would post to the app.
+    """
+
+    _PATH = re.compile(r"^/v[\d.]+/[^/]+/messages")
+
+    def handle(self, method: str, path: str, body: Optional[dict]) -> FakeResponse:
+        if method != "POST" or not self._PATH.match(path):
+            return super().handle(method, path, body)
+        body = body or {}
+        to = body.get("to", "")
+        self._record(to, body.get("text", {}).get("body", ""))
+        return json_response({
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]
+        })
+
+    @staticmethod
+    def webhook_payload(wa_id: str, text: str, message_id: Optional[str] = None) -> dict:
+        """
+        Build a webhook with a text message
+
+        Args:
+            wa_id: Sender phone number
+            text: Text of the message
+            message_id: Id of the message, a random one if None
+        """
+        return {
+            "object": "whatsapp_business_account",
+            "entry": [{"id": "0", "changes": [{"field": "messages", "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "34600000000", "phone_number_id": "123"},
+                "contacts": [{"profile": {"name": "Customer"}, "wa_id": wa_id}],
+                "messages": [{
+                    "from": wa_id,
+                    "id": message_id or f"wamid.{uuid.uuid4().hex}",
+                    "timestamp": str(int(time.time())),
+                    "type": "text",
+                    "text": {"body": text}
+                }]
+            }}]}]
+        }
+
+
+DEFAULT_ANSWER = ("We sell drinking, regular, greek, strawberry, mango and vanilla yoghurt, labneh and "
+                  "labneh deluxe.\n\nWhat would you like to order?")
+
+# Tool calls the fake model makes when the customer's message matches
+DEFAULT_TOOL_SCRIPT = [
+    {"match": r"how much|price", "tool_calls": [
+        {"name": "get_total_price", "arguments": {"order": [{"product": "Mango yoghurt", "quantity": 3}]}}
+    ]},
+    {"match": r"paid|payment", "tool_calls": [
+        {"name": "get_payment_status", "arguments": {"id": 4}},
+        {"name": "get_last_orders", "arguments": {"n": 3}}
+    ]},
+    {"match": r"last orders|my orders", "tool_calls": [
+        {"name": "get_last_orders", "arguments": {"n": 5}}
+    ]}
+]
+
+
+class FakeOpenAI(FakeServer):
+    """
+    OpenAI-compatible ``/v1/chat/completions``, streamed or not.
+
+    When tools are offered and the last user message matches a rule of the
+    tool script, the answer is the rule's tool calls, in parallel. Otherwise,
+    and once the tool results are in, it is ``answer``. ``latency`` is the
+    time to the first token and ``token_delay`` the time between tokens.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None,
+                 token_delay: float = 0.0, answer: str = DEFAULT_ANSWER, tool_script: Optional[List[dict]] = None):
+        """
+        Initialize the server
+
+        Args:
+            latency: Time to the first token in seconds
+            error_rate: Fraction of the requests answered with a 500
+            seed: Seed of the error injection
+            token_delay: Time between streamed tokens in seconds
+            answer: Text of the final answers
+            tool_script: Rules {"match": regex, "tool_calls": [{"name", "arguments"}]}, DEFAULT_TOOL_SCRIPT if None
+        """
+        super().__init__(latency, error_rate, seed)
+        self.token_delay = token_delay
+        self.answer = answer
+        self.tool_script = [(re.compile(rule["match"], re.IGNORECASE), rule["tool_calls"])
+                            for rule in (DEFAULT_TOOL_SCRIPT if tool_script is None else tool_script)]
+
+    def _tool_calls(self, body: dict) -> Optional[List[dict]]:
+        messages = body.get("messages") or []
+        if not body.get("tools") or not messages or messages[-1].get("role") != "user":
+            return None
+        text = messages[-1].get("content")
+        if not isinstance(text, str):
+            return None
+        offered = {tool.get("function", {}).get("name") for tool in body["tools"]}
+        for pattern, calls in self.tool_script:
+            if pattern.search(text):
+                return [{"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                         "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+                        for call in calls if call["name"] in offered] or None
+        return None
+
+    def handle(self, method: str, path: str, body: Optional[dict]) -> FakeResponse:
+        if method != "POST" or not path.startswith("/v1/chat/completions"):
+            return super().handle(method, path, body)
+        body = body or {}
+        model = body.get("model", "gpt-4o-mini")
+        tool_calls = self._tool_calls(body)
+        prompt_tokens = sum(len(str(message.get("content") or "").split()) for message in body.get("messages", []))
+        tokens = [] if tool_calls else re.findall(r"\S+\s*|\s+", self.answer)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens) or len(tool_calls),
+                 "total_tokens": prompt_tokens + (len(tokens) or len(tool_calls))}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": None if tool_calls else self.answer}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return json_response({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage
+            })
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: dict, finish: Optional[str] = None, with_usage: bool = False) -> bytes:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [] if with_usage else [
+                        {"index": 0, "delta": delta, "finish_reason": finish}]}
+            if with_usage:
+                data["usage"] = usage
+            return f"data: {json.dumps(data)}\n\n".encode()
+
+        def events():
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_calls:
+                yield chunk({"tool_calls": [{"index": i, **call} for i, call in enumerate(tool_calls)]})
+            for token in tokens:
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason)
+            if include_usage:
+                yield chunk({}, with_usage=True)
+            yield b"data: [DONE]\n\n"
+
+        return 200, {"Content-Type": "text/event-stream"}, events()
@@ -0,0 +1,306 @@
+"""
+Load test of the Flask webhook against local stand-ins of Green API, Meta and OpenAI.
+
+Incoming messages are posted to the real app at a fixed rate (open loop) and a
+message is complete when the fake chat API receives the "Thanks for your
+message" auto-reply that closes its turn. Reports the throughput, the
+p50/p95/p99 webhook and end-to-end latencies and the error rates.
+
+Run from the src directory:
+    python -m loadtest.run_load_test --rps 20 --duration 30
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+from loguru import logger
+import argparse
+import atexit
+import io
+import itertools
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import time
+
+import requests
+
+from loadtest.fake_servers import FakeGreenApi, FakeMetaGraph, FakeOpenAI
+
+WEBHOOK_TOKEN = "load-test"
+# Closing message the app sends after every answer (MyWhatsAppClient._process_text_message)
+END_OF_TURN = "Thanks for your message:"
+
+DEFAULT_MESSAGES = [
+    "hello, what do you sell?",
+    "2 greek, 1 labneh deluxe",
+    "how much are 3 mango yoghurts?",
+    "I paid order 4, can you check the payment?",
+    "grek x3 and a mango",
+    "what were my last orders?"
+]
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile, None without values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+class ReplyTracker:
+    """
+    Matches the replies received by the fake chat API with the messages posted,
+    in order per chat.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Deque[float]] = defaultdict(deque)
+        self.latencies: List[float] = []
+        self.last_reply_at: Optional[float] = None
+
+    def posted(self, chat_id: str, posted_at: float):
+        with self._lock:
+            self._pending[chat_id].append(posted_at)
+
+    def forget(self, chat_id: str, posted_at: float):
+        """Drop a message the app did not accept"""
+        with self._lock:
+            try:
+                self._pending[chat_id].remove(posted_at)
+            except ValueError:
+                pass
+
+    def on_send(self, chat_id: str, text: str, sent_at: float):
+        # Coalesced sends can close several turns at once
+        closed = text.count(END_OF_TURN)
+        with self._lock:
+            pending = self._pending[chat_id.removesuffix("@c.us")]
+            for _ in range(min(closed, len(pending))):
+                self.latencies.append(sent_at - pending.popleft())
+                self.last_reply_at = sent_at
+
+    def outstanding(self) -> int:
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+
+def build_app(channel: str, send_limits: bool):
+    """
+    Import the app, pointed to the fakes by the environment, and register the webhook of ``channel``
+
+    Returns:
+        The Flask app and the webhook path
+    """
+    from flask import Flask
+    import app as app_module
+    from chat_clients.whatsapp_business_client import WhatsAppBusinessClient
+    from chatbot.stream_chunker import chunk_stream
+    from config.conf import STREAM_FLUSH_MIN_CHARS
+
+    no_limits = {} if send_limits else {"instance_rate": 1e6, "instance_burst": 1e6,
+                                        "recipient_rate": 1e6, "recipient_burst": 1e6}
+    whatsapp = app_module.setup_whatsapp(webhook_token=WEBHOOK_TOKEN)
+    whatsapp.enable_send_queue(**no_limits)
+    whatsapp.warm_up(background=False)
+    if channel == "green":
+        return app_module.app, "/webhook"
+
+    class MetaLoadClient(WhatsAppBusinessClient):
+        """Meta client answering with the app's assistant, like MyWhatsAppClient does for Green API"""
+
+        def _process_text_message(self, from_number: str, text: str):
+            response = whatsapp.assistant.generate_stream_response(text, conversation_id=from_number)
+            for chunk in chunk_stream(response, min_chars=STREAM_FLUSH_MIN_CHARS):
+                self.queue_text_message(from_number, chunk)
+            self.queue_text_message(from_number, f"{END_OF_TURN} {text}")
+
+    # The app only wires Green API, the Meta webhook gets its own Flask app
+    meta_app = Flask(__name__)
+    meta = MetaLoadClient(token="load-test", phone_number_id="123")
+    meta.enable_send_queue(**no_limits)
+    meta.setup_webhook(meta_app, "/webhook", WEBHOOK_TOKEN)
+    return meta_app, "/webhook"
+
+
+def run(url: str, channel: str, rps: float, duration: float, senders: int, concurrency: int,
+        messages: List[str], tracker: ReplyTracker, drain_timeout: float) -> dict:
+    """
+    Post ``rps`` messages per second for ``duration`` seconds and wait for their replies
+
+    Returns:
+        The report of the run
+    """
+    local = threading.local()
+    lock = threading.Lock()
+    acks: List[float] = []
+    statuses: Dict[str, int] = defaultdict(int)
+    headers = {"Authorization": f"Bearer {WEBHOOK_TOKEN}"}
+    payload = FakeGreenApi.webhook_payload if channel == "green" else FakeMetaGraph.webhook_payload
+
+    def post(i: int, text: str):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        sender = f"3460{i % senders:07d}"
+        chat_id = f"{sender}@c.us" if channel == "green" else sender
+        posted_at = time.perf_counter()
+        tracker.posted(sender, posted_at)
+        try:
+            response = session.post(url, json=payload(chat_id, text), headers=headers, timeout=30)
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        ack = time.perf_counter() - posted_at
+        if status != "200":
+            tracker.forget(sender, posted_at)
+        with lock:
+            statuses[status] += 1
+            if status == "200":
+                acks.append(ack)
+
+    total = int(rps * duration)
+    texts = itertools.cycle(messages)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(total):
+            # Open loop: the schedule does not wait for slow responses
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(post, i, next(texts))
+    posted_in = time.perf_counter() - start
+
+    deadline = time.perf_counter() + drain_timeout
+    while tracker.outstanding() and time.perf_counter() < deadline:
+        time.sleep(0.05)
+
+    accepted = statuses.get("200", 0)
+    completed = len(tracker.latencies)
+    span = (tracker.last_reply_at or time.perf_counter()) - start
+    return {
+        "channel": channel,
+        "target_rps": rps,
+        "posted": total,
+        "offered_rps": total / posted_in if posted_in else 0.0,
+        "accepted": accepted,
+        "completed": completed,
+        "throughput_rps": completed / span if span > 0 else 0.0,
+        "webhook_error_rate": (total - accepted) / total if total else 0.0,
+        "lost_rate": (accepted - completed) / accepted if accepted else 0.0,
+        "webhook_statuses": dict(statuses),
+        "webhook_latency": {f"p{p}": percentile(acks, p) for p in (50, 95, 99)},
+        "end_to_end_latency": {f"p{p}": percentile(tracker.latencies, p) for p in (50, 95, 99)}
+    }
+
+
+def format_report(report: dict, fakes: Dict[str, object]) -> str:
+    def ms(value: Optional[float]) -> str:
+        return "      -" if value is None else f"{value * 1000:7.1f}"
+
+    lines = [
+        f"channel {report['channel']}: {report['posted']} messages at {report['offered_rps']:.1f} rps "
+        f"(target {report['target_rps']:g})",
+        f"  accepted {report['accepted']}, completed {report['completed']}, "
+        f"throughput {report['throughput_rps']:.1f} msg/s",
+        f"  webhook errors {report['webhook_error_rate']:.2%} {report['webhook_statuses']}, "
+        f"lost replies {report['lost_rate']:.2%}",
+        "                    p50 ms  p95 ms  p99 ms",
+    ]
+    for name in ("webhook_latency", "end_to_end_latency"):
+        values = report[name]
+        lines.append(f"  {name:<17}{ms(values['p50'])} {ms(values['p95'])} {ms(values['p99'])}")
+    for name, fake in fakes.items():
+        lines.append(f"  fake {name}: {fake.requests} requests, {fake.errors} injected errors")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--channel", choices=["green", "meta"], default="green")
+    parser.add_argument("--rps", type=float, default=10, help="Target incoming messages per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--senders", type=int, default=200, help="Distinct customers the messages come from")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum webhook requests in flight")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="Seconds to wait for the last replies")
+    parser.add_argument("--messages", help="JSON file with the list of message texts to cycle through")
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="Fake OpenAI time to first token")
+    parser.add_argument("--openai-token-delay", type=float, default=0.01, help="Fake OpenAI time between tokens")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-script", help='JSON file {"answer": ..., "tool_script": [...]} for the fake model')
+    parser.add_argument("--send-latency", type=float, default=0.05, help="Fake Green API/Meta send latency")
+    parser.add_argument("--send-error-rate", type=float, default=0.0)
+    parser.add_argument("--send-limits", action="store_true",
+                        help="Keep the outbound rate limits of config/conf.py (they cap the throughput)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--log", action="store_true", help="Keep the app logging and prints")
+    args = parser.parse_args()
+
+    script = {}
+    if args.openai_script:
+        with open(args.openai_script) as f:
+            script = json.load(f)
+    messages = DEFAULT_MESSAGES
+    if args.messages:
+        with open(args.messages) as f:
+            messages = json.load(f)
+
+    openai_fake = FakeOpenAI(args.openai_latency, args.openai_error_rate, seed=1,
+                             token_delay=args.openai_token_delay, **script).start()
+    green_fake = FakeGreenApi(args.send_latency, args.send_error_rate, seed=2).start()
+    meta_fake = FakeMetaGraph(args.send_latency, args.send_error_rate, seed=3).start()
+    tracker = ReplyTracker()
+    green_fake.add_listener(tracker.on_send)
+    meta_fake.add_listener(tracker.on_send)
+
+    # The app reads its endpoints from the environment when it is imported
+    os.environ.update({
+        "OPENAI_BASE_URL": f"{openai_fake.url}/v1",
+        "OPENAI_API_KEY": "sk-load-test",
+        "GREEN_API_URL": green_fake.url,
+        "GREEN_API_INSTANCE_ID": "1101000000",
+        "GREEN_API_INSTANCE_TOKEN": "load-test",
+        "META_GRAPH_URL": meta_fake.url,
+    })
+    output_path = os.path.abspath(args.output) if args.output else None
+    # Conversations, orders and logs of the run go to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    # Registered before the app's exit handlers, so it runs after them
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    os.chdir(workdir)
+    if not args.log:
+        logger.remove()
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    from werkzeug.serving import make_server
+    output = sys.stdout if args.log else io.StringIO()
+    with redirect_stdout(output):
+        flask_app, path = build_app(args.channel, args.send_limits)
+        server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+        threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}{path}"
+        try:
+            report = run(url, args.channel, args.rps, args.duration, args.senders, args.concurrency, messages,
+                         tracker, args.drain_timeout)
+        finally:
+            server.shutdown()
+            for fake in (openai_fake, green_fake, meta_fake):
+                fake.stop()
+
+    fakes = {"openai": openai_fake, args.channel: green_fake if args.channel == "green" else meta_fake}
+    print(format_report(report, fakes))
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Import time report of a module, in the spirit of ``python -X importtime``.
+
+Run from the src directory:
+    python -m monitoring.startup_report app
+or through the app's CLI:
+    PYTHONPATH=. flask --app app startup-report
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List
+import argparse
+import os
+import subprocess
+import sys
+
+
+@dataclass
+class ImportTime:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    """
+    Parse the lines written to stderr by ``python -X importtime``
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(ImportTime(module, int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def measure_imports(module: str) -> List[ImportTime]:
+    """
+    Import a module in a fresh interpreter and get the time spent on each import
+    """
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=src, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def import_time_report(module: str, top: int = 20) -> str:
+    """
+    Build the report of the slowest imports of a module: the total time, the
+    top-level packages by their own time, and the slowest modules including
+    the imports they trigger.
+
+    Args:
+        module: Module to import, e.g. "app"
+        top: Number of entries of each ranking
+    """
+    imports = measure_imports(module)
+    total = next((i.cumulative_us for i in imports if i.module == module and i.depth == 0),
+                 sum(i.self_us for i in imports))
+    packages: Dict[str, int] = defaultdict(int)
+    for i in imports:
+        packages[i.module.split(".")[0]] += i.self_us
+
+    lines = [f"Import of {module}: {total / 1e3:.1f} ms, {len(imports)} modules", "",
+             f"{'package':40s} {'self ms':>9s} {'share':>6s}"]
+    for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]:
+        lines.append(f"{package:40s} {self_us / 1e3:9.1f} {self_us / total:6.1%}")
+    lines += ["", f"{'module':60s} {'cumulative ms':>13s}"]
+    for i in sorted(imports, key=lambda i: i.cumulative_us, reverse=True)[:top]:
+        lines.append(f"{'  ' * i.depth + i.module:60s} {i.cumulative_us / 1e3:13.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    print(import_time_report(args.module, args.top))
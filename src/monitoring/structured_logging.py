@@ -0,0 +1,49 @@
+"""
+Sampled logging on loguru.
+
+The handlers are configured in config/loguru.yaml, loaded with LoguruConfig
+when the app module is imported. They use loguru's ``enqueue``, so the calling
+thread only formats the message and queues the record, and a background thread
+serializes and writes it. High volume categories, set with the ``category``
+extra, can be sampled with CategorySampler.
+
+Log with the loguru format arguments, so the message is only built when a
+handler will emit it:
+
+    logger.info("Received text message from {sender}", sender=sender, category="inbound")
+"""
+from typing import Dict, Optional
+import random
+
+from .metrics import REGISTRY
+
+SAMPLED_OUT = REGISTRY.counter("log_records_sampled_out_total", "Log records left out by the sampling", ["category"])
+
+
+class CategorySampler:
+    """
+    Handler filter keeping a fraction of the records of each category. Records
+    without a category, or at ``always_level`` or above, are always kept.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, always_level: int = 30):
+        """
+        Initialize the sampler
+
+        Args:
+            rates: Fraction of the records kept per category, from 0 to 1
+            always_level: Level number from which records are never sampled out (WARNING by default)
+        """
+        self.rates = rates or {}
+        self.always_level = always_level
+
+    def __call__(self, record) -> bool:
+        if record["level"].no >= self.always_level:
+            return True
+        category = record["extra"].get("category")
+        rate = self.rates.get(category)
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        SAMPLED_OUT.inc(category=category)
+        return False
+
@@ -0,0 +1,340 @@
+"""
+Span tracing of the message path: webhook, message handling, graph nodes,
+tools, LLM calls and outbound sends.
+
+Spans of the same incoming message share a trace id derived from its message
+id, so they are correlated even when the work hops between threads. Finished
+spans are queued and exported in batches by a background thread, to a
+JSON-lines file and/or an OpenTelemetry collector (OTLP/HTTP JSON).
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from loguru import logger
+import atexit
+import functools
+import hashlib
+import inspect
+import json
+import os
+import random
+import threading
+import time
+
+from config.conf import (TRACING_ENABLED, TRACING_PATH, TRACING_MAX_BYTES, TRACING_OTLP_ENDPOINT,
+                         TRACING_FLUSH_INTERVAL, TRACING_MAX_QUEUE, TRACING_SERVICE_NAME)
+from .metrics import REGISTRY
+
+DROPPED_SPANS = REGISTRY.counter("tracing_dropped_spans_total", "Spans dropped because the export queue was full")
+
+
+class Span:
+    """A timed operation, with OpenTelemetry ids and attributes"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "message_id", "start_ns", "end_ns", "attributes",
+                 "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], message_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.message_id = message_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "message_id": self.message_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "status": "ERROR" if self.error is not None else "OK",
+            "error": self.error
+        }
+
+
+class SpanExporter(ABC):
+    """Destination of the finished spans"""
+
+    @abstractmethod
+    def export(self, spans: List[Span]):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class JsonLinesExporter(SpanExporter):
+    """
+    Appends one JSON object per span to a file. Once the file reaches
+    ``max_bytes`` it is moved to ``path + ".1"``, replacing the previous one.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans))
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter(SpanExporter):
+    """
+    Sends the spans to an OpenTelemetry collector with the OTLP/HTTP JSON
+    encoding, e.g. to http://localhost:4318/v1/traces
+    """
+
+    def __init__(self, endpoint: str, service_name: str = TRACING_SERVICE_NAME,
+                 headers: Optional[Dict[str, str]] = None):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.headers = headers or {}
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(self.service_name)}]},
+            "scopeSpans": [{
+                "scope": {"name": "monitoring.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in
+                                   ({"message.id": span.message_id, **span.attributes} if span.message_id
+                                    else span.attributes).items()],
+                    "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1}
+                } for span in spans]
+            }]
+        }]}
+
+    def export(self, spans: List[Span]):
+        from http_transport import get_default_transport
+        response = get_default_transport().post(self.endpoint, "otlp.traces", json=self.encode(spans),
+                                                headers=self.headers)
+        response.raise_for_status()
+
+
+class Tracer:
+    """
+    Creates the spans and exports the finished ones in batches from a
+    background thread, so the traced code only appends them to a queue.
+    """
+
+    def __init__(self, exporters: List[SpanExporter], flush_interval: float = 1.0, max_queue: int = 10000,
+                 enabled: bool = True):
+        """
+        Initialize the tracer
+
+        Args:
+            exporters: Destinations of the spans
+            flush_interval: Seconds between exports
+            max_queue: Finished spans kept waiting for the export, new ones are dropped beyond it
+            enabled: If False, spans are neither timed nor exported
+        """
+        self.exporters = exporters
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.enabled = enabled
+        self._queue: List[Span] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Export the spans every ``flush_interval`` seconds in a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                DROPPED_SPANS.inc()
+                return
+            self._queue.append(span)
+
+    def flush(self):
+        """Export the queued spans"""
+        with self._flush_lock:
+            with self._lock:
+                spans, self._queue = self._queue, []
+            if not spans:
+                return
+            for exporter in self.exporters:
+                try:
+                    exporter.export(spans)
+                except Exception as e:
+                    logger.error(f"Failed to export {len(spans)} spans with {type(exporter).__name__}: {str(e)}")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+REGISTRY.callback_gauge("tracing_queue_depth", "Finished spans waiting to be exported",
+                        lambda: len(_tracer._queue) if _tracer is not None else 0)
+
+
+def get_tracer() -> Tracer:
+    """
+    Get the process-wide tracer, exporting to TRACING_PATH and/or
+    TRACING_OTLP_ENDPOINT as configured.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                exporters: List[SpanExporter] = []
+                if TRACING_ENABLED and TRACING_PATH is not None:
+                    exporters.append(JsonLinesExporter(os.path.abspath(TRACING_PATH), TRACING_MAX_BYTES))
+                if TRACING_ENABLED and TRACING_OTLP_ENDPOINT:
+                    exporters.append(OtlpHttpExporter(TRACING_OTLP_ENDPOINT))
+                tracer = Tracer(exporters, TRACING_FLUSH_INTERVAL, TRACING_MAX_QUEUE,
+                                enabled=TRACING_ENABLED and bool(exporters))
+                if tracer.enabled:
+                    tracer.start()
+                    # Export the last spans before the process exits
+                    atexit.register(tracer.shutdown)
+                _tracer = tracer
+    return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    """Replace the process-wide tracer, e.g. with other exporters"""
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer
+
+
+def trace_id_for(message_id: str) -> str:
+    """Trace id of the spans of an incoming message"""
+    return hashlib.blake2b(message_id.encode(), digest_size=16).hexdigest()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(name: str, message_id: Optional[str] = None, parent: Optional[Span] = None,
+               **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time the block as a span, child of ``parent`` or of the current span
+
+    Args:
+        name: Name of the span
+        message_id: Incoming message the work belongs to. Without a parent, its
+            spans get the trace id of the message
+        parent: Parent span, for work handed over from another thread
+        **attributes: Attributes of the span
+
+    Yields:
+        The span, None when tracing is disabled
+    """
+    tracer = get_tracer()
+    if not tracer.enabled:
+        yield None
+        return
+    if parent is None:
+        parent = _current_span.get()
+    if parent is not None and (message_id is None or message_id == parent.message_id):
+        span = Span(name, parent.trace_id, parent.span_id, parent.message_id, attributes)
+    else:
+        trace_id = trace_id_for(message_id) if message_id else f"{random.getrandbits(128):032x}"
+        span = Span(name, trace_id, None, message_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # A generator holding the span was closed from another context
+            pass
+        tracer._finish(span)
+
+
+def traced(name: str) -> Callable:
+    """Decorator running every call of the function, or coroutine function, in a span"""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_node(name: str, node: Callable) -> Callable:
+    """
+    Wrap a graph node in a span. Runnables, like ToolNode, are invoked with the node config.
+    """
+    run = node.invoke if hasattr(node, "invoke") else node
+
+    def traced_call(state, config):
+        with start_span(f"node.{name}"):
+            return run(state, config)
+    return traced_call
@@ -0,0 +1,229 @@
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+import atexit
+import json
+import os
+import threading
+import time
+
+from config.conf import USAGE_PATH, USAGE_FLUSH_INTERVAL, USAGE_SHARDS
+from .metrics import REGISTRY
+
+# Key of the accumulated usage: (agent, sender, model)
+UsageKey = Tuple[str, str, str]
+_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cost")
+
+
+class _Shard:
+    __slots__ = ("lock", "values")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: Dict[UsageKey, List[float]] = {}
+
+
+class UsageAccumulator:
+    """
+    Tokens and costs of the LLM calls, per agent, sender and model.
+
+    Each thread records into one of ``shards`` independently locked shards
+    (picked by its native thread id), so concurrent workers almost never wait
+    for each other. Every flush takes the usage out of the shards, appends it
+    to a JSON-lines time series, one line per key, and rolls it up into totals
+    per agent and model. Those totals, plus what has not been flushed yet, are
+    exported through the metrics registry, so the memory held and the cost of
+    a scrape do not grow with the number of customers.
+    """
+
+    def __init__(self, shards: int = 16):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._flush_lock = threading.Lock()
+        # Held while usage moves from the shards to the totals, so reads see it in one place
+        self._totals_lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], List[float]] = {}
+        # Usage taken from the shards whose time series lines could not be written yet
+        self._unwritten: Dict[UsageKey, List[float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, agent: str, sender: Optional[str], model: Optional[str], prompt_tokens: int = 0,
+               completion_tokens: int = 0, cost: float = 0.0):
+        """
+        Add the usage of an LLM call
+
+        Args:
+            agent: Name of the agent that made the call
+            sender: Conversation the call was made for
+            model: Model that answered
+            prompt_tokens: Tokens of the prompt
+            completion_tokens: Tokens of the completion
+            cost: Cost in dollars
+        """
+        key = (agent, sender or "unknown", model or "unknown")
+        shard = self._shards[threading.get_native_id() % len(self._shards)]
+        with shard.lock:
+            values = shard.values.get(key)
+            if values is None:
+                shard.values[key] = [1, prompt_tokens, completion_tokens, cost]
+            else:
+                values[0] += 1
+                values[1] += prompt_tokens
+                values[2] += completion_tokens
+                values[3] += cost
+
+    def _merge_shards(self, take: bool) -> Dict[UsageKey, List[float]]:
+        merged: Dict[UsageKey, List[float]] = {}
+        for shard in self._shards:
+            with shard.lock:
+                if take:
+                    items = shard.values.items()
+                    shard.values = {}
+                else:
+                    items = [(key, list(values)) for key, values in shard.values.items()]
+            _add_into(merged, items)
+        return merged
+
+    def snapshot(self) -> Dict[UsageKey, List[float]]:
+        """Get the calls, prompt and completion tokens and cost per key recorded since the last flush"""
+        return self._merge_shards(take=False)
+
+    def agent_model_totals(self) -> Dict[Tuple[str, str], List[float]]:
+        """Get the calls, prompt and completion tokens and cost per agent and model since the start"""
+        with self._totals_lock:
+            totals = {key: list(values) for key, values in self._totals.items()}
+            recent = self.snapshot()
+        _add_into(totals, (((agent, model), values) for (agent, _, model), values in recent.items()))
+        return totals
+
+    def totals(self, by: str = "agent") -> Dict[str, Dict[str, float]]:
+        """
+        Get the usage grouped by "agent" or "model" since the start, or by "sender"
+        since the last flush (older usage per sender is in the time series)
+        """
+        if by == "sender":
+            grouped = ((sender, values) for (_, sender, _), values in self.snapshot().items())
+        else:
+            index = ("agent", "model").index(by)
+            grouped = ((key[index], values) for key, values in self.agent_model_totals().items())
+        totals: Dict[str, Dict[str, float]] = {}
+        for name, values in grouped:
+            total = totals.setdefault(name, dict.fromkeys(_FIELDS, 0))
+            for field, value in zip(_FIELDS, values):
+                total[field] += value
+        return totals
+
+    def flush(self, path: Optional[str]) -> int:
+        """
+        Move the usage since the previous flush into the totals per agent and
+        model, appending it per key to a JSON-lines file
+
+        Args:
+            path: The time series file, None to only roll up the usage
+
+        Returns:
+            The number of lines written
+        """
+        with self._flush_lock:
+            with self._totals_lock:
+                taken = self._merge_shards(take=True)
+                _add_into(self._totals, (((agent, model), list(values)) for (agent, _, model), values in taken.items()))
+            if path is None:
+                return 0
+            _add_into(self._unwritten, taken.items())
+            now = time.time()
+            lines = []
+            for (agent, sender, model), values in self._unwritten.items():
+                lines.append(json.dumps({"ts": now, "agent": agent, "sender": sender, "model": model,
+                                         **dict(zip(_FIELDS, values))}))
+            if lines:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(path, "a") as f:
+                    f.write("\n".join(lines) + "\n")
+            self._unwritten = {}
+        return len(lines)
+
+    def _safe_flush(self, path: Optional[str]):
+        try:
+            self.flush(path)
+        except OSError as e:
+            logger.error(f"Failed to write the usage time series: {str(e)}")
+
+    def _run(self, path: Optional[str], interval: float):
+        while not self._stop.wait(interval):
+            self._safe_flush(path)
+
+    def start(self, path: Optional[str], interval: float):
+        """Flush to ``path`` (None to only roll up the usage) every ``interval`` seconds in a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(path, interval), name="usage-flusher",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def _add_into(totals: Dict, items):
+    """Add (key, values) pairs into the values of ``totals``, taking ownership of new lists"""
+    for key, values in items:
+        total = totals.get(key)
+        if total is None:
+            totals[key] = values
+        else:
+            for i, value in enumerate(values):
+                total[i] += value
+
+
+class _UsageMetric:
+    """Read-only view of the accumulated usage for the metrics registry"""
+
+    def __init__(self, usage: UsageAccumulator, name: str, documentation: str, fields: Dict[str, int]):
+        self.name = name
+        self.documentation = documentation
+        self.type = "counter"
+        self.labelnames = ("agent", "model") + (("kind",) if len(fields) > 1 else ())
+        self._usage = usage
+        self._fields = fields
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        # Senders are left out of the metrics, they would create a series per customer
+        samples = []
+        for (agent, model), values in self._usage.agent_model_totals().items():
+            for kind, index in self._fields.items():
+                labels = {"agent": agent, "model": model}
+                if len(self._fields) > 1:
+                    labels["kind"] = kind
+                samples.append((self.name, labels, values[index]))
+        return samples
+
+
+_default_usage: Optional[UsageAccumulator] = None
+_default_usage_lock = threading.Lock()
+
+
+def get_usage() -> UsageAccumulator:
+    """
+    Get the process-wide usage accumulator. It is flushed every
+    USAGE_FLUSH_INTERVAL seconds, to USAGE_PATH unless the path is None.
+    """
+    global _default_usage
+    with _default_usage_lock:
+        if _default_usage is None:
+            _default_usage = UsageAccumulator(USAGE_SHARDS)
+            REGISTRY.register(_UsageMetric(_default_usage, "llm_calls_total", "LLM calls", {"calls": 0}))
+            REGISTRY.register(_UsageMetric(_default_usage, "llm_tokens_total", "LLM tokens",
+                                           {"prompt": 1, "completion": 2}))
+            REGISTRY.register(_UsageMetric(_default_usage, "llm_cost_dollars_total", "Cost of the LLM calls",
+                                           {"cost": 3}))
+            # Without a time series the flushes still roll up the usage per sender
+            path = os.path.abspath(USAGE_PATH) if USAGE_PATH is not None else None
+            _default_usage.start(path, USAGE_FLUSH_INTERVAL)
+            if path is not None:
+                # Write the last interval before the process exits
+                atexit.register(_default_usage._safe_flush, path)
+        return _default_usage
@@ -2,10 +2,15 @@ import requests
 from typing import Dict, List, Optional
 from datetime import datetime
 import json
+import os
+import threading
 from loguru import logger
 
+from http_transport import HttpTransport, get_default_transport
+
 class MTNMoMo:
-    def __init__(self, api_key: str, user_id: str, primary_key: str, environment: str = 'sandbox'):
+    def __init__(self, api_key: str, user_id: str, primary_key: str, environment: str = 'sandbox',
+                 transport: Optional[HttpTransport] = None):
         """
         Initialize MTN MoMo Client
         
@@ -14,7 +19,9 @@ class MTNMoMo:
             user_id: Your MTN MoMo User ID
             primary_key: Your MTN MoMo Primary Key
             environment: Environment to use ('sandbox' or 'production')
+            transport: HTTP transport, the shared default one if None
         """
+        self.transport = transport or get_default_transport()
         self.api_key = api_key
         self.user_id = user_id
         self.primary_key = primary_key
@@ -45,8 +52,9 @@ class MTNMoMo:
         try:
             endpoint = f"{self.base_url}/collection/v1_0/transaction/{transaction_id}"
             
-            response = requests.get(
+            response = self.transport.get(
                 endpoint,
+                "momo.transaction",
                 headers=self._get_headers()
             )
             response.raise_for_status()
@@ -78,8 +86,9 @@ class MTNMoMo:
         try:
             endpoint = f"{self.base_url}/collection/v1_0/accountholder/{phone_number}/transactions"
             
-            response = requests.get(
+            response = self.transport.get(
                 endpoint,
+                "momo.transactions",
                 headers=self._get_headers(),
                 params={'limit': limit}
             )
@@ -129,8 +138,9 @@ class MTNMoMo:
                 "status": "PENDING"
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 endpoint,
+                "momo.requesttopay",
                 headers=self._get_headers(),
                 json=payload
             )
@@ -148,4 +158,27 @@ class MTNMoMo:
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to request payment from {phone_number}: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+
+_default_client: Optional[MTNMoMo] = None
+_default_client_lock = threading.Lock()
+
+
+def get_momo_client() -> Optional[MTNMoMo]:
+    """
+    Get the process-wide MTN MoMo client, configured by the MTN_MOMO_API_KEY,
+    MTN_MOMO_USER_ID, MTN_MOMO_PRIMARY_KEY and MTN_MOMO_ENVIRONMENT environment
+    variables. None if MTN_MOMO_API_KEY is not set.
+    """
+    global _default_client
+    if _default_client is None and os.getenv('MTN_MOMO_API_KEY'):
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = MTNMoMo(
+                    api_key=os.getenv('MTN_MOMO_API_KEY'),
+                    user_id=os.getenv('MTN_MOMO_USER_ID', ''),
+                    primary_key=os.getenv('MTN_MOMO_PRIMARY_KEY', ''),
+                    environment=os.getenv('MTN_MOMO_ENVIRONMENT', 'sandbox')
+                )
+    return _default_client
@@ -41,7 +41,7 @@ def interactive_chat():
             # Check for clear command
             if user_input.lower() == 'clear':
                 print("\n=== Starting New Conversation ===")
-                assistant = create_test_assistant()
+                assistant.new_conversation()
                 continue
             
             # Skip empty inputs
@@ -50,8 +50,9 @@ def interactive_chat():
             
             # Get response from assistant
             response_generator = assistant.generate_stream_response(user_input)
+            print("\nAssistant: ", end="", flush=True)
             for response in response_generator:
-                print("\nAssistant:", response, end="", flush=True)
+                print(response, end="", flush=True)
             print() # Add newline at end
 
         except KeyboardInterrupt:
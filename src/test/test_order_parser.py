@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from chatbot.order_parser import parse_order
+from chatbot.products import Product
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 greek, 1 labneh deluxe", {Product.greek: 2, Product.labneh_deluxe: 1}),
+    ("grek x3 and a mango", {Product.greek: 3, Product.mango: 1}),
+    ("i would like 3 mangos and a labneh", {Product.mango: 3, Product.labneh: 1}),
+    ("give me 2 cups of greek", {Product.greek: 2}),
+    ("greek 2 labneh 1", {Product.greek: 2, Product.labneh: 1}),
+    ("2 greek please", {Product.greek: 2}),
+])
+def test_parses_orders(text, expected):
+    items = parse_order(text)
+    assert items is not None
+    assert {item.product: item.quantity for item in items} == expected
+
+
+@pytest.mark.parametrize("text", [
+    # Price questions
+    "price of 2 greek",
+    "can i have the price of two greek",
+    "how much are 3 mango yoghurts",
+    # Questions
+    "is greek 2",
+    "2 greek?",
+    "do you have 2 greek",
+    # No order intent
+    "you have 2 greek",
+    # Not understood or not paired
+    "hello, what do you sell?",
+    "greek and mango",
+    "2 3 greek",
+    "200 greek",
+])
+def test_does_not_parse_non_orders(text):
+    assert parse_order(text) is None
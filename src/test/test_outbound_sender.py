@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from chat_clients.outbound_sender import OutboundSender, split_message
+
+PARAGRAPHS = "First paragraph. It has two sentences.\n\nSecond paragraph, a bit longer than the first one.\n\nThird."
+
+
+def test_short_message_is_not_split():
+    assert split_message("Hello", 10) == ["Hello"]
+
+
+def test_splits_at_paragraphs():
+    assert split_message(PARAGRAPHS, 60) == ["First paragraph. It has two sentences.",
+                                             "Second paragraph, a bit longer than the first one.\n\nThird."]
+
+
+def test_splits_long_paragraph_at_sentences():
+    assert split_message(PARAGRAPHS, 30) == ["First paragraph.", "It has two sentences.",
+                                             "Second paragraph, a bit longer", "than the first one.", "Third."]
+
+
+def test_cuts_words_longer_than_a_part():
+    assert split_message("a " + "x" * 25, 10) == ["a", "x" * 10, "x" * 10, "x" * 5]
+
+
+@pytest.mark.parametrize("max_length", [5, 20, 45, 200])
+def test_parts_fit_and_keep_the_words(max_length):
+    parts = split_message(PARAGRAPHS, max_length)
+    assert all(0 < len(part) <= max_length for part in parts)
+    assert "".join(parts).replace(" ", "").replace("\n", "") == PARAGRAPHS.replace(" ", "").replace("\n", "")
+
+
+def test_sender_splits_oversized_message():
+    sent = []
+    sender = OutboundSender(lambda to, message: sent.append(message), "test",
+                            instance_rate=1000, instance_burst=1000, recipient_rate=1000, recipient_burst=1000,
+                            coalesce_window=0, max_message_length=60)
+    assert sender.send_text("chat", PARAGRAPHS)
+    assert sender.send_text("chat", "Bye")
+    sender.stop(timeout=5)
+    assert sent == ["First paragraph. It has two sentences.",
+                    "Second paragraph, a bit longer than the first one.\n\nThird.",
+                    "Bye"]
+    assert sender.stats()["pending"] == 0